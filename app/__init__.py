@@ -1,15 +1,10 @@
+import patch_first  # noqa: F401  Must stay first: patches for eventlet/gevent (see patch_first.py)
+
 import os
 import logging
 from flask import Flask
 from dotenv import load_dotenv
 from app.core.logging_config import setup_logging
-from app.routes.google_auth import google_auth_bp
-from app.routes.fatigue import fatigue_bp
-from app.routes.ui.screen import ui_screen_bp
-from app.routes.fitbit_auth import fitbit_auth_bp
-from app.utils.firebase_client import FirebaseClient
-from app.services.service_manager import ServiceManager
-from app.core.error_handlers import register_error_handlers
 
 
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1' # For development only to allow HTTP
@@ -19,6 +14,20 @@ load_dotenv()
 
 # Create, configure, register blueprints and return the Flask app
 def create_app():
+    # Imported here, not at package import, so `import app.<module>` (training
+    # workers, benchmarks, app.config) does not pull in every blueprint
+    from app.routes.google_auth import google_auth_bp
+    from app.routes.fatigue import fatigue_bp
+    from app.routes.ui.screen import ui_screen_bp
+    from app.routes.fitbit_auth import fitbit_auth_bp
+    from app.routes.metrics import metrics_bp
+    from app.modules.ai_ml.fatigue_detection import ai_ml_bp
+    from app.utils.firebase_client import FirebaseClient
+    from app.services.service_manager import ServiceManager
+    from app.core.error_handlers import register_error_handlers
+    from app.core.warmup import start_warmup
+    from app.config import Config
+
     app = Flask(__name__)
     app.secret_key = os.getenv("SECRET_KEY")
 
@@ -40,10 +49,21 @@ def create_app():
     app.register_blueprint(fitbit_auth_bp, url_prefix='/fitbit-auth')
     app.register_blueprint(fatigue_bp, url_prefix='/api/fatigue')
     app.register_blueprint(ui_screen_bp, url_prefix='/ui')
+    app.register_blueprint(ai_ml_bp, url_prefix='/api/ai')
+    app.register_blueprint(metrics_bp)
 
     # Register error handlers
     register_error_handlers(app)
 
+    # Socket.IO transports the server accepts, for the page's client (base.html)
+    @app.context_processor
+    def socket_transports():
+        return {'socket_transports': Config.SOCKETIO_TRANSPORTS}
+
+    # Load the camera pipeline, model and Google client ahead of first use,
+    # and start always-on camera streams (Config.CAMERA_STREAMS)
+    start_warmup()
+
     # # Register cleanup handlers
     # @app.teardown_appcontext
     # def cleanup_services(exception=None):
@@ -12,6 +12,84 @@ class Config:
     PORT = os.getenv("PORT")
     HOST_URL = os.getenv("HOST_URL")
 
+    # Server concurrency: 'threading' (Flask dev server), 'eventlet' or 'gevent'
+    ASYNC_MODE = os.getenv("ASYNC_MODE", "threading")
+    BLOCKING_POOL_SIZE = int(os.getenv("BLOCKING_POOL_SIZE", 16))  # OS threads for blocking I/O in cooperative modes
+
+    # Serve hourly history averages from running aggregates kept in this process. Set false when
+    # several workers write the same user's history: each would aggregate only its own share
+    HISTORY_AGGREGATES = os.getenv("HISTORY_AGGREGATES", "true").lower() == "true"
+
+    # Several workers: clients connect over websocket only (no long-polling, so no sticky
+    # sessions), and emits reach clients on other workers through a message queue (e.g. redis://)
+    SOCKETIO_TRANSPORTS = [t.strip() for t in os.getenv("SOCKETIO_TRANSPORTS", "polling,websocket").split(",") if t.strip()]
+    SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE") or None
+
+    # Socket.IO outbound queue (messages buffered before the dispatcher drops the oldest)
+    SOCKET_OUTBOUND_QUEUE_SIZE = int(os.getenv("SOCKET_OUTBOUND_QUEUE_SIZE", 256))
+
+    # Background alert persistence (overflow and repeated failures spill to SPOOL_DIR)
+    ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", 1000))
+    ALERT_BATCH_SIZE = int(os.getenv("ALERT_BATCH_SIZE", 50))  # Firestore allows up to 500 writes per batch
+    ALERT_MAX_RETRIES = int(os.getenv("ALERT_MAX_RETRIES", 5))
+    ALERT_RETRY_BASE_DELAY = float(os.getenv("ALERT_RETRY_BASE_DELAY", 0.5))  # Seconds, doubled per attempt
+    ALERT_RETRY_MAX_DELAY = float(os.getenv("ALERT_RETRY_MAX_DELAY", 30.0))
+
+    # Alert state machine (seconds): a level must hold for the dwell time before it
+    # changes, and the same level is not re-notified within the cooldown
+    ALERT_ESCALATE_DWELL = float(os.getenv("ALERT_ESCALATE_DWELL", 1.0))
+    ALERT_CLEAR_DWELL = float(os.getenv("ALERT_CLEAR_DWELL", 10.0))
+    ALERT_COOLDOWN = float(os.getenv("ALERT_COOLDOWN", 60.0))
+
+    # Fatigue model registry: seconds between checks for a newly activated model version
+    MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", 30.0))
+
+    # When heavy subsystems (camera pipeline, model, Google API client) load: 'eager', 'background' or 'off'
+    WARMUP = os.getenv("WARMUP", "background")
+    WARM_DETECTORS = int(os.getenv("WARM_DETECTORS", 1))  # Face mesh detectors warmed up per worker
+    USE_COMPILED_FOREST = os.getenv("USE_COMPILED_FOREST", "true").lower() == "true"  # NumPy scorer for small batches
+    COMPILED_FOREST_MAX_BATCH = int(os.getenv("COMPILED_FOREST_MAX_BATCH", 128))  # Larger batches use sklearn
+
+    # Detector manager: worker threads shared by all camera streams, and streams started at boot,
+    # e.g. [{"id": "cab-1", "source": 0, "user": "driver@example.com", "max_faces": 1}]
+    DETECTOR_WORKERS = int(os.getenv("DETECTOR_WORKERS", os.cpu_count() or 1))
+    CAMERA_STREAMS = os.getenv("CAMERA_STREAMS", "")
+    # Accounts allowed to view every camera stream and its owner; others see only their own
+    ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+    # Host-wide lock: with several workers, only the process holding it opens CAMERA_STREAMS
+    CAMERA_LOCK_FILE = os.getenv("CAMERA_LOCK_FILE", "/tmp/fatigue-camera-streams.lock")
+
+    # Camera capture (app/modules/capture.py). CAPTURE_PROBE measures the candidate modes
+    # meeting the target size at startup and keeps the one with the cheapest reads
+    CAPTURE_WIDTH = int(os.getenv("CAPTURE_WIDTH", 640))
+    CAPTURE_HEIGHT = int(os.getenv("CAPTURE_HEIGHT", 480))
+    CAPTURE_FPS = float(os.getenv("CAPTURE_FPS", 30))
+    CAPTURE_FOURCC = os.getenv("CAPTURE_FOURCC", "MJPG")  # Empty keeps the driver default
+    CAPTURE_BUFFER_SIZE = int(os.getenv("CAPTURE_BUFFER_SIZE", 1))
+    CAPTURE_STRATEGY = os.getenv("CAPTURE_STRATEGY", "grab")  # 'grab' skips decoding dropped frames, or 'read'
+    CAPTURE_PROBE = os.getenv("CAPTURE_PROBE", "false").lower() == "true"
+    INFERENCE_WIDTH = int(os.getenv("INFERENCE_WIDTH", 640))  # Detection input width; 0 = capture size
+    STREAM_FULL_RESOLUTION = os.getenv("STREAM_FULL_RESOLUTION", "false").lower() == "true"
+
+    # MJPEG video feed: JPEG quality, output scale, and an optional target bitrate
+    # (kbit/s, 0 = fixed quality) that steers quality down to JPEG_MIN_QUALITY
+    JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", 80))
+    JPEG_MIN_QUALITY = int(os.getenv("JPEG_MIN_QUALITY", 40))
+    STREAM_SCALE = float(os.getenv("STREAM_SCALE", 1.0))
+    STREAM_TARGET_KBPS = float(os.getenv("STREAM_TARGET_KBPS", 0))
+
+    # Per-stage timing histograms (capture, inference, encode, ...) over a rolling window in seconds
+    PROFILE_STAGES = os.getenv("PROFILE_STAGES", "false").lower() == "true"
+    PROFILE_WINDOW = float(os.getenv("PROFILE_WINDOW", 60.0))
+
+    # Prometheus text-format telemetry at /metrics, for a local scraper
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+    # Live feature stream (app/modules/ai_ml/features.py): window length and seconds between vectors.
+    # The window is also the PERCLOS window; keep it equal to the training window
+    FEATURE_WINDOW = float(os.getenv("FEATURE_WINDOW", 60.0))
+    FEATURE_STRIDE = float(os.getenv("FEATURE_STRIDE", 1.0))
+
     # Google OAuth API Configuration
     GOOGLE_OAUTH_REDIRECT_URI = f'{HOST_URL}/google-auth/oauth2callback'
 
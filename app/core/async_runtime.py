@@ -0,0 +1,34 @@
+import logging
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+COOPERATIVE_MODES = ('eventlet', 'gevent')
+
+# Patching itself happens in patch_first.py, before the app package is imported
+
+def is_cooperative():
+    """True when running under eventlet or gevent"""
+    return Config.ASYNC_MODE in COOPERATIVE_MODES
+
+def run_blocking(fn, *args, **kwargs):
+    """Run a blocking call (Firestore, HTTP, camera, codec) without stalling the hub.
+
+    Under eventlet/gevent the call is handed to a bounded pool of real OS
+    threads and the calling greenlet yields until it completes. In threading
+    mode the caller already owns a thread, so the call runs inline.
+    """
+    if Config.ASYNC_MODE == 'eventlet':
+        from eventlet import tpool
+        return tpool.execute(fn, *args, **kwargs)
+    if Config.ASYNC_MODE == 'gevent':
+        return _gevent_threadpool().apply(fn, args, kwargs)
+    return fn(*args, **kwargs)
+
+def _gevent_threadpool():
+    """Get the hub's thread pool, bounded to BLOCKING_POOL_SIZE"""
+    import gevent
+    threadpool = gevent.get_hub().threadpool
+    if threadpool.maxsize != Config.BLOCKING_POOL_SIZE:
+        threadpool.maxsize = Config.BLOCKING_POOL_SIZE
+    return threadpool
@@ -0,0 +1,101 @@
+# app/core/warmup.py
+"""
+Warm-up of the heavy subsystems kept out of application startup.
+
+create_app() imports Flask, the blueprints and the services only. The camera
+pipeline (OpenCV, MediaPipe), the fatigue model (scikit-learn) and the Google
+API client load on first use, or earlier here, as Config.WARMUP decides:
+
+    eager       before create_app() returns
+    background  on a thread once the app is created (default)
+    off         on the first request that needs them
+
+The camera step also builds Config.WARM_DETECTORS face mesh detectors and
+runs one inference on each, so the first stream's first frame does not pay
+for MediaPipe's graph start. Always-on camera streams (Config.CAMERA_STREAMS)
+start with the camera step, in the background when warm-up is off. Each step
+logs how long it took, and the worker logs its memory once warm.
+
+Under eventlet or gevent the warm-up thread is a green thread on the hub, so
+the slow parts (library imports, the model load, detector inference) go
+through run_blocking to the OS thread pool; only the cheap bookkeeping and
+starting the streams' own threads run on the hub.
+
+With PREFORK=true, libraries and the model are preloaded by the gunicorn
+master before it forks (prefork.py); this module runs in each worker.
+"""
+
+import os
+import time
+import logging
+import importlib
+import threading
+from typing import Dict
+from app.config import Config
+from app.core.async_runtime import run_blocking
+from app.services.performance import memory_usage
+from app.services.telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+EAGER = 'eager'
+BACKGROUND = 'background'
+OFF = 'off'
+
+timings: Dict[str, float] = {}  # Seconds per warm-up step in this process
+
+def _camera_pipeline():
+    # Importing OpenCV and MediaPipe takes long enough to stall the hub
+    run_blocking(importlib.import_module, 'app.modules.stream_manager')
+    from app.modules.stream_manager import DetectorManager
+    manager = DetectorManager.get_instance()
+    if Config.WARM_DETECTORS > 0:
+        inference_ms = manager.warm_detectors(Config.WARM_DETECTORS)
+        logger.info(f"Warm-up: face mesh inference {', '.join(f'{ms:.0f}' for ms in inference_ms)} ms")
+    manager.start_configured()
+
+def _fatigue_model():
+    from app.modules.ai_ml.fatigue_detection import model_registry
+    model_registry.current()  # Loads on the blocking pool itself
+
+def _google_api():
+    run_blocking(importlib.import_module, 'googleapiclient.discovery')
+
+WARMUP_STEPS = [
+    ('camera pipeline', _camera_pipeline),
+    ('fatigue model', _fatigue_model),
+    ('google api client', _google_api)
+]
+
+def _format_memory(usage: Dict[str, int]) -> str:
+    return ', '.join(f"{kind.upper()} {value / 2**20:.0f} MB" for kind, value in usage.items()) or 'unknown'
+
+def warm_up(steps=WARMUP_STEPS) -> Dict[str, float]:
+    """Run warm-up steps in order; returns seconds per step"""
+    for name, step in steps:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.error(f"Error warming up {name}: {str(e)}")
+        timings[name] = time.perf_counter() - start
+        logger.info(f"Warm-up: {name} ready in {timings[name] * 1000:.0f} ms")
+    logger.info(f"Worker {os.getpid()} warm: {_format_memory(memory_usage())}")
+    return timings
+
+def start_warmup(mode=None):
+    """Warm up according to Config.WARMUP (see module docstring)"""
+    mode = mode or Config.WARMUP
+    if mode == EAGER:
+        warm_up()
+        return
+    if mode == BACKGROUND:
+        steps = WARMUP_STEPS
+    elif Config.CAMERA_STREAMS:
+        steps = WARMUP_STEPS[:1]  # Always-on streams still start at boot
+    else:
+        return
+    threading.Thread(target=warm_up, args=(steps,), name='warmup', daemon=True).start()
+
+telemetry.register('warmup', lambda: [('warmup_seconds', {'step': name}, seconds)
+                                      for name, seconds in list(timings.items())])
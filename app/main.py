@@ -1,13 +1,28 @@
-from app import create_app
+import patch_first  # noqa: F401  Patched already by app/__init__; kept first so the order is explicit
+
 from app.config import Config
+from app.core.async_runtime import is_cooperative
+from app import create_app
+from app.services.service_manager import ServiceManager
 from definition import SSL_CERT_PATH, SSL_KEY_PATH
 
 if __name__ == 'app.main':
     app = create_app()
     
-    app.run(
-        ssl_context=(SSL_CERT_PATH, SSL_KEY_PATH),
-        host=Config.HOST,
-        port=Config.PORT,
-        debug=Config.IS_DEVELOPMENT
-    )
\ No newline at end of file
+    if is_cooperative():
+        # eventlet/gevent WSGI server with cooperative websockets and streams
+        ServiceManager.get_instance().sockets.socketio.run(
+            app,
+            host=Config.HOST,
+            port=int(Config.PORT or 5000),
+            certfile=SSL_CERT_PATH,
+            keyfile=SSL_KEY_PATH,
+            debug=Config.IS_DEVELOPMENT
+        )
+    else:
+        app.run(
+            ssl_context=(SSL_CERT_PATH, SSL_KEY_PATH),
+            host=Config.HOST,
+            port=Config.PORT,
+            debug=Config.IS_DEVELOPMENT
+        )
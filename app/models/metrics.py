@@ -0,0 +1,104 @@
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+
+def _to_number(value, default=0.0) -> float:
+    """Parse a stored value; legacy documents hold display strings like '12/min'"""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value))
+    return float(match.group()) if match else default
+
+def _format_number(value: float) -> str:
+    """Format a whole-valued float without a trailing '.0'"""
+    return str(int(value)) if float(value).is_integer() else f"{value:.1f}"
+
+@dataclass(slots=True)
+class MetricsRecord:
+    """Numeric driver metrics, created once by the detector or wearable client.
+
+    Values stay numeric through validation, alerts, trends and storage;
+    display strings are produced only by to_display() at the UI boundary.
+    """
+    heart_rate: Optional[float] = None  # BPM, None without wearable data
+    alertness: float = 100.0            # 0-100 score
+    blink_rate: float = 0.0             # Blinks per minute
+    eye_closure: float = 0.0            # Average closure duration in seconds
+    perclos: float = 0.0                # Fraction of the PERCLOS window with eyes closed (0-1)
+    fatigue_score: Optional[float] = None  # Model fatigue probability (0-1), None without a model
+    yawn_count: float = 0.0             # Yawns per minute
+    yawn_duration: float = 0.0          # Average yawn duration in seconds
+    head_position: str = 'Centered'
+    is_detecting: bool = True
+    eye_state: str = 'open'
+    avg_heart_rate: Optional[float] = None  # Historical averages (wearable path)
+    avg_alertness: Optional[float] = None
+    timestamp: Optional[datetime] = None
+
+    @property
+    def alert_status(self) -> str:
+        return 'Warning' if self.alertness < 70 else 'Normal'
+
+    def to_dict(self) -> Dict:
+        """Numeric camelCase form used for Firestore documents and binary payloads"""
+        data = {
+            'alertness': self.alertness,
+            'blinkRate': self.blink_rate,
+            'eyeClosure': self.eye_closure,
+            'perclos': self.perclos,
+            'yawnCount': self.yawn_count,
+            'yawnDuration': self.yawn_duration,
+            'headPosition': self.head_position,
+            'isDetecting': self.is_detecting,
+            'eyeState': self.eye_state,
+            'alertStatus': self.alert_status
+        }
+        if self.heart_rate is not None:
+            data['heartRate'] = self.heart_rate
+        if self.fatigue_score is not None:
+            data['fatigueScore'] = self.fatigue_score
+        return data
+
+    def to_display(self) -> Dict:
+        """Display strings for the UI (e.g. '12/min', '0.2s')"""
+        data = {
+            'alertness': _format_number(self.alertness),
+            'blinkRate': f"{_format_number(self.blink_rate)}/min",
+            'yawnCount': f"{_format_number(self.yawn_count)}/min",
+            'eyeClosure': f"{self.eye_closure:.1f}s",
+            'perclos': f"{self.perclos:.2f}",
+            'headPosition': self.head_position,
+            'alertStatus': self.alert_status,
+            'isDetecting': self.is_detecting,
+            'eyeState': self.eye_state
+        }
+        if self.heart_rate is not None:
+            data['heartRate'] = _format_number(self.heart_rate)
+        if self.fatigue_score is not None:
+            data['fatigueScore'] = f"{self.fatigue_score:.2f}"
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'MetricsRecord':
+        """Build a record from a stored document (numeric or legacy display strings)"""
+        heart_rate = data.get('heartRate')
+        fatigue_score = data.get('fatigueScore')
+        return cls(
+            heart_rate=_to_number(heart_rate) if heart_rate is not None else None,
+            alertness=_to_number(data.get('alertness'), 100.0),
+            blink_rate=_to_number(data.get('blinkRate')),
+            eye_closure=_to_number(data.get('eyeClosure')),
+            perclos=_to_number(data.get('perclos')),
+            fatigue_score=_to_number(fatigue_score) if fatigue_score is not None else None,
+            yawn_count=_to_number(data.get('yawnCount')),
+            yawn_duration=_to_number(data.get('yawnDuration')),
+            head_position=data.get('headPosition', 'Centered'),
+            is_detecting=data.get('isDetecting', True),
+            eye_state=data.get('eyeState', 'open'),
+            timestamp=data.get('timestamp') if isinstance(data.get('timestamp'), datetime) else None
+        )
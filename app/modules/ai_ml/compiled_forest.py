@@ -0,0 +1,114 @@
+# app/modules/ai_ml/compiled_forest.py
+"""
+Flattened, pure-NumPy version of a trained StandardScaler + RandomForestClassifier.
+
+Every tree is laid out in shared contiguous arrays (feature, threshold,
+children, leaf value) indexed by a global node id. Scoring walks all trees
+for all rows at once: one gather/compare per tree level for every
+(tree, row) pair still inside a tree, dropping pairs as they reach a leaf.
+This removes predict_proba's input validation and per-tree dispatch, which
+dominate for a handful of rows; for large batches sklearn's compiled tree
+walk is faster, so callers switch back above a batch-size cutoff.
+"""
+
+from dataclasses import dataclass
+import numpy as np
+
+@dataclass(frozen=True)
+class CompiledForest:
+    mean: np.ndarray          # (n_features,) scaler centre
+    scale: np.ndarray         # (n_features,) scaler scale
+    roots: np.ndarray         # (n_trees,) global id of each tree's root
+    feature: np.ndarray       # (n_nodes,) split feature, 0 at leaves
+    threshold: np.ndarray     # (n_nodes,) split threshold, +inf at leaves
+    children: np.ndarray      # (2 * n_nodes,) left/right child ids interleaved
+    is_leaf: np.ndarray       # (n_nodes,) leaf mask
+    leaf_value: np.ndarray    # (n_nodes,) positive-class probability at leaves
+    max_depth: int
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Positive-class probability per row, matching FatigueDetectionModel.predict_proba"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        # sklearn trees compare float32 inputs; round the same way to pick the same branches
+        X_scaled = ((X - self.mean) / self.scale).astype(np.float32).astype(np.float64)
+        n_rows, n_features = X_scaled.shape
+        flat = X_scaled.ravel()
+
+        # One entry per (tree, row) pair still walking its tree
+        rows = np.tile(np.arange(n_rows), self.n_trees)
+        nodes = np.repeat(self.roots, n_rows)
+        total = np.zeros(n_rows)
+        while len(nodes):
+            go_right = flat[rows * n_features + self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[2 * nodes + go_right]
+            done = self.is_leaf[nodes]
+            if done.any():
+                total += np.bincount(rows[done], weights=self.leaf_value[nodes[done]], minlength=n_rows)
+                walking = ~done
+                nodes = nodes[walking]
+                rows = rows[walking]
+        return total / self.n_trees
+
+def compile_forest(model) -> CompiledForest:
+    """Export a fitted FatigueDetectionModel (scaler + random forest) to flat arrays"""
+    scaler, forest = model.scaler, model.model
+    n_features = scaler.n_features_in_
+    mean = np.asarray(scaler.mean_ if scaler.with_mean else np.zeros(n_features), dtype=np.float64)
+    scale = np.asarray(scaler.scale_ if scaler.with_std else np.ones(n_features), dtype=np.float64)
+
+    positive = list(forest.classes_).index(1) if 1 in forest.classes_ else forest.n_classes_ - 1
+    features, thresholds, children, leaves, leaf_values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        ids = np.arange(tree.node_count)
+        is_leaf = tree.children_left == -1
+
+        counts = tree.value[:, 0, :]
+        # Normalise per node: older sklearn stores class counts, newer stores fractions
+        proba = counts[:, positive] / counts.sum(axis=1)
+
+        features.append(np.where(is_leaf, 0, tree.feature))
+        thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+        # Leaves point to themselves, so a single-leaf tree resolves in one step
+        children.append(np.column_stack([
+            np.where(is_leaf, ids, tree.children_left),
+            np.where(is_leaf, ids, tree.children_right)
+        ]).ravel() + offset)
+        leaves.append(is_leaf)
+        leaf_values.append(np.where(is_leaf, proba, 0.0))
+        roots.append(offset)
+
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+
+    return CompiledForest(
+        mean=mean,
+        scale=scale,
+        roots=np.asarray(roots, dtype=np.intp),
+        feature=np.concatenate(features).astype(np.intp),
+        threshold=np.concatenate(thresholds).astype(np.float64),
+        children=np.concatenate(children).astype(np.intp),
+        is_leaf=np.concatenate(leaves),
+        leaf_value=np.concatenate(leaf_values).astype(np.float64),
+        max_depth=max_depth
+    )
+
+def verify(compiled: CompiledForest, model, n_rows: int = 512, atol: float = 1e-9, seed: int = 0) -> float:
+    """Max absolute difference to sklearn on random inputs around the training data.
+
+    Raises ValueError when the difference exceeds atol.
+    """
+    rng = np.random.default_rng(seed)
+    X = compiled.mean + compiled.scale * rng.normal(scale=2.0, size=(n_rows, len(compiled.mean)))
+    difference = float(np.max(np.abs(compiled.predict_proba(X) - model.predict_proba(X, use_compiled=False))))
+    if difference > atol:
+        raise ValueError(f"Compiled forest differs from sklearn by {difference:.3g} (tolerance {atol:g})")
+    return difference
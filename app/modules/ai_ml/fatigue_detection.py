@@ -5,30 +5,64 @@ we can integrate them into the Flask API. This will involve creating a new route
 (such as eye movement and biometric data), makes predictions, and returns an alert message.
 """
 
+import io
+import math
+import logging
+from concurrent.futures import TimeoutError as FutureTimeoutError
+import numpy as np
 from flask import Blueprint, request, jsonify
-from app.modules.ai_ml.fatigue_model import FatigueDetectionModel
+from app.modules.ai_ml.model_registry import ModelRegistry, ModelVersionError
+from app.modules.ai_ml.features import FEATURE_NAMES
 from app.modules.ai_ml.threshold_analyzer import ThresholdAnalyzer
+from app.modules.ai_ml.micro_batcher import MicroBatcher
+from app.core.async_runtime import run_blocking
 
 ai_ml_bp = Blueprint('ai_ml', __name__)
+logger = logging.getLogger(__name__)
 
-# Initialize the model and analyzer
-fatigue_model = FatigueDetectionModel()
+LEGACY_FEATURE_ALIASES = {'blink_rate': 'eye_blink_rate'}  # Field names accepted before features.py
+MAX_BATCH_ROWS = 100_000
+NPY_MIMETYPE = 'application/x-npy'
+
+# The registry loads the model once per process and hot-swaps new versions
+model_registry = ModelRegistry.get_instance()
 threshold_analyzer = ThresholdAnalyzer()
 
+# Concurrent single requests are scored together within a few milliseconds;
+# each batch uses whichever model version is active when it runs
+batcher = MicroBatcher(model_registry.predict_proba)
+batcher.start()
+
+def _model_unavailable():
+    return jsonify({'error': 'Fatigue model not loaded'}), 503
+
 @ai_ml_bp.route('/detect_fatigue', methods=['POST'])
 def detect_fatigue():
-    data = request.get_json()
-    
-    # Extract input features
-    eye_blink_rate = data.get('eye_blink_rate', 0)  # Example feature
-    head_tilt = data.get('head_tilt', 0)  # Example feature
-    heart_rate = data.get('heart_rate', 0)  # Example feature
+    if model_registry.current() is None:
+        return _model_unavailable()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object of features'}), 400
     
-    # Create feature vector
-    features = [eye_blink_rate, head_tilt, heart_rate]  # Extend this with more features
+    # Create feature vector (same definition the model was trained on); missing features are 0
+    features = [data.get(name, data.get(LEGACY_FEATURE_ALIASES.get(name), 0)) for name in FEATURE_NAMES]
+    # Checked here: one bad vector would otherwise fail the whole micro-batch it joins
+    invalid = [name for name, value in zip(FEATURE_NAMES, features)
+               if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value)]
+    if invalid:
+        return jsonify({'error': f"Features must be finite numbers: {', '.join(invalid)}"}), 400
     
-    # Predict the fatigue score
-    fatigue_score = fatigue_model.predict_proba([features])[0]
+    # Predict the fatigue score (micro-batched with concurrent requests)
+    try:
+        fatigue_score = batcher.score(features)
+    except FutureTimeoutError:
+        logger.error("Timed out waiting for the fatigue micro-batcher")
+        return jsonify({'error': 'Fatigue scoring timed out'}), 503
+    except ModelVersionError:
+        return _model_unavailable()
+    except Exception as e:
+        logger.error(f"Error scoring fatigue features: {str(e)}")
+        return jsonify({'error': 'Error scoring features'}), 500
     
     # Analyze the fatigue score
     alert_message = threshold_analyzer.analyze(fatigue_score)
@@ -38,3 +72,64 @@ def detect_fatigue():
         'fatigue_score': fatigue_score,
         'alert': alert_message
     })
+
+@ai_ml_bp.route('/detect_fatigue_batch', methods=['POST'])
+def detect_fatigue_batch():
+    """Score many feature vectors in one model call.
+
+    Accepts JSON {"features": [[...], ...]} with columns in FEATURE_NAMES order,
+    or a binary .npy array (Content-Type: application/x-npy) of shape (n, len(FEATURE_NAMES)).
+    Binary requests get a float32 .npy array of scores back.
+    """
+    if model_registry.current() is None:
+        return _model_unavailable()
+    try:
+        binary = request.mimetype == NPY_MIMETYPE
+        if binary:
+            features = np.load(io.BytesIO(request.get_data()), allow_pickle=False)
+        else:
+            data = request.get_json(silent=True)
+            features = np.asarray(data.get('features', []) if isinstance(data, dict) else [])
+    except Exception as e:
+        return jsonify({'error': f'Invalid feature payload: {str(e)}'}), 400
+
+    if features.ndim != 2 or features.shape[1] != len(FEATURE_NAMES) or len(features) == 0:
+        return jsonify({'error': f'Expected a non-empty (n, {len(FEATURE_NAMES)}) feature array'}), 400
+    if len(features) > MAX_BATCH_ROWS:
+        return jsonify({'error': f'At most {MAX_BATCH_ROWS} rows per request'}), 413
+    # Integer or float columns only: strings, booleans and objects are not coerced
+    if features.dtype.kind not in 'iuf':
+        return jsonify({'error': f'Features must be numbers, got {features.dtype}'}), 400
+    features = features.astype(np.float64, copy=False)
+    invalid_rows = np.flatnonzero(~np.isfinite(features).all(axis=1))
+    if invalid_rows.size:
+        return jsonify({'error': f'Features must be finite numbers: row {int(invalid_rows[0])} '
+                                 f'({invalid_rows.size} invalid rows)'}), 400
+
+    try:
+        scores = run_blocking(model_registry.predict_proba, features)
+    except ModelVersionError:
+        return _model_unavailable()
+    except Exception as e:
+        logger.error(f"Error scoring fatigue batch: {str(e)}")
+        return jsonify({'error': 'Error scoring batch'}), 500
+
+    if binary:
+        buffer = io.BytesIO()
+        np.save(buffer, scores.astype(np.float32), allow_pickle=False)
+        return buffer.getvalue(), 200, {'Content-Type': NPY_MIMETYPE}
+
+    return jsonify({
+        'fatigue_scores': scores.tolist(),
+        'alerts': [threshold_analyzer.analyze(score) for score in scores]
+    })
+
+@ai_ml_bp.route('/model', methods=['GET'])
+def model_status():
+    """Active model version with its load time and memory footprint"""
+    model_registry.current()  # Picks up a newly activated version
+    return jsonify({
+        **model_registry.stats(),
+        'batches': batcher.batches,
+        'meanBatchSize': round(batcher.mean_batch_size, 2)
+    })
@@ -17,12 +17,15 @@ class FatigueDetectionModel:
         # Initialize the classifier (RandomForest for simplicity)
         self.model = RandomForestClassifier(n_estimators=100)
         self.scaler = StandardScaler()  # Standardizing data
+        self.compiled = None  # Flattened NumPy scorer, see compile()
+        self.compiled_max_batch = 128  # Above this many rows sklearn's tree walk is faster
     
     def train(self, X_train, y_train):
         """Train the fatigue detection model."""
         # Scale the features for better model performance
         X_train_scaled = self.scaler.fit_transform(X_train)
         self.model.fit(X_train_scaled, y_train)
+        self.compiled = None
     
     def predict(self, X):
         """Predict the fatigue level."""
@@ -30,19 +33,32 @@ class FatigueDetectionModel:
         prediction = self.model.predict(X_scaled)
         return prediction
     
-    def predict_proba(self, X):
+    def predict_proba(self, X, use_compiled=True):
         """Predict probability (for fatigue score)."""
+        if use_compiled and self.compiled is not None and len(X) <= self.compiled_max_batch:
+            return self.compiled.predict_proba(X)
         X_scaled = self.scaler.transform(X)
         return self.model.predict_proba(X_scaled)[:, 1]  # Probability of fatigue
 
+    def compile(self, verify=True):
+        """Flatten scaler and forest into the pure-NumPy scorer used by predict_proba."""
+        from app.modules.ai_ml import compiled_forest
+        compiled = compiled_forest.compile_forest(self)
+        if verify:
+            compiled_forest.verify(compiled, self)
+        self.compiled = compiled
+        return compiled
+
     def save_model(self, filename):
         """Save the trained model to disk."""
         import joblib
         joblib.dump(self.model, filename)
         joblib.dump(self.scaler, filename + '_scaler')
     
-    def load_model(self, filename):
-        """Load a saved model."""
-        import joblib
-        self.model = joblib.load(filename)
-        self.scaler = joblib.load(filename + '_scaler')
+    def load_model(self, filename, mmap_mode=None):
+        """Load a saved model (mmap_mode='r' maps large arrays instead of copying them)."""
+        # Objects unpickled by the pre-fork master are reused, so workers share them
+        from prefork import load_artifact
+        self.model = load_artifact(filename, mmap_mode=mmap_mode)
+        self.scaler = load_artifact(filename + '_scaler', mmap_mode=mmap_mode)
+        self.compiled = None
@@ -0,0 +1,331 @@
+# app/modules/ai_ml/features.py
+"""
+Windowed fatigue features shared by the live detector, training and scoring.
+
+Each window of observations becomes one feature vector (FEATURE_NAMES):
+
+    blink_rate           blinks per minute
+    perclos              fraction of the window's time with eyes at least 80% closed (RollingPerclos)
+    blink_duration_mean  mean duration of eye closures ending in the window, seconds
+    blink_duration_std   standard deviation of those durations
+    yawn_rate            yawns (mouth open for MIN_YAWN_DURATION) per minute
+    head_away_ratio      fraction of the window's time with the head not centered
+    heart_rate           mean wearable heart rate, 0 when no wearable reported
+
+Per-frame signals go through FeatureStream, which keeps running sums over a
+sliding time window and emits a vector every `stride` seconds with O(1)
+amortized work per frame. The live detector feeds it frame by frame, reports
+its PERCLOS and scores each vector with the active model; session
+recordings (.npz files) are replayed through the same class in bulk, so
+training and serving share one definition. Recordings hold these arrays:
+
+    timestamp      seconds, increasing
+    ear            eye aspect ratio per frame
+    mar            mouth aspect ratio per frame
+    head_centered  bool per frame
+    heart_rate     optional, NaN where unknown
+    label          optional, 1 = fatigued, used as the training target
+
+Stored metric snapshots (the `trends/{email}/metrics` documents) only carry
+per-frame summaries (including the detector's PERCLOS), so history_features
+approximates the same vector from them with cumulative sums.
+"""
+
+import math
+from collections import deque
+from typing import Optional
+import numpy as np
+from app.models.metrics import MetricsRecord
+
+FEATURE_NAMES = ['blink_rate', 'perclos', 'blink_duration_mean', 'blink_duration_std',
+                 'yawn_rate', 'head_away_ratio', 'heart_rate']
+FEATURE_VERSION = 3  # Bump when a definition changes; invalidates cached feature matrices
+
+# Same detection thresholds as the live FatigueDetector
+EAR_THRESHOLD = 0.2
+MAR_THRESHOLD = 1.0
+MIN_YAWN_DURATION = 1.0  # Seconds
+PERCLOS_CLOSURE = 0.8  # P80: eyes count as closed at 80% closure
+
+def _window_bounds(timestamps: np.ndarray, window: float, stride: float):
+    """Start/end indices of each [start, start + window) window"""
+    if len(timestamps) == 0 or timestamps[-1] - timestamps[0] < window:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    starts = np.arange(timestamps[0], timestamps[-1] - window + 1e-9, stride)
+    lo = np.searchsorted(timestamps, starts, side='left')
+    hi = np.searchsorted(timestamps, starts + window, side='left')
+    return lo, hi
+
+def _window_sums(values: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    cumulative = np.concatenate([[0.0], np.cumsum(values, dtype=np.float64)])
+    return cumulative[hi] - cumulative[lo]
+
+def history_columns(documents) -> dict:
+    """Columnar view of stored metric snapshots, sorted by time"""
+    records = [MetricsRecord.from_dict(doc) for doc in documents if doc.get('timestamp') is not None]
+    records.sort(key=lambda record: record.timestamp)
+    return {
+        'timestamp': np.array([record.timestamp.timestamp() for record in records], dtype=np.float64),
+        'detecting': np.array([bool(record.is_detecting) for record in records]),
+        'blink_rate': np.array([record.blink_rate for record in records], dtype=np.float64),
+        'perclos': np.array([record.perclos for record in records], dtype=np.float64),
+        'eye_closure': np.array([record.eye_closure for record in records], dtype=np.float64),
+        'yawn_count': np.array([record.yawn_count for record in records], dtype=np.float64),
+        'head_away': np.array([record.head_position != 'Centered' for record in records]),
+        'heart_rate': np.array([np.nan if record.heart_rate is None else record.heart_rate for record in records]),
+        'alertness': np.array([record.alertness for record in records], dtype=np.float64),
+    }
+
+def history_features(columns: dict, window: float = 60.0, stride: float = 15.0, min_samples: int = 5):
+    """Feature matrix and mean alertness per window of stored snapshots"""
+    lo, hi = _window_bounds(columns['timestamp'], window, stride)
+    if len(lo) == 0:
+        return np.empty((0, len(FEATURE_NAMES))), np.empty(0)
+    detecting = columns['detecting'].astype(np.float64)
+    samples = _window_sums(detecting, lo, hi)
+    keep = samples >= min_samples
+    lo, hi, samples = lo[keep], hi[keep], samples[keep]
+
+    def detected_mean(name):
+        return _window_sums(columns[name] * detecting, lo, hi) / samples
+
+    heart_rate = columns['heart_rate']
+    has_hr = ~np.isnan(heart_rate)
+    hr_counts = _window_sums(has_hr.astype(np.float64), lo, hi)
+    hr_sums = _window_sums(np.where(has_hr, heart_rate, 0.0), lo, hi)
+
+    # Snapshots carry the detector's mean closure duration; use its spread as the std
+    closure_mean = detected_mean('eye_closure')
+    closure_sq = _window_sums(columns['eye_closure'] ** 2 * detecting, lo, hi) / samples
+    closure_std = np.sqrt(np.maximum(closure_sq - closure_mean ** 2, 0.0))
+
+    X = np.column_stack([
+        detected_mean('blink_rate'),
+        detected_mean('perclos'),
+        closure_mean,
+        closure_std,
+        detected_mean('yawn_count'),
+        detected_mean('head_away'),
+        np.divide(hr_sums, hr_counts, out=np.zeros_like(hr_sums), where=hr_counts > 0),
+    ])
+    return X, detected_mean('alertness')
+
+class RollingPerclos:
+    """PERCLOS over a sliding time window with O(1) work per frame.
+
+    Time is split into a ring of fixed-width buckets holding closed and total
+    seconds. Moving to a new bucket subtracts only the bucket being reused,
+    so the window is never re-scanned. Eyes count as closed when the EAR is
+    at most (1 - closure) of the open-eye baseline, tracked as a slow moving
+    average of open-eye EAR.
+    """
+
+    BASELINE_ALPHA = 0.01   # Open-eye EAR smoothing per frame
+    MAX_FRAME_GAP = 1.0     # Seconds; longer gaps (no face) are not counted as observed time
+
+    def __init__(self, window=60.0, closure=PERCLOS_CLOSURE, open_threshold=EAR_THRESHOLD, bucket=1.0):
+        self.bucket = bucket
+        self.closure = closure
+        self.open_threshold = open_threshold  # EAR above this updates the open-eye baseline
+        self.n_buckets = max(1, int(round(window / bucket)))
+        self.reset()
+
+    def reset(self):
+        self.closed = [0.0] * self.n_buckets
+        self.total = [0.0] * self.n_buckets
+        self.closed_sum = 0.0
+        self.total_sum = 0.0
+        self.current = None       # Absolute index of the newest bucket
+        self.last_time = None
+        self.last_closed = False
+        self.open_ear = None
+
+    @property
+    def value(self):
+        return self.closed_sum / self.total_sum if self.total_sum > 0 else 0.0
+
+    def update(self, timestamp, ear):
+        """Add one frame and return the current PERCLOS"""
+        index = int(timestamp // self.bucket)
+        if self.current is None:
+            self.current = index
+        elif index > self.current:
+            if index - self.current >= self.n_buckets:
+                # Whole window expired; also clears accumulated float error
+                self.closed = [0.0] * self.n_buckets
+                self.total = [0.0] * self.n_buckets
+                self.closed_sum = self.total_sum = 0.0
+            else:
+                for expired in range(self.current + 1, index + 1):
+                    slot = expired % self.n_buckets
+                    self.closed_sum -= self.closed[slot]
+                    self.total_sum -= self.total[slot]
+                    self.closed[slot] = self.total[slot] = 0.0
+            self.current = index
+
+        # The previous frame's state holds until this frame
+        if self.last_time is not None:
+            dt = timestamp - self.last_time
+            if 0 < dt <= self.MAX_FRAME_GAP:
+                slot = index % self.n_buckets
+                self.total[slot] += dt
+                self.total_sum += dt
+                if self.last_closed:
+                    self.closed[slot] += dt
+                    self.closed_sum += dt
+
+        if ear >= self.open_threshold:
+            self.open_ear = ear if self.open_ear is None else \
+                self.open_ear + self.BASELINE_ALPHA * (ear - self.open_ear)
+        # Without a baseline yet, fall back to the blink threshold
+        limit = (1 - self.closure) * self.open_ear if self.open_ear else self.open_threshold
+        self.last_closed = ear <= limit
+        self.last_time = timestamp
+        return self.value
+
+class FeatureStream:
+    """Sliding-window FEATURE_NAMES over per-frame signals, updated in O(1) per frame.
+
+    Each frame's state is held until the next frame arrives, so PERCLOS and
+    head-away are time-weighted and insensitive to frame-rate changes. Blinks
+    (EAR below EAR_THRESHOLD) and yawns are counted when they end; PERCLOS
+    is the RollingPerclos over the same window.
+    """
+
+    def __init__(self, window: float = 60.0, stride: float = 15.0, closure: float = PERCLOS_CLOSURE):
+        self.window = window
+        self.stride = stride
+        self.perclos = RollingPerclos(window, closure)
+        self.latest: Optional[np.ndarray] = None  # Last emitted vector
+        self.reset()
+
+    def reset(self):
+        self.perclos.reset()
+        self._frames = deque()  # (timestamp, dt, away dt, heart rate or None)
+        self._blinks = deque()  # (end timestamp, duration)
+        self._yawns = deque()   # end timestamp
+        self._time = self._away_time = 0.0
+        self._hr_sum, self._hr_count = 0.0, 0
+        self._blink_sum = self._blink_sq = 0.0
+        self._previous = None     # (timestamp, away)
+        self._closed_since = None
+        self._yawn_since = None
+        self._next_emit = None
+
+    def update(self, timestamp: float, ear: float, mar: float, head_centered: bool,
+               heart_rate: Optional[float] = None) -> Optional[np.ndarray]:
+        """Add one frame; returns a feature vector when a stride boundary is reached"""
+        closed = ear < EAR_THRESHOLD
+        away = not head_centered
+        if heart_rate is not None and math.isnan(heart_rate):
+            heart_rate = None
+
+        self.perclos.update(timestamp, ear)
+        dt = away_dt = 0.0
+        if self._previous is not None:
+            previous_time, was_away = self._previous
+            dt = max(0.0, timestamp - previous_time)
+            away_dt = dt if was_away else 0.0
+        self._frames.append((timestamp, dt, away_dt, heart_rate))
+        self._time += dt
+        self._away_time += away_dt
+        if heart_rate is not None:
+            self._hr_sum += heart_rate
+            self._hr_count += 1
+        self._previous = (timestamp, away)
+
+        if closed and self._closed_since is None:
+            self._closed_since = timestamp
+        elif not closed and self._closed_since is not None:
+            duration = timestamp - self._closed_since
+            self._blinks.append((timestamp, duration))
+            self._blink_sum += duration
+            self._blink_sq += duration * duration
+            self._closed_since = None
+
+        if mar > MAR_THRESHOLD:
+            if self._yawn_since is None:
+                self._yawn_since = timestamp
+        elif self._yawn_since is not None:
+            if timestamp - self._yawn_since >= MIN_YAWN_DURATION:
+                self._yawns.append(timestamp)
+            self._yawn_since = None
+
+        self._expire(timestamp - self.window)
+
+        if self._next_emit is None:
+            self._next_emit = timestamp + self.window  # First vector once a full window is seen
+        if timestamp < self._next_emit:
+            return None
+        # Skip boundaries missed during a gap instead of emitting a burst
+        self._next_emit += self.stride * (math.floor((timestamp - self._next_emit) / self.stride) + 1)
+        self.latest = self.vector()
+        return self.latest
+
+    def vector(self) -> np.ndarray:
+        """Features of the current window (ordered as FEATURE_NAMES)"""
+        per_minute = 60.0 / self.window
+        blinks = len(self._blinks)
+        blink_mean = self._blink_sum / blinks if blinks else 0.0
+        blink_var = self._blink_sq / blinks - blink_mean ** 2 if blinks else 0.0
+        return np.array([
+            blinks * per_minute,
+            self.perclos.value,
+            blink_mean,
+            math.sqrt(max(blink_var, 0.0)),
+            len(self._yawns) * per_minute,
+            self._away_time / self._time if self._time > 0 else 0.0,
+            self._hr_sum / self._hr_count if self._hr_count else 0.0,
+        ])
+
+    def _expire(self, cutoff: float):
+        frames = self._frames
+        while frames and frames[0][0] <= cutoff:
+            _, dt, away_dt, heart_rate = frames.popleft()
+            self._time -= dt
+            self._away_time -= away_dt
+            if heart_rate is not None:
+                self._hr_sum -= heart_rate
+                self._hr_count -= 1
+        while self._blinks and self._blinks[0][0] <= cutoff:
+            _, duration = self._blinks.popleft()
+            self._blink_sum -= duration
+            self._blink_sq -= duration * duration
+        while self._yawns and self._yawns[0] <= cutoff:
+            self._yawns.popleft()
+        if not frames:
+            # Running sums drift with float subtraction; restart them when the window empties
+            self._time = self._away_time = self._hr_sum = 0.0
+        if not self._blinks:
+            self._blink_sum = self._blink_sq = 0.0
+
+    def run(self, timestamps, ear, mar, head_centered, heart_rate=None):
+        """Bulk mode: replay recorded arrays, returning (X, index of the frame ending each window)"""
+        rows, ends = [], []
+        heart_rate = heart_rate if heart_rate is not None else [None] * len(timestamps)
+        for i, values in enumerate(zip(np.asarray(timestamps, dtype=np.float64).tolist(),
+                                       np.asarray(ear, dtype=np.float64).tolist(),
+                                       np.asarray(mar, dtype=np.float64).tolist(),
+                                       np.asarray(head_centered, dtype=bool).tolist(),
+                                       list(heart_rate))):
+            vector = self.update(*values)
+            if vector is not None:
+                rows.append(vector)
+                ends.append(i)
+        X = np.vstack(rows) if rows else np.empty((0, len(FEATURE_NAMES)))
+        return X, np.asarray(ends, dtype=np.intp)
+
+def recording_features(recording, window: float = 60.0, stride: float = 15.0):
+    """Feature matrix and label fraction (NaN when unlabeled) per window of a recording"""
+    timestamps = np.asarray(recording['timestamp'], dtype=np.float64)
+    heart_rate = np.asarray(recording['heart_rate'], dtype=np.float64).tolist() if 'heart_rate' in recording else None
+    X, ends = FeatureStream(window, stride).run(
+        timestamps, recording['ear'], recording['mar'], recording['head_centered'], heart_rate
+    )
+    if 'label' not in recording:
+        return X, np.full(len(X), np.nan)
+    # Label fraction over the same (end - window, end] frames the stream saw
+    hi = ends + 1
+    lo = np.searchsorted(timestamps, timestamps[ends] - window, side='right')
+    target = _window_sums(np.asarray(recording['label'], dtype=np.float64), lo, hi) / (hi - lo)
+    return X, target
@@ -0,0 +1,93 @@
+# app/modules/ai_ml/micro_batcher.py
+"""
+Groups concurrent single-vector scoring requests into one model call.
+
+Each predict_proba call pays sklearn's input validation and per-tree dispatch
+once, whatever the number of rows, so scoring N queued vectors together costs
+far less than N separate calls. Requests wait at most `max_wait_ms` for
+company before the batch is scored.
+"""
+
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+import numpy as np
+from app.core.async_runtime import run_blocking
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher:
+    def __init__(self, score_fn, max_batch_size=256, max_wait_ms=5.0):
+        self.score_fn = score_fn  # 2-D array -> 1-D array of scores
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.requests = queue.Queue()
+        self.running = False
+        self.thread = None
+        self.batches = 0  # Scoring calls made
+        self.scored = 0   # Vectors scored
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='fatigue-micro-batcher', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(1.0)
+            self.thread = None
+
+    def submit(self, features) -> Future:
+        """Queue one feature vector; the future resolves to its score"""
+        future = Future()
+        self.requests.put((np.asarray(features, dtype=np.float64), future))
+        return future
+
+    def score(self, features, timeout=5.0) -> float:
+        """Score one feature vector through the batcher"""
+        return self.submit(features).result(timeout)
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.scored / self.batches if self.batches else 0.0
+
+    def _run(self):
+        while self.running:
+            try:
+                first = self.requests.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            # Collect whatever arrives within the wait budget, up to the batch limit
+            pending = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        pending.append(self.requests.get(timeout=remaining))
+                    else:
+                        pending.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._score_batch(pending)
+
+    def _score_batch(self, pending):
+        try:
+            batch = np.vstack([features for features, _ in pending])
+            scores = run_blocking(self.score_fn, batch)
+            self.batches += 1
+            self.scored += len(pending)
+            for (_, future), score in zip(pending, scores):
+                future.set_result(float(score))
+        except Exception as e:
+            logger.error(f"Error scoring batch of {len(pending)}: {str(e)}")
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
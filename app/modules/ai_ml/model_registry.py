@@ -0,0 +1,246 @@
+# app/modules/ai_ml/model_registry.py
+"""
+Process-wide registry for the fatigue model.
+
+Versions live under dataset-model/fatigue/<version>/ and are listed in
+manifest.json together with the active version:
+
+    {"active": "v2",
+     "versions": {"v2": {"path": "v2/model.joblib", "sklearn_version": "1.5.2",
+                         "n_features": 7, "feature_names": ["blink_rate", ...], "feature_version": 3,
+                         "created": "2026-10-19T12:00:00"}}}
+
+Artifacts are loaded once per process with joblib memory mapping, validated
+against the manifest and the running scikit-learn, smoke-tested, and only
+then swapped in with a single reference assignment; requests in flight keep
+the model they started with. Workers pick up a new active version by
+re-reading the manifest, so a model can be rolled out without restarts.
+A failed load is retried with exponential backoff (up to the reload
+interval), not on every request. Concurrent callers wait for a single load,
+which runs on the blocking pool in the cooperative server modes.
+
+Models saved before the registry (dataset-model/fatigue_model.joblib) are
+not loaded: they predate FEATURE_NAMES and were rejected by the feature
+check anyway. Retrain and publish with app.modules.ai_ml.training.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Optional, TYPE_CHECKING
+import numpy as np
+from app.config import Config
+from app.core.async_runtime import run_blocking
+from app.services.performance import rss_bytes
+from app.modules.ai_ml.features import FEATURE_NAMES, FEATURE_VERSION
+from definition import DATASET_MODEL_DIR
+
+if TYPE_CHECKING:
+    from app.modules.ai_ml.fatigue_model import FatigueDetectionModel
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_DIR = os.path.join(DATASET_MODEL_DIR, 'fatigue')
+MANIFEST_NAME = 'manifest.json'
+
+class ModelVersionError(Exception):
+    """Raised when an artifact does not match its manifest or this runtime"""
+
+@dataclass(frozen=True)
+class LoadedModel:
+    version: str
+    model: 'FatigueDetectionModel'
+    load_seconds: float
+    artifact_bytes: int             # Size of the joblib files on disk
+    rss_delta_bytes: Optional[int]  # Resident memory added by the load (Linux only)
+    loaded_at: datetime
+
+    def stats(self) -> Dict:
+        return {
+            'version': self.version,
+            'compiled': self.model.compiled is not None,
+            'loadSeconds': round(self.load_seconds, 4),
+            'artifactBytes': self.artifact_bytes,
+            'rssDeltaBytes': self.rss_delta_bytes,
+            'loadedAt': self.loaded_at.isoformat()
+        }
+
+def _sklearn_version() -> str:
+    import sklearn
+    return sklearn.__version__
+
+class ModelRegistry:
+    _instance: Optional['ModelRegistry'] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, root: str = REGISTRY_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_NAME)
+        self.reload_interval = Config.MODEL_RELOAD_INTERVAL
+        self._current: Optional[LoadedModel] = None
+        self._manifest_mtime = None
+        self._last_check = 0.0
+        self._retry_delay = 0.0  # Seconds to wait after a failed load, doubled per failure
+        self._next_attempt = 0.0
+        self._swap_lock = threading.Lock()
+        self._load_lock = threading.Lock()  # One load or manifest check at a time
+
+    @classmethod
+    def get_instance(cls) -> 'ModelRegistry':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = ModelRegistry()
+            return cls._instance
+
+    def current(self) -> Optional[LoadedModel]:
+        """Active model, loading it (or a newly activated version) when needed"""
+        now = time.monotonic()
+        if now < self._next_attempt:
+            return self._current
+        if self._current is not None and now - self._last_check < self.reload_interval:
+            return self._current
+        with self._load_lock:
+            # Concurrent first requests wait for one load instead of each unpickling the model
+            now = time.monotonic()
+            if now < self._next_attempt:
+                return self._current
+            if self._current is None or now - self._last_check >= self.reload_interval:
+                self._last_check = now
+                try:
+                    # Unpickling and the smoke test block; keep them off the hub
+                    run_blocking(self.reload_if_changed)
+                    self._retry_delay = 0.0
+                except Exception as e:
+                    self._retry_delay = min(max(self._retry_delay * 2, 1.0), self.reload_interval)
+                    self._next_attempt = now + self._retry_delay
+                    logger.error(f"Error reloading fatigue model, next attempt in {self._retry_delay:.0f} s: {str(e)}")
+        return self._current
+
+    def predict_proba(self, X):
+        """Score with the active model; raises when no model is available"""
+        loaded = self.current()
+        if loaded is None:
+            raise ModelVersionError("No fatigue model loaded")
+        return loaded.model.predict_proba(X)
+
+    def reload_if_changed(self):
+        """Activate the manifest's active version if the manifest changed"""
+        if not os.path.exists(self.manifest_path):
+            if self._current is None:
+                raise ModelVersionError(f"No model published ({self.manifest_path} is missing)")
+            return
+
+        mtime = os.path.getmtime(self.manifest_path)
+        if mtime == self._manifest_mtime and self._current is not None:
+            return
+        manifest = self._read_manifest()
+        self._manifest_mtime = mtime
+        active = manifest.get('active')
+        if active and (self._current is None or self._current.version != active):
+            self.activate(active, manifest)
+
+    def activate(self, version: str, manifest: Optional[Dict] = None) -> LoadedModel:
+        """Load, validate and atomically swap in a version"""
+        manifest = manifest or self._read_manifest()
+        entry = manifest.get('versions', {}).get(version)
+        if entry is None:
+            raise ModelVersionError(f"Model version {version} is not in the manifest")
+        loaded = self._load(version, os.path.join(self.root, entry['path']), entry)
+        self._swap(loaded)
+        return loaded
+
+    def publish(self, model: 'FatigueDetectionModel', version: str, activate: bool = True, feature_names=None) -> str:
+        """Save a trained model as a new version and (optionally) make it active"""
+        version_dir = os.path.join(self.root, version)
+        os.makedirs(version_dir, exist_ok=True)
+        path = os.path.join(version_dir, 'model.joblib')
+        model.save_model(path)
+
+        with self._swap_lock:
+            manifest = self._read_manifest() if os.path.exists(self.manifest_path) else {'versions': {}}
+            manifest['versions'][version] = {
+                'path': os.path.relpath(path, self.root),
+                'sklearn_version': _sklearn_version(),
+                'n_features': int(model.scaler.n_features_in_),
+                'feature_names': list(feature_names) if feature_names else None,
+                'feature_version': FEATURE_VERSION if feature_names else None,
+                'created': datetime.utcnow().isoformat()
+            }
+            if activate:
+                manifest['active'] = version
+            # Write then rename so workers never read a half-written manifest
+            tmp_path = self.manifest_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, self.manifest_path)
+        return path
+
+    def stats(self) -> Dict:
+        loaded = self._current
+        return loaded.stats() if loaded else {'version': None}
+
+    def _read_manifest(self) -> Dict:
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _load(self, version: str, path: str, entry: Dict) -> LoadedModel:
+        trained_on = entry.get('feature_names')
+        if trained_on and list(trained_on) != FEATURE_NAMES:
+            raise ModelVersionError(f"Model {version} was trained on features {trained_on}, expected {FEATURE_NAMES}")
+        # Same names can still change meaning (e.g. the PERCLOS closure definition)
+        if trained_on and entry.get('feature_version') != FEATURE_VERSION:
+            raise ModelVersionError(
+                f"Model {version} was trained on feature version {entry.get('feature_version')}, serving uses {FEATURE_VERSION}"
+            )
+        # Pickles are only portable within a scikit-learn minor release
+        expected = entry.get('sklearn_version')
+        if expected and expected.split('.')[:2] != _sklearn_version().split('.')[:2]:
+            raise ModelVersionError(
+                f"Model {version} was built with scikit-learn {expected}, running {_sklearn_version()}"
+            )
+
+        # scikit-learn is imported with the first model, not with the blueprint
+        from app.modules.ai_ml.fatigue_model import FatigueDetectionModel
+        rss_before = rss_bytes()
+        start = time.perf_counter()
+        model = FatigueDetectionModel()
+        # NumPy arrays in the pickles are mapped from the page cache instead of copied
+        model.load_model(path, mmap_mode='r')
+        load_seconds = time.perf_counter() - start
+        rss_after = rss_bytes()
+
+        n_features = getattr(model.scaler, 'n_features_in_', None)
+        if n_features != entry.get('n_features', len(FEATURE_NAMES)) or n_features != len(FEATURE_NAMES):
+            raise ModelVersionError(f"Model {version} expects {n_features} features, serving uses {len(FEATURE_NAMES)}")
+        if Config.USE_COMPILED_FOREST:
+            model.compiled_max_batch = Config.COMPILED_FOREST_MAX_BATCH
+            try:
+                model.compile()  # Verified against sklearn before it is used
+            except Exception as e:
+                logger.error(f"Error compiling fatigue model {version}, using sklearn scoring: {str(e)}")
+        # Smoke test before the model can serve traffic
+        model.predict_proba(np.zeros((1, n_features)))
+
+        artifact_bytes = sum(os.path.getsize(p) for p in (path, path + '_scaler') if os.path.exists(p))
+        loaded = LoadedModel(
+            version=version,
+            model=model,
+            load_seconds=load_seconds,
+            artifact_bytes=artifact_bytes,
+            rss_delta_bytes=(rss_after - rss_before) if rss_before is not None and rss_after is not None else None,
+            loaded_at=datetime.utcnow()
+        )
+        logger.info(f"Loaded fatigue model {version} in {load_seconds * 1000:.1f} ms "
+                    f"({artifact_bytes} bytes on disk, RSS +{loaded.rss_delta_bytes})")
+        return loaded
+
+    def _swap(self, loaded: LoadedModel):
+        with self._swap_lock:
+            previous = self._current
+            self._current = loaded  # Readers see either the old or the new model, never a mix
+        if previous and previous.version != loaded.version:
+            logger.info(f"Fatigue model swapped {previous.version} -> {loaded.version}")
@@ -0,0 +1,198 @@
+# app/modules/ai_ml/training.py
+"""
+Train and publish the fatigue model from observed data.
+
+    python -m app.modules.ai_ml.training --users driver@example.com \
+        --recordings "recordings/*.npz" --fatigue-threshold 60 --jobs -1
+
+Sources are turned into windowed feature matrices (see features.py) in
+parallel worker processes. Each matrix is cached on disk, keyed by the
+source's fingerprint, the window settings and FEATURE_VERSION. Labels are
+derived at training time (stored snapshots: mean alertness below
+--fatigue-threshold; recordings: labelled fraction of at least half), so
+retraining after a threshold tweak reuses every cached matrix.
+"""
+
+import os
+import glob
+import time
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+from joblib import Parallel, delayed
+from app.modules.ai_ml import features
+from app.modules.ai_ml.fatigue_model import FatigueDetectionModel
+from definition import DATASET_MODEL_DIR
+
+logger = logging.getLogger(__name__)
+
+FEATURE_CACHE_DIR = os.path.join(DATASET_MODEL_DIR, 'feature-cache')
+HISTORY = 'history'
+RECORDING = 'recording'
+
+def _cache_path(cache_dir, kind, fingerprint, window, stride):
+    key = f"{kind}|{fingerprint}|{window}|{stride}|v{features.FEATURE_VERSION}"
+    return os.path.join(cache_dir, hashlib.sha1(key.encode()).hexdigest() + '.npz')
+
+def _load_cached(path):
+    if path and os.path.exists(path):
+        with np.load(path) as cached:
+            return cached['X'], cached['target']
+    return None
+
+def _store_cached(path, X, target):
+    if path:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, X=X, target=target)
+        os.replace(tmp_path, path)
+
+def _extract_history(columns, window, stride, cache_path):
+    X, target = features.history_features(columns, window, stride)
+    _store_cached(cache_path, X, target)
+    return HISTORY, X, target
+
+def _extract_recording(path, window, stride, cache_path):
+    with np.load(path) as recording:
+        X, target = features.recording_features(dict(recording), window, stride)
+    _store_cached(cache_path, X, target)
+    return RECORDING, X, target
+
+def _history_fingerprint(user_email, collection):
+    """Document count and newest timestamp, without streaming the collection"""
+    count = collection.count().get()[0][0].value
+    latest = list(collection.order_by('timestamp', direction='DESCENDING').limit(1).stream())
+    newest = latest[0].to_dict().get('timestamp') if latest else None
+    return f"{user_email}|{count}|{newest}"
+
+def _fetch_history(db, user_email, window, stride, cache_dir, use_cache):
+    """(cached matrix, None, path) on a cache hit, else (None, columns to extract, path)"""
+    collection = db.collection('trends').document(user_email).collection('metrics')
+    cache_path = None
+    try:
+        cache_path = _cache_path(cache_dir, HISTORY, _history_fingerprint(user_email, collection), window, stride)
+        cached = _load_cached(cache_path) if use_cache else None
+        if cached:
+            return cached, None, cache_path
+    except Exception as e:
+        logger.warning(f"Feature cache unavailable for {user_email}: {str(e)}")
+
+    documents = [doc.to_dict() for doc in collection.stream()]
+    return None, features.history_columns(documents), cache_path
+
+def build_dataset(users, recordings, window, stride, jobs, cache_dir=FEATURE_CACHE_DIR, use_cache=True):
+    """Extract (kind, X, target) blocks for every source, reusing cached matrices"""
+    blocks, tasks = [], []
+
+    if users:
+        from app.utils.firebase_client import FirebaseClient
+        client = FirebaseClient()
+        client.initialize()
+        db = client.get_db()
+        # Firestore reads are I/O bound: fetch users concurrently in threads
+        with ThreadPoolExecutor(max_workers=min(8, len(users))) as pool:
+            fetched = pool.map(lambda user: _fetch_history(db, user, window, stride, cache_dir, use_cache), users)
+            for cached, columns, cache_path in fetched:
+                if cached:
+                    blocks.append((HISTORY, *cached))
+                else:
+                    tasks.append(delayed(_extract_history)(columns, window, stride, cache_path))
+
+    for path in recordings:
+        stat = os.stat(path)
+        cache_path = _cache_path(cache_dir, RECORDING, f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}", window, stride)
+        cached = _load_cached(cache_path) if use_cache else None
+        if cached:
+            blocks.append((RECORDING, *cached))
+        else:
+            tasks.append(delayed(_extract_recording)(path, window, stride, cache_path))
+
+    logger.info(f"{len(blocks)} sources from cache, {len(tasks)} to extract")
+    if tasks:
+        # Feature extraction is CPU bound: one process per core
+        for kind, X, target in Parallel(n_jobs=jobs)(tasks):
+            blocks.append((kind, X, target))
+    return blocks
+
+def labels_for(blocks, fatigue_threshold):
+    """Stack blocks into X, y; unlabeled recording windows are dropped"""
+    X_parts, y_parts = [], []
+    for kind, X, target in blocks:
+        if kind == HISTORY:
+            y = (target < fatigue_threshold).astype(int)
+        else:
+            labelled = ~np.isnan(target)
+            X, y = X[labelled], (target[labelled] >= 0.5).astype(int)
+        X_parts.append(X)
+        y_parts.append(y)
+    if not X_parts:
+        return np.empty((0, len(features.FEATURE_NAMES))), np.empty(0, dtype=int)
+    return np.vstack(X_parts), np.concatenate(y_parts)
+
+def train(X, y, trees, jobs, seed=None):
+    """Fit on a held-out split for reporting, then refit on everything"""
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import accuracy_score, roc_auc_score
+
+    model = FatigueDetectionModel()
+    model.model.set_params(n_estimators=trees, n_jobs=jobs, random_state=seed)
+
+    report = {}
+    if len(np.unique(y)) == 2 and min(np.bincount(y)) >= 2:
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, stratify=y, random_state=seed)
+        model.train(X_train, y_train)
+        scores = model.predict_proba(X_test, use_compiled=False)
+        report = {
+            'accuracy': accuracy_score(y_test, scores >= 0.5),
+            'roc_auc': roc_auc_score(y_test, scores)
+        }
+
+    model.train(X, y)
+    # Serving scores small batches; per-call thread fan-out would only add latency
+    model.model.set_params(n_jobs=None)
+    return model, report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', nargs='*', default=[], help='user emails whose stored snapshots to use')
+    parser.add_argument('--recordings', nargs='*', default=[], help='.npz session recordings (globs allowed)')
+    parser.add_argument('--window', type=float, default=60.0, help='window length in seconds')
+    parser.add_argument('--stride', type=float, default=15.0, help='seconds between window starts')
+    parser.add_argument('--fatigue-threshold', type=float, default=60.0, help='mean alertness below this is labelled fatigued')
+    parser.add_argument('--trees', type=int, default=100)
+    parser.add_argument('--jobs', type=int, default=-1, help='processes for extraction and training (-1 = all cores)')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--version', default=None, help='model version name (default: timestamp)')
+    parser.add_argument('--no-activate', action='store_true', help='publish without making the version active')
+    parser.add_argument('--no-cache', action='store_true', help='ignore cached feature matrices')
+    parser.add_argument('--cache-dir', default=FEATURE_CACHE_DIR)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    recordings = sorted({path for pattern in args.recordings for path in glob.glob(pattern)})
+    if not args.users and not recordings:
+        parser.error('no training sources (use --users and/or --recordings)')
+
+    start = time.perf_counter()
+    blocks = build_dataset(args.users, recordings, args.window, args.stride, args.jobs,
+                           cache_dir=args.cache_dir, use_cache=not args.no_cache)
+    X, y = labels_for(blocks, args.fatigue_threshold)
+    extracted = time.perf_counter()
+    logger.info(f"{len(X)} windows ({int(y.sum())} fatigued) in {extracted - start:.1f}s")
+    if len(np.unique(y)) < 2:
+        parser.error('training data needs both fatigued and alert windows')
+
+    model, report = train(X, y, args.trees, args.jobs, args.seed)
+    logger.info(f"Trained in {time.perf_counter() - extracted:.1f}s; held-out {report}")
+
+    from app.modules.ai_ml.model_registry import ModelRegistry
+    version = args.version or datetime.utcnow().strftime('v%Y%m%d%H%M%S')
+    path = ModelRegistry.get_instance().publish(model, version, activate=not args.no_activate,
+                                                feature_names=features.FEATURE_NAMES)
+    logger.info(f"Published fatigue model {version} to {path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+# app/modules/capture.py
+"""
+Camera capture configuration and mode negotiation.
+
+Webcams default to whatever the driver prefers, often 1080p MJPG or raw
+YUYV, and every byte of that is decoded and color-converted before the face
+mesh shrinks it to a few hundred pixels anyway. CaptureConfig pins the
+resolution, FPS, FOURCC and driver buffer size; with probing enabled, each
+candidate mode meeting the target is opened for a few frames and the one
+with the lowest CPU time per read (decode and color conversion, not time
+spent waiting for the device) wins.
+
+Frames can be read with read() or with grab()/retrieve(): grabbing only
+advances the device, so frames that would be dropped anyway are never
+decoded.
+"""
+
+import time
+import logging
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+import cv2
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+READ = 'read'
+GRAB = 'grab'
+
+# Common UVC modes, smallest first
+CANDIDATE_RESOLUTIONS = [(320, 240), (424, 240), (640, 360), (640, 480), (848, 480),
+                         (960, 540), (1280, 720), (1920, 1080)]
+CANDIDATE_FOURCCS = ['MJPG', 'YUYV']
+PROBE_WARMUP_FRAMES = 3
+PROBE_FRAMES = 10
+
+@dataclass(frozen=True)
+class CaptureConfig:
+    width: int = 640
+    height: int = 480
+    fps: float = 30.0
+    fourcc: str = 'MJPG'            # '' keeps the driver default
+    buffer_size: int = 1            # Driver-side queue; 1 keeps latency at one frame
+    strategy: str = GRAB            # READ, or GRAB to skip decoding dropped frames
+    probe: bool = False             # Measure candidate modes and pick the cheapest meeting the target
+    inference_width: int = 640      # Detection runs on a copy at most this wide (0 = full size)
+    full_resolution: bool = False   # Stream the captured frame rather than the inference copy
+
+    @classmethod
+    def from_config(cls) -> 'CaptureConfig':
+        return cls(
+            width=Config.CAPTURE_WIDTH,
+            height=Config.CAPTURE_HEIGHT,
+            fps=Config.CAPTURE_FPS,
+            fourcc=Config.CAPTURE_FOURCC,
+            buffer_size=Config.CAPTURE_BUFFER_SIZE,
+            strategy=Config.CAPTURE_STRATEGY,
+            probe=Config.CAPTURE_PROBE,
+            inference_width=Config.INFERENCE_WIDTH,
+            full_resolution=Config.STREAM_FULL_RESOLUTION
+        )
+
+    def inference_size(self, frame_width: int, frame_height: int) -> Optional[Tuple[int, int]]:
+        """Target size of the inference copy, None when the frame is already small enough"""
+        if not self.inference_width or frame_width <= self.inference_width:
+            return None
+        scale = self.inference_width / frame_width
+        return self.inference_width, max(1, int(round(frame_height * scale)))
+
+@dataclass(frozen=True)
+class ModeReport:
+    width: int
+    height: int
+    fps: float
+    fourcc: str
+    cpu_ms: float       # Mean CPU time of read() per frame
+    measured_fps: float
+
+def _fourcc_code(fourcc: str) -> int:
+    return cv2.VideoWriter_fourcc(*fourcc)
+
+def _fourcc_name(code: float) -> str:
+    code = int(code)
+    return ''.join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip('\x00')
+
+def apply_config(capture: cv2.VideoCapture, config: CaptureConfig) -> Dict:
+    """Request a mode on an open capture and return what the driver granted"""
+    # V4L2 only honours the pixel format when it is set before the frame size
+    if config.fourcc:
+        capture.set(cv2.CAP_PROP_FOURCC, _fourcc_code(config.fourcc))
+    capture.set(cv2.CAP_PROP_FRAME_WIDTH, config.width)
+    capture.set(cv2.CAP_PROP_FRAME_HEIGHT, config.height)
+    capture.set(cv2.CAP_PROP_FPS, config.fps)
+    capture.set(cv2.CAP_PROP_BUFFERSIZE, config.buffer_size)
+    return {
+        'width': int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        'fps': capture.get(cv2.CAP_PROP_FPS),
+        'fourcc': _fourcc_name(capture.get(cv2.CAP_PROP_FOURCC))
+    }
+
+def _measure(capture: cv2.VideoCapture) -> Optional[Tuple[float, float]]:
+    """(CPU ms per read, frames per second) over PROBE_FRAMES, None if reads fail"""
+    for _ in range(PROBE_WARMUP_FRAMES):
+        if not capture.read()[0]:
+            return None
+    # Reads block until the device delivers; thread CPU time counts only decoding work
+    start, cpu_start = time.perf_counter(), time.thread_time()
+    for _ in range(PROBE_FRAMES):
+        if not capture.read()[0]:
+            return None
+    cpu = time.thread_time() - cpu_start
+    elapsed = time.perf_counter() - start
+    return cpu / PROBE_FRAMES * 1000, PROBE_FRAMES / elapsed if elapsed > 0 else 0.0
+
+def probe_modes(source, target: CaptureConfig) -> List[ModeReport]:
+    """Open each candidate mode meeting the target size and measure its read cost.
+
+    Modes the driver silently changes (a different size or format is
+    granted) are skipped, as are modes whose measured FPS falls short of
+    90% of the target.
+    """
+    reports = []
+    candidates = [(w, h) for w, h in CANDIDATE_RESOLUTIONS if w >= target.width and h >= target.height]
+    for width, height in candidates or [(target.width, target.height)]:
+        for fourcc in CANDIDATE_FOURCCS:
+            capture = cv2.VideoCapture(source)
+            try:
+                if not capture.isOpened():
+                    return reports
+                granted = apply_config(capture, replace(target, width=width, height=height, fourcc=fourcc))
+                if (granted['width'], granted['height'], granted['fourcc']) != (width, height, fourcc):
+                    continue
+                measured = _measure(capture)
+                if measured is None:
+                    continue
+                cpu_ms, measured_fps = measured
+                if measured_fps >= 0.9 * target.fps:
+                    reports.append(ModeReport(width, height, granted['fps'], fourcc, cpu_ms, measured_fps))
+            finally:
+                capture.release()
+    return reports
+
+_probe_cache: Dict[str, CaptureConfig] = {}
+
+def negotiate(source, config: CaptureConfig) -> CaptureConfig:
+    """The configured mode, or with probing the cheapest measured mode meeting it"""
+    if not config.probe or not isinstance(source, int):  # Network streams have a fixed mode
+        return config
+    key = f"{source}|{config.width}x{config.height}@{config.fps}"
+    if key not in _probe_cache:
+        reports = probe_modes(source, config)
+        for report in reports:
+            logger.info(f"Camera {source} mode {report.width}x{report.height} {report.fourcc}: "
+                        f"{report.cpu_ms:.2f} ms CPU/read, {report.measured_fps:.1f} fps")
+        if reports:
+            best = min(reports, key=lambda report: (report.cpu_ms, report.width * report.height))
+            _probe_cache[key] = replace(config, width=best.width, height=best.height, fourcc=best.fourcc)
+        else:
+            logger.warning(f"No probed mode of camera {source} met {config.width}x{config.height}@{config.fps}")
+            _probe_cache[key] = config
+    return _probe_cache[key]
+
+def open_capture(source, config: Optional[CaptureConfig] = None) -> Tuple[cv2.VideoCapture, CaptureConfig]:
+    """Open a camera with the negotiated mode; returns the capture and the mode in use"""
+    config = negotiate(source, config or CaptureConfig.from_config())
+    capture = cv2.VideoCapture(source)
+    if capture.isOpened():
+        granted = apply_config(capture, config)
+        logger.info(f"Camera {source} opened at {granted['width']}x{granted['height']} "
+                    f"{granted['fourcc']} {granted['fps']:g} fps")
+    return capture, config
+
+def downscale(frame, config: CaptureConfig):
+    """Inference copy of a frame (the frame itself when no downscale is needed)"""
+    height, width = frame.shape[:2]
+    size = config.inference_size(width, height)
+    if size is None:
+        return frame
+    # INTER_AREA averages source pixels: the cheapest alias-free shrink
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
@@ -1,52 +1,40 @@
 # app/modules/data_collection.py
 
-import cv2
-from app.modules.fatigue_detector import FatigueDetector
+from app.modules.stream_manager import DetectorManager, DEFAULT_STREAM
 from app.services.performance import PerformanceMetrics
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Initialize performance metrics
-performance_tracker = PerformanceMetrics()
+# Reported while no stream is running
+idle_performance = PerformanceMetrics()
 
-def generate_frames(user_info):
-    """Generate frames from camera for video streaming."""
+def generate_frames(user_info, stream_id=DEFAULT_STREAM, source=0, overlay=True):
+    """Generate frames from a camera stream for video streaming.
+
+    Capture, detection, alert checks and metric emission run in the
+    DetectorManager whether or not anyone is watching; frames are JPEG-encoded
+    there once per frame while viewers are attached and shared between them.
+    overlay=False streams frames without the landmark overlay.
+    """
+    manager = DetectorManager.get_instance()
+    stream = None
     try:
-        from app.services.service_manager import ServiceManager
-        socket_service = ServiceManager.get_instance().sockets
-        cap = cv2.VideoCapture(0)
-        detector = FatigueDetector()
-        
-        while cap.isOpened():
-            performance_tracker.start_processing()
-            
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            processed_frame, metrics = detector.process_frame(frame)
-            
-            try:
-                socket_service.emit_metrics(metrics, user_info)
-            except Exception as e:
-                logger.error(f"Error emitting metrics: {str(e)}")
-            
-            _, buffer = cv2.imencode('.jpg', processed_frame)
-            frame_bytes = buffer.tobytes()
-            
+        stream = manager.open_viewer(stream_id, source, user_info, overlay)
+        for frame_bytes in manager.frames(stream, overlay):
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            
-            performance_tracker.end_processing()
-        
-        cap.release()
     except Exception as e:
         logger.error(f"Error in generate_frames: {str(e)}")
-        if 'cap' in locals():
-            cap.release()
+    finally:
+        if stream is not None:
+            manager.close_viewer(stream, overlay)
 
-def get_current_performance():
+def get_current_performance(stream_id=DEFAULT_STREAM):
     """Get current performance metrics"""
-    return performance_tracker.get_prf_metrics()
+    performance = DetectorManager.get_instance().performance(stream_id) or idle_performance
+    return performance.get_prf_metrics()
 
+def get_stream_stats():
+    """FPS, latency and drop counts for every running stream"""
+    return DetectorManager.get_instance().stats()
@@ -0,0 +1,48 @@
+# app/modules/encoding.py
+"""
+JPEG encoding for the MJPEG video feed.
+
+One encoder per camera stream. Frames are optionally scaled down first, and
+with a target bitrate the quality is steered after every frame so the
+encoded size tracks the per-frame budget (target bitrate / stream FPS).
+"""
+
+import time
+import cv2
+from app.config import Config
+
+MIN_QUALITY_STEP = 2
+BUDGET_TOLERANCE = 0.15  # Size band around the budget inside which quality is left alone
+
+class JpegEncoder:
+    def __init__(self, quality=None, scale=None, target_kbps=None, min_quality=None, max_quality=95):
+        self.quality = int(quality if quality is not None else Config.JPEG_QUALITY)
+        self.scale = scale if scale is not None else Config.STREAM_SCALE
+        self.target_kbps = target_kbps if target_kbps is not None else Config.STREAM_TARGET_KBPS
+        self.min_quality = min_quality if min_quality is not None else Config.JPEG_MIN_QUALITY
+        self.max_quality = max_quality
+
+    def encode(self, frame, fps=None):
+        """Encode a frame; returns (jpeg bytes, encode ms)"""
+        start = time.perf_counter()
+        if self.scale < 1.0:
+            frame = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        data = buffer.tobytes()
+        if self.target_kbps and fps:
+            self._adapt(len(data), self.target_kbps * 1000 / 8 / fps)
+        return data, (time.perf_counter() - start) * 1000
+
+    def _adapt(self, size, budget):
+        """Step quality towards the per-frame byte budget"""
+        error = size / budget - 1
+        if abs(error) <= BUDGET_TOLERANCE:
+            return
+        # Larger steps for larger misses, so a scene change settles within a few frames
+        step = max(MIN_QUALITY_STEP, int(abs(error) * 10))
+        if error > 0:
+            self.quality = max(self.min_quality, self.quality - step)
+        else:
+            self.quality = min(self.max_quality, self.quality + step)
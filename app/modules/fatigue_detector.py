@@ -1,36 +1,47 @@
 # app/modules/fatigue_detector.py
 
-import os
 import cv2
-import dlib
 import logging
-from scipy.spatial import distance as dist
-from definition import DATASET_MODEL_DIR
 import numpy as np
 import mediapipe as mp
 import time
-from datetime import datetime, timedelta
 from collections import deque
+from app.models.metrics import MetricsRecord
+from app.modules.ai_ml.features import FeatureStream
+from app.modules.ai_ml.model_registry import ModelRegistry
+from app.config import Config
+from app.services.performance import PerformanceMetrics, COLOR_CONVERT, INFERENCE, FEATURES, DRAW
 
-# Load face detector and facial landmarks predictor
-face_detector = dlib.get_frontal_face_detector()
-landmark_predictor = dlib.shape_predictor(os.path.join(DATASET_MODEL_DIR, "shape_predictor_68_face_landmarks.dat"))
 logger = logging.getLogger(__name__)
 
+NS_PER_SECOND = 1_000_000_000
+RATE_WINDOW_NS = 60 * NS_PER_SECOND  # Blink and yawn rates count events in the last minute
+
+# Pixel offsets (dy, dx) of a landmark dot: the plus shape a filled cv2.circle draws at radius 1
+LANDMARK_STAMP = np.array([(0, 0), (-1, 0), (1, 0), (0, -1), (0, 1)], dtype=np.intp)
+
 class FatigueDetector:
-    def __init__(self):
+    def __init__(self, max_num_faces=1, performance=None):
+        # Stage timings go to the owning stream's metrics (a disabled one when standalone)
+        self.performance = performance or PerformanceMetrics(enabled=False)
+        
         # Initialize MediaPipe Face Mesh
         self.mp_face_mesh = mp.solutions.face_mesh
         self.mp_drawing = mp.solutions.drawing_utils
+        self.face_count = 0  # Faces found in the last frame
+        self.last_overlay = None  # (landmarks, head position, MAR) of the last detected face
         self.face_mesh = self.mp_face_mesh.FaceMesh(
-            max_num_faces=1,
+            max_num_faces=max_num_faces,
             refine_landmarks=True,
             min_detection_confidence=0.5,
             min_tracking_confidence=0.5
         )
         
+        # Monotonic capture time (ns) of the frame being processed
+        self.last_timestamp_ns = None
+        
         # Store blink history
-        self.blink_times = deque(maxlen=100)  # Store last 100 blinks
+        self.blink_times = deque(maxlen=100)  # Store last 100 blinks (monotonic ns)
         self.last_blink_state = False
         
         # Store eye closure history
@@ -57,6 +68,12 @@ class FatigueDetector:
             62, 66   # Top and bottom of the inner lips (center points)
         ]
         
+        # Model feature vector and rolling PERCLOS (P80), same definitions as training
+        # (see ai_ml/features.py); each vector is scored with the active model
+        self.feature_stream = FeatureStream(Config.FEATURE_WINDOW, Config.FEATURE_STRIDE)
+        self.model_registry = ModelRegistry.get_instance()
+        self.fatigue_score = None  # Model score of the last feature vector, None without a model
+        
         # [
         #     61, 291,  # Outer mouth corners
         #     0, 17,    # Top and bottom outer lip
@@ -64,23 +81,37 @@ class FatigueDetector:
         #     178, 152  # Top and bottom inner lip
         # ]
 
-    def process_frame(self, frame):
-        """Process a frame and return processed frame with metrics"""
+    def process_frame(self, frame, heart_rate=None, inference_frame=None, draw=True, timestamp_ns=None):
+        """Process a frame and return processed frame with metrics.
+
+        timestamp_ns is the frame's time.monotonic_ns() at capture; every
+        duration and window is measured from it, so metrics stay correct when
+        processing lags behind capture. Defaults to now.
+        Detection runs on inference_frame (a downscaled copy) when given;
+        landmarks are normalized, so they are drawn on frame at any size.
+        With draw=False the frame is left untouched; draw_overlay() can
+        render the same overlay later, only for viewers that want it.
+        """
+        now_ns = timestamp_ns if timestamp_ns is not None else time.monotonic_ns()
+        self.last_timestamp_ns = now_ns
+        performance = self.performance
         try:
             # Convert to RGB for MediaPipe
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            started = performance.clock()
+            rgb_frame = cv2.cvtColor(frame if inference_frame is None else inference_frame, cv2.COLOR_BGR2RGB)
+            performance.record(COLOR_CONVERT, started)
+            started = performance.clock()
             results = self.face_mesh.process(rgb_frame)
+            performance.record(INFERENCE, started)
             
-            metrics = {
-                'blink_rate': 0,
-                'eye_closure_duration': 0,
-                'head_position': 'Unknown',
-                'yawn_count': 0,
-                'alertness': 100
-            }
+            metrics = MetricsRecord(head_position='Unknown', is_detecting=False)
             
+            self.face_count = len(results.multi_face_landmarks or ())
+            self.last_overlay = None
             if results.multi_face_landmarks:
-                face_landmarks = results.multi_face_landmarks[0]
+                started = performance.clock()
+                # With several occupants in view, track the face closest to the camera
+                face_landmarks = self._primary_face(results.multi_face_landmarks)
                 
                 # Process eye metrics
                 left_ear = self._get_ear(face_landmarks, "left")
@@ -89,17 +120,17 @@ class FatigueDetector:
                 
                 # Detect blink
                 if avg_ear < self.EAR_THRESHOLD and not self.last_blink_state:
-                    self.blink_times.append(datetime.now())
+                    self.blink_times.append(now_ns)
                     self.last_blink_state = True
                 elif avg_ear >= self.EAR_THRESHOLD:
                     self.last_blink_state = False
                 
                 # Track eye closure
                 if avg_ear < self.EAR_THRESHOLD:
-                    if not self.eye_closure_start:
-                        self.eye_closure_start = datetime.now()
-                elif self.eye_closure_start:
-                    duration = (datetime.now() - self.eye_closure_start).total_seconds()
+                    if self.eye_closure_start is None:
+                        self.eye_closure_start = now_ns
+                elif self.eye_closure_start is not None:
+                    duration = (now_ns - self.eye_closure_start) / NS_PER_SECOND
                     self.eye_closure_durations.append(duration)
                     self.eye_closure_start = None
                 
@@ -113,31 +144,41 @@ class FatigueDetector:
                 # More sophisticated yawn detection with duration
                 if mar > self.MAR_THRESHOLD:
                     if not self.last_yawn_state:
-                        self.yawn_start_time = datetime.now()
+                        self.yawn_start_time = now_ns
                         self.last_yawn_state = True
                 elif self.last_yawn_state:
-                    if self.yawn_start_time:
-                        yawn_duration = (datetime.now() - self.yawn_start_time).total_seconds()
+                    if self.yawn_start_time is not None:
+                        yawn_duration = (now_ns - self.yawn_start_time) / NS_PER_SECOND
                         if yawn_duration >= self.MIN_YAWN_DURATION:
-                            self.yawn_times.append(datetime.now())
+                            self.yawn_times.append(now_ns)
                             self.yawn_durations.append(yawn_duration)
                     self.last_yawn_state = False
                     self.yawn_start_time = None
                 
+                now = now_ns / NS_PER_SECOND
+                vector = self.feature_stream.update(now, avg_ear, mar, head_pos == 'Centered', heart_rate)
+                if vector is not None:
+                    self.fatigue_score = self._score_features(vector)
+                
                 # Update metrics with enhanced yawn data
-                metrics = {
-                    'blink_rate': self.get_blink_count(),
-                    'eye_closure_duration': self.get_eye_closure_duration(),
-                    'head_position': self.get_head_position(),
-                    'yawn_count': self.get_yawn_count(),
-                    'yawn_duration': self.get_average_yawn_duration(),
-                    'current_mar': mar,
-                    'is_yawning': self.last_yawn_state,
-                    'alertness': self._calculate_alertness(avg_ear, mar)
-                }
+                metrics = MetricsRecord(
+                    blink_rate=self.get_blink_count(),
+                    eye_closure=self.get_eye_closure_duration(),
+                    perclos=self.feature_stream.perclos.value,
+                    fatigue_score=self.fatigue_score,
+                    head_position=self.get_head_position(),
+                    yawn_count=self.get_yawn_count(),
+                    yawn_duration=self.get_average_yawn_duration(),
+                    alertness=self._calculate_alertness(avg_ear, mar),
+                    is_detecting=True,
+                    eye_state='closed' if avg_ear < self.EAR_THRESHOLD else 'open'
+                )
+                performance.record(FEATURES, started)
                 
-                # Draw facial landmarks with mouth visualization
-                self._draw_face_mesh(frame, face_landmarks, draw_mouth=False) #Disable draw mouth
+                self.last_overlay = (face_landmarks, head_pos, mar)
+                if draw:
+                    # Draw facial landmarks with mouth visualization
+                    self.draw_overlay(frame, draw_mouth=False) #Disable draw mouth
             
             return frame, metrics
             
@@ -145,12 +186,32 @@ class FatigueDetector:
             logger.error(f"Error processing frame: {str(e)}")
             return frame, metrics
 
+    def _score_features(self, vector):
+        """Fatigue probability of a feature vector, None while no model is loaded"""
+        if self.model_registry.current() is None:
+            return None
+        try:
+            return float(self.model_registry.predict_proba(vector[np.newaxis, :])[0])
+        except Exception as e:
+            logger.error(f"Error scoring live features: {str(e)}")
+            return None
+
+    def _now_ns(self):
+        """Timestamp of the frame being processed (now outside process_frame)"""
+        return self.last_timestamp_ns if self.last_timestamp_ns is not None else time.monotonic_ns()
+
+    @staticmethod
+    def _count_recent(times, now_ns):
+        """Events in the last minute; times are in order, so expired ones are dropped from the left"""
+        cutoff = now_ns - RATE_WINDOW_NS
+        while times and times[0] <= cutoff:
+            times.popleft()
+        return len(times)
+
     def get_blink_count(self):
         """Get number of blinks in the last minute"""
         try:
-            one_minute_ago = datetime.now() - timedelta(minutes=1)
-            recent_blinks = [t for t in self.blink_times if t > one_minute_ago]
-            return len(recent_blinks)
+            return self._count_recent(self.blink_times, self._now_ns())
         except Exception as e:
             logger.error(f"Error getting blink count: {str(e)}")
             return 0
@@ -181,9 +242,7 @@ class FatigueDetector:
     def get_yawn_count(self):
         """Get number of yawns in the last minute"""
         try:
-            one_minute_ago = datetime.now() - timedelta(minutes=1)
-            recent_yawns = [t for t in self.yawn_times if t > one_minute_ago]
-            return len(recent_yawns)
+            return self._count_recent(self.yawn_times, self._now_ns())
         except Exception as e:
             logger.error(f"Error getting yawn count: {str(e)}")
             return 0
@@ -198,6 +257,12 @@ class FatigueDetector:
             logger.error(f"Error getting average yawn duration: {str(e)}")
             return 0.0
 
+    def _primary_face(self, faces):
+        """Largest face in the frame, by the distance between the ear landmarks"""
+        if len(faces) == 1:
+            return faces[0]
+        return max(faces, key=lambda face: abs(face.landmark[454].x - face.landmark[234].x))
+
     def _get_ear(self, landmarks, eye):
         """Calculate Eye Aspect Ratio"""
         try:
@@ -339,19 +404,33 @@ class FatigueDetector:
             logger.error(f"Error calculating alertness: {str(e)}")
             return 100
 
-    def _draw_face_mesh(self, frame, landmarks, draw_mouth=True):
-        """Draw face mesh with enhanced visualization including head position"""
+    def draw_overlay(self, frame, draw_mouth=False):
+        """Draw the last detected face (landmarks, head position) onto frame"""
+        if self.last_overlay is not None:
+            started = self.performance.clock()
+            landmarks, head_pos, mar = self.last_overlay
+            self._draw_face_mesh(frame, landmarks, head_pos, mar, draw_mouth)
+            self.performance.record(DRAW, started)
+        return frame
+
+    def _draw_face_mesh(self, frame, landmarks, head_pos, mar, draw_mouth=True):
+        """Draw face mesh with enhanced visualization including head position.
+
+        Uses the head position and MAR already computed for the frame.
+        """
         try:
             h, w, _ = frame.shape
+            points = np.array([(landmark.x, landmark.y) for landmark in landmarks.landmark])
+            xs = (points[:, 0] * w).astype(np.intp)
+            ys = (points[:, 1] * h).astype(np.intp)
             
-            # Draw general landmarks
-            for landmark in landmarks.landmark:
-                x = int(landmark.x * w)
-                y = int(landmark.y * h)
-                cv2.circle(frame, (x, y), 1, (0, 255, 0), -1)
+            # Draw general landmarks: every dot in one scatter instead of a cv2.circle per point
+            dot_ys = (ys[:, None] + LANDMARK_STAMP[:, 0]).ravel()
+            dot_xs = (xs[:, None] + LANDMARK_STAMP[:, 1]).ravel()
+            inside = (dot_xs >= 0) & (dot_xs < w) & (dot_ys >= 0) & (dot_ys < h)
+            frame[dot_ys[inside], dot_xs[inside]] = (0, 255, 0)
             
             # Draw head position indicators
-            head_pos = self._get_head_position(landmarks)
             position_color = {
                 'Centered': (0, 255, 0),
                 'Left': (0, 165, 255),
@@ -388,8 +467,7 @@ class FatigueDetector:
 
             if draw_mouth:
                 # Draw mouth landmarks and connections
-                mouth_points = [landmarks.landmark[pt] for pt in self.mouth_landmarks]
-                mouth_coords = [(int(pt.x * w), int(pt.y * h)) for pt in mouth_points]
+                mouth_coords = [(int(xs[pt]), int(ys[pt])) for pt in self.mouth_landmarks]
                 
                 # Draw mouth outline
                 color = (0, 0, 255) if self.last_yawn_state else (0, 255, 0)
@@ -406,16 +484,14 @@ class FatigueDetector:
                 cv2.line(frame, mouth_coords[5], mouth_coords[7], color, thickness)  # Inner bottom
                 
                 # Add MAR value display
-                mar = self._get_mar(landmarks)
                 cv2.putText(frame, f"MAR: {mar:.2f}", (10, 30),
                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
                 
                 # Add yawn status
                 if self.last_yawn_state:
-                    duration = (datetime.now() - self.yawn_start_time).total_seconds()
+                    duration = (self._now_ns() - self.yawn_start_time) / NS_PER_SECOND
                     cv2.putText(frame, f"YAWNING: {duration:.1f}s", (10, 60),
                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
                 
         except Exception as e:
             logger.error(f"Error drawing face mesh: {str(e)}")
-
@@ -0,0 +1,368 @@
+# app/modules/stream_manager.py
+"""
+Detector manager: several camera streams (driver and cabin cameras, or the
+feeds of a depot box) processed on one shared pool of detector workers.
+
+Each stream owns its capture, its FatigueDetector (blink, yawn, PERCLOS and
+feature state are per stream) and its PerformanceMetrics. A reader thread per
+stream grabs frames; frames go to the worker pool one at a time per stream so
+detector state sees them in order. When a stream's worker is still busy,
+frames are grabbed without being decoded (capture strategy 'grab') or the
+newest frame replaces the waiting one ('read'), so a slow stream drops stale
+frames instead of building a backlog, and never holds up the other streams.
+Detection runs on a downscaled copy (see capture.py) and draws nothing.
+Processed frames are JPEG-encoded once, in the worker, only while the stream
+has viewers: with the landmark overlay if any viewer wants it, plain if any
+viewer opted out; every viewer of a variant is sent the same bytes.
+
+OpenCV and MediaPipe release the GIL while they run, so pool threads run
+detection in parallel across cores.
+
+Always-on streams (Config.CAMERA_STREAMS) open only in the process holding
+the host-wide Config.CAMERA_LOCK_FILE, so several gunicorn workers never
+open the same devices. The lock is released when its holder exits, and the
+worker gunicorn starts in its place takes it over.
+"""
+
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import cv2
+import numpy as np
+from app.config import Config
+from app.core.async_runtime import run_blocking
+from app.modules.capture import CaptureConfig, GRAB, open_capture, downscale
+from app.modules.fatigue_detector import FatigueDetector
+from app.modules.encoding import JpegEncoder
+from app.services.performance import PerformanceMetrics, CAPTURE, EMIT
+from app.services.telemetry import telemetry, stage_samples
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STREAM = 'local'
+FRAME_WAIT_TIMEOUT = 1.0  # Seconds a viewer waits for a new frame before re-checking the stream
+
+@dataclass(eq=False)
+class CameraStream:
+    stream_id: str
+    source: object                  # Device index or URL, as accepted by cv2.VideoCapture
+    user_info: Dict
+    detector: FatigueDetector
+    performance: PerformanceMetrics  # Shared with the detector, which times its own stages
+    persistent: bool = False        # Configured at boot; kept running without viewers
+    encoders: Dict[bool, JpegEncoder] = field(default_factory=lambda: {True: JpegEncoder(), False: JpegEncoder()})
+    capture: Optional[cv2.VideoCapture] = None
+    capture_config: CaptureConfig = field(default_factory=CaptureConfig.from_config)
+    running: bool = True
+    overlay_viewers: int = 0
+    plain_viewers: int = 0
+    busy: bool = False
+    pending: Optional[tuple] = None  # Newest (frame, captured_ns) waiting for the worker
+    dropped: int = 0
+    frame_id: int = 0
+    first_frame_ms: Optional[float] = None  # Capture-to-result latency of the first frame
+    jpegs: Dict[bool, bytes] = field(default_factory=dict)  # Latest frame per variant (overlay or not)
+    metrics: Optional[object] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    updated: threading.Condition = field(default_factory=threading.Condition)
+
+    @property
+    def viewers(self) -> int:
+        return self.overlay_viewers + self.plain_viewers
+
+    @property
+    def user_email(self) -> Optional[str]:
+        return (self.user_info or {}).get('email')
+
+    def stats(self) -> Dict:
+        config = self.capture_config
+        return {
+            'source': str(self.source),
+            'mode': f"{config.width}x{config.height} {config.fourcc or 'default'} @ {config.fps:g}",
+            'user': self.user_email,
+            'running': self.running,
+            'viewers': self.viewers,
+            'overlayViewers': self.overlay_viewers,
+            'faces': self.detector.face_count,
+            'framesProcessed': self.frame_id,
+            'framesDropped': self.dropped,
+            'jpegQuality': {'overlay': self.encoders[True].quality, 'plain': self.encoders[False].quality},
+            'firstFrameLatency': round(self.first_frame_ms, 1) if self.first_frame_ms is not None else None,
+            **self.performance.get_prf_metrics()
+        }
+
+class DetectorManager:
+    _instance: Optional['DetectorManager'] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, workers: int = Config.DETECTOR_WORKERS):
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='detector')
+        self.streams: Dict[str, CameraStream] = {}
+        self.spare_detectors: List[Tuple[int, FatigueDetector]] = []  # (max faces, detector) warmed up for a stream
+        self._lock = threading.Lock()
+        self._camera_lock = None  # Open lock file while this process owns CAMERA_STREAMS
+        telemetry.register('streams', self.collect)
+
+    @classmethod
+    def get_instance(cls) -> 'DetectorManager':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = DetectorManager()
+            return cls._instance
+
+    def start_configured(self):
+        """Start the always-on streams listed in Config.CAMERA_STREAMS"""
+        if not Config.CAMERA_STREAMS:
+            return
+        if not self._claim_cameras():
+            logger.info(f"Camera streams are run by another worker ({Config.CAMERA_LOCK_FILE} is held)")
+            return
+        try:
+            for entry in json.loads(Config.CAMERA_STREAMS):
+                user_info = {'email': entry['user']} if entry.get('user') else {}
+                self.add_stream(entry['id'], entry.get('source', 0), user_info,
+                                max_faces=entry.get('max_faces', 1), persistent=True)
+        except Exception as e:
+            logger.error(f"Error starting configured camera streams: {str(e)}")
+
+    def _claim_cameras(self) -> bool:
+        """Take the host-wide camera lock without waiting; True if this process holds it"""
+        if self._camera_lock is not None:
+            return True
+        try:
+            import fcntl
+        except ImportError:
+            return True  # No flock (Windows): single-process servers only
+        handle = open(Config.CAMERA_LOCK_FILE, 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+        self._camera_lock = handle  # Kept open (and locked) for the life of the process
+        return True
+
+    def add_stream(self, stream_id: str, source=0, user_info: Optional[Dict] = None,
+                   max_faces: int = 1, persistent: bool = False) -> CameraStream:
+        """Open a stream (or return the running one with the same id)"""
+        with self._lock:
+            stream = self.streams.get(stream_id)
+            if stream is not None:
+                return stream
+            performance = PerformanceMetrics()
+            stream = CameraStream(stream_id, source, user_info or {},
+                                  self._take_detector(max_faces, performance),
+                                  performance, persistent=persistent)
+            self.streams[stream_id] = stream
+        threading.Thread(target=self._read_loop, args=(stream,), daemon=True,
+                         name=f"capture-{stream_id}").start()
+        logger.info(f"Camera stream {stream_id} started ({source})")
+        return stream
+
+    def warm_detectors(self, count: int = 1, max_faces: int = 1) -> List[float]:
+        """Build detectors and run one inference each so the first real frame is not slow.
+
+        MediaPipe initializes its graph and TFLite interpreters on the first
+        frame, not at construction; a blank frame at the inference size pays
+        that here. Returns the warm-up inference time of each detector in ms.
+        """
+        config = CaptureConfig.from_config()
+        size = config.inference_size(config.width, config.height) or (config.width, config.height)
+        blank = np.zeros((size[1], size[0], 3), dtype=np.uint8)
+        timings = []
+        for _ in range(count):
+            detector = run_blocking(FatigueDetector, max_faces)
+            start = time.perf_counter()
+            run_blocking(detector.process_frame, blank, draw=False)
+            timings.append((time.perf_counter() - start) * 1000)
+            with self._lock:
+                self.spare_detectors.append((max_faces, detector))
+        return timings
+
+    def _take_detector(self, max_faces: int, performance: PerformanceMetrics) -> FatigueDetector:
+        """A warmed-up detector for max_faces if one is spare, else a new one (called under _lock)"""
+        for index, (faces, detector) in enumerate(self.spare_detectors):
+            if faces == max_faces:
+                del self.spare_detectors[index]
+                detector.performance = performance
+                return detector
+        return run_blocking(FatigueDetector, max_faces, performance)
+
+    def remove_stream(self, stream_id: str):
+        with self._lock:
+            stream = self.streams.pop(stream_id, None)
+        if stream is not None:
+            stream.running = False
+            with stream.updated:
+                stream.updated.notify_all()
+
+    def open_viewer(self, stream_id: str, source=0, user_info: Optional[Dict] = None,
+                    overlay: bool = True) -> CameraStream:
+        """Attach a viewer, starting the stream on demand"""
+        stream = self.add_stream(stream_id, source, user_info)
+        with stream.lock:
+            if overlay:
+                stream.overlay_viewers += 1
+            else:
+                stream.plain_viewers += 1
+        return stream
+
+    def close_viewer(self, stream: CameraStream, overlay: bool = True):
+        """Detach a viewer; on-demand streams stop with their last viewer"""
+        with stream.lock:
+            if overlay:
+                stream.overlay_viewers -= 1
+            else:
+                stream.plain_viewers -= 1
+            idle = stream.viewers <= 0 and not stream.persistent
+        if idle:
+            self.remove_stream(stream.stream_id)
+
+    def frames(self, stream: CameraStream, overlay: bool = True):
+        """Yield each newly encoded JPEG frame of a stream until it stops (viewers only)"""
+        seen = 0
+        while stream.running:
+            with stream.updated:
+                if stream.frame_id == seen or overlay not in stream.jpegs:
+                    stream.updated.wait(FRAME_WAIT_TIMEOUT)
+                if stream.frame_id == seen or overlay not in stream.jpegs:
+                    continue
+                seen, jpeg = stream.frame_id, stream.jpegs[overlay]
+            yield jpeg
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            streams = list(self.streams.values())
+        return {stream.stream_id: stream.stats() for stream in streams}
+
+    def collect(self):
+        """Per-stream telemetry samples, read at scrape time"""
+        with self._lock:
+            streams = list(self.streams.values())
+        for stream in streams:
+            labels = {'stream': stream.stream_id}
+            yield 'stream_frames_total', labels, stream.frame_id
+            yield 'stream_dropped_frames_total', labels, stream.dropped
+            yield 'stream_pending_frames', labels, int(stream.pending is not None)
+            yield 'stream_fps', labels, round(stream.performance.fps, 2)
+            yield 'stream_viewers', labels, stream.viewers
+            if stream.first_frame_ms is not None:
+                yield 'stream_first_frame_seconds', labels, stream.first_frame_ms / 1000
+            yield from stage_samples(stream.stream_id, stream.performance)
+
+    def performance(self, stream_id: str = DEFAULT_STREAM) -> Optional[PerformanceMetrics]:
+        stream = self.streams.get(stream_id)
+        return stream.performance if stream else None
+
+    def _read_loop(self, stream: CameraStream):
+        try:
+            stream.capture, stream.capture_config = run_blocking(open_capture, stream.source, stream.capture_config)
+            capture, performance = stream.capture, stream.performance
+            while stream.running and capture.isOpened():
+                # Capture time includes waiting for the device to deliver the frame
+                started = performance.clock()
+                if stream.capture_config.strategy == GRAB:
+                    if not run_blocking(capture.grab):
+                        break
+                    captured_ns = time.monotonic_ns()
+                    if stream.busy:
+                        # Worker still on the previous frame: skip decoding this one
+                        stream.dropped += 1
+                        continue
+                    ret, frame = run_blocking(capture.retrieve)
+                else:
+                    ret, frame = run_blocking(capture.read)
+                    captured_ns = time.monotonic_ns()
+                if not ret:
+                    break
+                performance.record(CAPTURE, started)
+                self._submit(stream, frame, captured_ns)
+        except Exception as e:
+            logger.error(f"Error reading camera stream {stream.stream_id}: {str(e)}")
+        finally:
+            if stream.capture is not None:
+                stream.capture.release()
+            if self.streams.get(stream.stream_id) is stream:
+                self.remove_stream(stream.stream_id)
+            logger.info(f"Camera stream {stream.stream_id} stopped")
+
+    def _submit(self, stream: CameraStream, frame, captured_ns: int):
+        with stream.lock:
+            if stream.busy:
+                if stream.pending is not None:
+                    stream.dropped += 1
+                stream.pending = (frame, captured_ns)
+                return
+            stream.busy = True
+        self.pool.submit(self._process, stream, frame, captured_ns)
+
+    def _process(self, stream: CameraStream, frame, captured_ns: int):
+        while True:
+            try:
+                stream.performance.start_processing()
+                processed_frame, metrics = run_blocking(self._detect, stream, frame, captured_ns)
+                stream.performance.end_processing()
+                latency_ms = (time.monotonic_ns() - captured_ns) / 1e6
+                stream.performance.add_latency(latency_ms)
+                if stream.first_frame_ms is None:
+                    stream.first_frame_ms = latency_ms
+                    logger.info(f"Camera stream {stream.stream_id} first frame in {latency_ms:.0f} ms")
+                jpegs = {}
+                if stream.viewers > 0:  # Nobody watching: skip drawing and encoding entirely
+                    jpegs = run_blocking(self._encode, stream, processed_frame)
+                self._publish(stream, jpegs, metrics)
+            except Exception as e:
+                logger.error(f"Error processing camera stream {stream.stream_id}: {str(e)}")
+
+            with stream.lock:
+                if stream.pending is None or not stream.running:
+                    stream.busy = False
+                    stream.pending = None
+                    return
+                (frame, captured_ns), stream.pending = stream.pending, None
+
+    def _detect(self, stream: CameraStream, frame, captured_ns: int):
+        """Run detection on the inference copy; stream it or the full frame"""
+        inference_frame = downscale(frame, stream.capture_config)
+        display_frame = frame if stream.capture_config.full_resolution else inference_frame
+        return stream.detector.process_frame(display_frame, inference_frame=inference_frame,
+                                             draw=False, timestamp_ns=captured_ns)
+
+    def _encode(self, stream: CameraStream, frame) -> Dict[bool, bytes]:
+        """Encode the variants viewers asked for, plain before overlay so the overlay can draw in place"""
+        fps = stream.performance.fps
+        jpegs = {}
+        for overlay, viewers in ((False, stream.plain_viewers), (True, stream.overlay_viewers)):
+            if viewers <= 0:
+                continue
+            if overlay:
+                stream.detector.draw_overlay(frame)
+            jpegs[overlay], encode_ms = stream.encoders[overlay].encode(frame, fps)
+            stream.performance.add_encode(len(jpegs[overlay]), encode_ms)
+        return jpegs
+
+    def _publish(self, stream: CameraStream, jpegs, metrics):
+        with stream.updated:
+            stream.jpegs = jpegs
+            stream.metrics = metrics
+            stream.frame_id += 1
+            stream.updated.notify_all()
+
+        try:
+            from app.services.service_manager import ServiceManager
+            services = ServiceManager.get_instance()
+            if not services.initialized:
+                return
+            started = stream.performance.clock()
+            # Validate and run alert checks on every frame; alerts are queued, never awaited.
+            # Each stream has its own alert state, even when one user owns several
+            if stream.user_email and metrics.is_detecting:
+                metrics, _, _ = services.metrics.process_metrics(metrics, stream.user_email, stream.stream_id)
+            services.sockets.emit_metrics(metrics, stream.user_info, stream.stream_id)
+            stream.performance.record(EMIT, started)
+        except Exception as e:
+            logger.error(f"Error emitting metrics for stream {stream.stream_id}: {str(e)}")
@@ -1,5 +1,4 @@
 from flask import Blueprint, jsonify, redirect, session, url_for
-from googleapiclient.discovery import build
 from google.oauth2.credentials import Credentials
 from datetime import datetime, timedelta
 from functools import wraps
@@ -20,6 +19,11 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def _fitness_service(credentials):
+    """Google Fit client; googleapiclient is imported on first use, not at startup"""
+    from googleapiclient.discovery import build
+    return build('fitness', 'v1', credentials=credentials)
+
 
 @fatigue_bp.route('/fitness_data')
 @login_required
@@ -238,7 +242,7 @@ def get_google_fit_sleep_data():
     """Get sleep data from Google Fit API"""
     try:
         credentials = Credentials(**session['google_credentials'])
-        fitness_service = build('fitness', 'v1', credentials=credentials)
+        fitness_service = _fitness_service(credentials)
         
         end_time = datetime.utcnow()
         start_time = end_time - timedelta(days=1)
@@ -273,7 +277,7 @@ def get_google_fit_activity_data():
     """Get activity data from Google Fit API"""
     try:
         credentials = Credentials(**session['google_credentials'])
-        fitness_service = build('fitness', 'v1', credentials=credentials)
+        fitness_service = _fitness_service(credentials)
         
         end_time = datetime.utcnow()
         start_time = end_time - timedelta(days=1)
@@ -310,7 +314,7 @@ def get_google_fit_heart_rate_data():
     """Get heart rate data from Google Fit API"""
     try:
         credentials = Credentials(**session['google_credentials'])
-        fitness_service = build('fitness', 'v1', credentials=credentials)
+        fitness_service = _fitness_service(credentials)
         
         end_time = datetime.utcnow()
         start_time = end_time - timedelta(days=1)
@@ -4,8 +4,6 @@ from definition import CONFIG_DIR
 from app.config import Config
 from flask import Blueprint, Request, redirect, url_for, session, request
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
 
 google_auth_bp = Blueprint('google_auth', __name__)
 
@@ -37,13 +35,22 @@ SCOPES = [
 ]
 
 CLIENT_SECRET_PATH = os.path.join(CONFIG_DIR, "client-secret.json")
-flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_PATH, scopes=SCOPES, redirect_uri=Config.GOOGLE_OAUTH_REDIRECT_URI)
+_flow = None
+
+def get_flow():
+    """OAuth flow, created (and google_auth_oauthlib imported) on the first login"""
+    global _flow
+    if _flow is None:
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        _flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_PATH, scopes=SCOPES,
+                                                          redirect_uri=Config.GOOGLE_OAUTH_REDIRECT_URI)
+    return _flow
 
 
 # Route to initiate the login
 @google_auth_bp.route('/login')
 def login():
-    authorization_url, state = flow.authorization_url(prompt='consent')
+    authorization_url, state = get_flow().authorization_url(prompt='consent')
     session['state'] = state
     return redirect(authorization_url)
 
@@ -56,13 +63,13 @@ def logout():
 # login oauth callback route
 @google_auth_bp.route('/oauth2callback')
 def oauth2callback():
-    flow.fetch_token(authorization_response=request.url)
+    get_flow().fetch_token(authorization_response=request.url)
 
     if session.get('state') != request.args.get('state'):
         return 'Error: State mismatch!', 500
 
 
-    credentials = flow.credentials
+    credentials = get_flow().credentials
     user_info = fetch_user_info(credentials)
 
     session['google_credentials'] = credentials_to_dict(credentials)
@@ -117,6 +124,7 @@ def refresh_access_token(credentials):
 
 def fetch_user_info(credentials):
     # Use credentials to get user info from Google API
+    from googleapiclient.discovery import build
     oauth2_service = build('oauth2', 'v2', credentials=credentials)
     user_info = oauth2_service.userinfo().get().execute()
     
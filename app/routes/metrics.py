@@ -0,0 +1,12 @@
+from flask import Blueprint, Response, abort
+from app.config import Config
+from app.services.telemetry import telemetry, CONTENT_TYPE
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics')
+def metrics():
+    """Pipeline and service telemetry in the Prometheus text format"""
+    if not Config.METRICS_ENABLED:
+        abort(404)
+    return Response(telemetry.render(), content_type=CONTENT_TYPE)
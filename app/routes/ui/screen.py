@@ -1,6 +1,9 @@
-from flask import Blueprint, render_template, session, Response, redirect, url_for
+from flask import Blueprint, render_template, session, Response, redirect, url_for, jsonify, abort, request
+from app.config import Config
 from app.routes.fatigue import login_required
-from app.modules.data_collection import generate_frames
+
+# The camera pipeline (OpenCV, MediaPipe) is imported by the routes that use it,
+# or ahead of time by the warm-up (app/core/warmup.py), never at blueprint import
 
 ui_screen_bp = Blueprint('ui_screen', __name__)
 
@@ -21,11 +24,57 @@ def live():
     """Live feed with metrics route that requires login"""
     return render_template('live_monitor.html', active_page='live')
 
+def _current_email():
+    return (session.get('user_info', {}).get('email') or '').lower()
+
+def _is_admin():
+    return _current_email() in Config.ADMIN_EMAILS
+
+def _can_view(owner_email):
+    """Streams are visible to their owner and to admins (Config.ADMIN_EMAILS)"""
+    email = _current_email()
+    return bool(email) and (email == (owner_email or '').lower() or email in Config.ADMIN_EMAILS)
+
+def _wants_overlay():
+    """Landmark overlay on by default; ?overlay=0 streams plain frames"""
+    return request.args.get('overlay', '1') not in ('0', 'false')
+
 @ui_screen_bp.route('/video_feed')
 @login_required
 def video_feed():
     """Video streaming route."""
+    from app.modules.data_collection import generate_frames
+    from app.modules.stream_manager import DetectorManager, DEFAULT_STREAM
+    # The local camera is shared: while another user's stream runs, it stays theirs
+    stream = DetectorManager.get_instance().streams.get(DEFAULT_STREAM)
+    if stream is not None and not _can_view(stream.user_email):
+        abort(403)
     return Response(
-        generate_frames(session.get('user_info', {})),
+        generate_frames(session.get('user_info', {}), overlay=_wants_overlay()),
         mimetype='multipart/x-mixed-replace; boundary=frame'
-    ) 
\ No newline at end of file
+    )
+
+@ui_screen_bp.route('/video_feed/<stream_id>')
+@login_required
+def stream_feed(stream_id):
+    """Video of a configured camera stream (see Config.CAMERA_STREAMS)"""
+    from app.modules.data_collection import generate_frames
+    from app.modules.stream_manager import DetectorManager
+    stream = DetectorManager.get_instance().streams.get(stream_id)
+    if stream is None or not _can_view(stream.user_email):
+        abort(404)  # Not revealing which stream ids exist
+    return Response(
+        generate_frames(stream.user_info, stream_id, stream.source, _wants_overlay()),
+        mimetype='multipart/x-mixed-replace; boundary=frame'
+    )
+
+@ui_screen_bp.route('/streams')
+@login_required
+def streams():
+    """Per-stream FPS, latency and dropped frames of the user's streams (every stream for admins)"""
+    from app.modules.data_collection import get_stream_stats
+    stats = get_stream_stats()
+    if not _is_admin():
+        stats = {stream_id: {key: value for key, value in stream.items() if key != 'user'}
+                 for stream_id, stream in stats.items() if _can_view(stream['user'])}
+    return jsonify(stats) 
\ No newline at end of file
@@ -0,0 +1,157 @@
+import time
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, Optional, Set, Tuple
+from app.models.metrics import MetricsRecord
+
+NORMAL = "normal"
+WARNING = "warning"
+DANGER = "danger"
+
+LEVEL_RANK = {NORMAL: 0, WARNING: 1, DANGER: 2}
+
+@dataclass(frozen=True)
+class AlertCondition:
+    """Threshold pair for one metric: the condition activates past `enter`
+    and only clears once the value is back past `exit` (hysteresis band)"""
+    name: str
+    field: str
+    level: str
+    enter: float
+    exit: float
+    below: bool          # True when low values are the problem
+    message: str         # May reference {value}
+
+    def triggered(self, value: float) -> bool:
+        return value < self.enter if self.below else value > self.enter
+
+    def cleared(self, value: float) -> bool:
+        return value >= self.exit if self.below else value <= self.exit
+
+# Enter thresholds match the previous single-threshold checks
+DEFAULT_CONDITIONS = (
+    AlertCondition('low_alertness', 'alertness', DANGER, 60, 65, True, "Low alertness level: {value:g}%"),
+    AlertCondition('low_blink_rate', 'blink_rate', WARNING, 10, 12, True, "Blink rate too low"),
+    AlertCondition('high_blink_rate', 'blink_rate', WARNING, 30, 27, False, "Blink rate too high"),
+    AlertCondition('long_eye_closure', 'eye_closure', DANGER, 0.3, 0.25, False, "Eyes closed too long"),
+    # Drowsiness is commonly flagged from PERCLOS above 0.15
+    AlertCondition('high_perclos', 'perclos', DANGER, 0.15, 0.12, False, "Eyes closed {value:.0%} of the time (PERCLOS)"),
+    AlertCondition('low_heart_rate', 'heart_rate', WARNING, 50, 53, True, "Heart rate too low"),
+    AlertCondition('high_heart_rate', 'heart_rate', WARNING, 120, 115, False, "Heart rate too high"),
+)
+
+@dataclass
+class UserAlertState:
+    level: str = NORMAL
+    active: Set[str] = field(default_factory=set)
+    values: Dict[str, float] = field(default_factory=dict)
+    candidate: Optional[str] = None
+    candidate_since: float = 0.0
+    last_notified: Dict[str, float] = field(default_factory=dict)
+
+@dataclass(frozen=True)
+class AlertDecision:
+    level: str
+    message: str
+    previous: str
+    changed: bool       # Level transitioned on this snapshot
+    notify: bool        # Transition should be persisted and emitted (not in cooldown)
+
+class AlertStateMachine:
+    """Per-user alert levels with hysteresis, dwell times and cooldowns.
+
+    A new level must hold for `escalate_dwell` (going up) or `clear_dwell`
+    (going down) seconds before the state changes. Re-entering a level that
+    was notified less than `cooldown` seconds ago changes the state silently;
+    escalating beyond the most severe recently notified level is never suppressed.
+    """
+
+    def __init__(self, conditions=DEFAULT_CONDITIONS, escalate_dwell: float = 1.0,
+                 clear_dwell: float = 10.0, cooldown: float = 60.0):
+        self.conditions = conditions
+        self.escalate_dwell = escalate_dwell
+        self.clear_dwell = clear_dwell
+        self.cooldown = cooldown
+        self.states: Dict[Hashable, UserAlertState] = {}  # Keyed by user, or (user, stream)
+        self.lock = threading.Lock()
+
+    def update(self, key: Hashable, metrics: MetricsRecord, now: Optional[float] = None) -> AlertDecision:
+        """Feed one metrics snapshot and return the (possibly unchanged) alert state"""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            state = self.states.setdefault(key, UserAlertState())
+            target = self._evaluate(state, metrics)
+            previous = state.level
+
+            if target == state.level:
+                state.candidate = None
+                return AlertDecision(state.level, self._message(state), previous, False, False)
+
+            if target != state.candidate:
+                state.candidate = target
+                state.candidate_since = now
+
+            escalating = LEVEL_RANK[target] > LEVEL_RANK[state.level]
+            dwell = self.escalate_dwell if escalating else self.clear_dwell
+            if now - state.candidate_since < dwell:
+                return AlertDecision(state.level, self._message(state), previous, False, False)
+
+            state.level = target
+            state.candidate = None
+            notify = True
+            if target != NORMAL:
+                # Going beyond anything notified recently always notifies; repeats wait out the cooldown
+                last = state.last_notified.get(target)
+                notify = (last is None or now - last >= self.cooldown or
+                          LEVEL_RANK[target] > LEVEL_RANK[self._highest_recent(state, now)])
+                if notify:
+                    state.last_notified[target] = now
+            return AlertDecision(target, self._message(state), previous, True, notify)
+
+    def current(self, key: Hashable) -> Tuple[str, str]:
+        """Current level and message for a key (a user, or a user and stream)"""
+        with self.lock:
+            state = self.states.get(key)
+            if state is None:
+                return NORMAL, self._message(UserAlertState())
+            return state.level, self._message(state)
+
+    def forget(self, key: Hashable):
+        """Drop a key's state (on logout, disconnect or stream stop)"""
+        with self.lock:
+            self.states.pop(key, None)
+
+    def reset(self):
+        with self.lock:
+            self.states.clear()
+
+    def _evaluate(self, state: UserAlertState, metrics: MetricsRecord) -> str:
+        """Update active conditions with hysteresis and return the raw target level"""
+        target = NORMAL
+        for condition in self.conditions:
+            value = getattr(metrics, condition.field)
+            if value is None:
+                state.active.discard(condition.name)
+                continue
+            state.values[condition.name] = value
+            if condition.name in state.active:
+                if condition.cleared(value):
+                    state.active.discard(condition.name)
+            elif condition.triggered(value):
+                state.active.add(condition.name)
+
+            if condition.name in state.active and LEVEL_RANK[condition.level] > LEVEL_RANK[target]:
+                target = condition.level
+        return target
+
+    def _highest_recent(self, state: UserAlertState, now: float) -> str:
+        """Most severe level notified within the cooldown window"""
+        recent = [level for level, at in state.last_notified.items() if now - at < self.cooldown]
+        return max(recent, key=LEVEL_RANK.get, default=NORMAL)
+
+    def _message(self, state: UserAlertState) -> str:
+        messages = [
+            condition.message.format(value=state.values[condition.name])
+            for condition in self.conditions if condition.name in state.active
+        ]
+        return " | ".join(messages) if messages else "All metrics normal"
@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List
+from app.config import Config
+from app.core.async_runtime import run_blocking
+from app.services.performance import service_performance, PERSIST
+from app.services.telemetry import telemetry
+from definition import SPOOL_DIR
+
+logger = logging.getLogger(__name__)
+
+class AlertWriter:
+    """Background Firestore writer for alert documents.
+
+    Alerts are queued without blocking the metrics path, committed in
+    batches, retried with exponential backoff, and spilled to a JSON-lines
+    spool file when Firestore stays unreachable (or the queue is full).
+    The spool is replayed on start and after the next successful commit.
+    A replay works on a renamed copy (`.replay`) that is only deleted once
+    every alert in it is committed, so a crash or an outage mid-replay
+    leaves the rest to the next replay.
+    """
+
+    def __init__(self, db, spool_path=None):
+        self.db = db
+        self.spool_path = spool_path or os.path.join(SPOOL_DIR, 'pending_alerts.jsonl')
+        self.queue = queue.Queue(maxsize=Config.ALERT_QUEUE_SIZE)
+        self.batch_size = Config.ALERT_BATCH_SIZE
+        self.max_retries = Config.ALERT_MAX_RETRIES
+        self.base_delay = Config.ALERT_RETRY_BASE_DELAY
+        self.max_delay = Config.ALERT_RETRY_MAX_DELAY
+        self.spool_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        """Start the writer thread"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._run, name='alert-writer', daemon=True)
+        self.thread.start()
+        telemetry.register('alert_writer', lambda: [('queue_depth', {'queue': 'alert_writer'}, self.queue.qsize())])
+
+    def submit(self, user_email: str, alert_data: Dict) -> bool:
+        """Queue an alert for persistence; never blocks"""
+        item = {'user_email': user_email, 'data': alert_data}
+        try:
+            self.queue.put_nowait(item)
+            return True
+        except queue.Full:
+            logger.warning("Alert queue full, spilling alert to disk")
+            self._spill([item])
+            return False
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the writer, flushing queued alerts (spilled to disk if Firestore is down)"""
+        self.running = False
+        telemetry.unregister('alert_writer')
+        if self.thread:
+            self.thread.join(timeout)
+            self.thread = None
+
+        remaining = self._take_batch(block=False, limit=None)
+        if remaining and not self._commit(remaining, retries=1):
+            self._spill(remaining)
+
+    def pending_count(self) -> int:
+        """Number of alerts waiting in memory"""
+        return self.queue.qsize()
+
+    def _run(self):
+        """Writer loop: batch, commit with backoff, spill on persistent failure"""
+        self._replay_spool()
+        while self.running:
+            batch = self._take_batch(block=True, limit=self.batch_size)
+            if not batch:
+                continue
+            if self._commit(batch, retries=self.max_retries):
+                self._replay_spool()
+            else:
+                self._spill(batch)
+
+    def _take_batch(self, block: bool, limit=None) -> List[Dict]:
+        """Collect queued alerts, waiting briefly for the first one if block is set"""
+        batch = []
+        if block:
+            try:
+                batch.append(self.queue.get(timeout=1.0))
+            except queue.Empty:
+                return batch
+        while limit is None or len(batch) < limit:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, batch: List[Dict], retries: int) -> bool:
+        """Commit alerts in one Firestore batch, retrying with exponential backoff"""
+        delay = self.base_delay
+        for attempt in range(1, retries + 1):
+            try:
+                write_batch = self.db.batch()
+                for item in batch:
+                    history_ref = self.db.collection('alerts').document(item['user_email']).collection('history')
+                    write_batch.set(history_ref.document(), item['data'])
+                started = service_performance.clock()
+                with telemetry.firestore('alerts', 'commit'):
+                    run_blocking(write_batch.commit)
+                service_performance.record(PERSIST, started)
+                return True
+            except Exception as e:
+                logger.error(f"Error committing {len(batch)} alerts (attempt {attempt}/{retries}): {str(e)}")
+                if attempt < retries:
+                    time.sleep(delay)
+                    delay = min(delay * 2, self.max_delay)
+        return False
+
+    def _spill(self, batch: List[Dict]):
+        """Append alerts to the on-disk spool"""
+        try:
+            with self.spool_lock:
+                os.makedirs(os.path.dirname(self.spool_path), exist_ok=True)
+                with open(self.spool_path, 'a') as spool:
+                    for item in batch:
+                        spool.write(json.dumps(item, default=_encode_datetime) + '\n')
+            logger.warning(f"Spilled {len(batch)} alerts to {self.spool_path}")
+        except Exception as e:
+            logger.error(f"Error spilling alerts to disk, {len(batch)} alerts lost: {str(e)}")
+
+    def _replay_spool(self):
+        """Commit spilled alerts once Firestore is reachable again"""
+        replay_path = self.spool_path + '.replay'
+        try:
+            with self.spool_lock:
+                if os.path.exists(self.spool_path):
+                    if os.path.exists(replay_path):
+                        # An unfinished replay: its alerts go first, newer spills after them
+                        with open(self.spool_path) as spool, open(replay_path, 'a+') as replay:
+                            replay.seek(max(replay.tell() - 1, 0))
+                            if replay.read(1) not in ('', '\n'):
+                                replay.write('\n')  # Keep a torn last line from swallowing the next alert
+                            replay.write(spool.read())
+                        os.remove(self.spool_path)
+                    else:
+                        os.replace(self.spool_path, replay_path)
+                if not os.path.exists(replay_path):
+                    return
+
+            items = []
+            with open(replay_path) as replay:
+                for line in replay:
+                    if not line.strip():
+                        continue
+                    try:
+                        items.append(json.loads(line, object_hook=_decode_datetime))
+                    except ValueError:
+                        logger.warning(f"Skipping unreadable spilled alert: {line[:80]!r}")
+            logger.info(f"Replaying {len(items)} spilled alerts")
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                if not self._commit(batch, retries=self.max_retries):
+                    # Still unreachable: keep only what was not written for the next replay
+                    self._rewrite(replay_path, items[start:])
+                    return
+            os.remove(replay_path)
+        except Exception as e:
+            logger.error(f"Error replaying spilled alerts: {str(e)}")
+
+    def _rewrite(self, path: str, items: List[Dict]):
+        """Atomically replace a spool file with the given alerts"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as spool:
+            for item in items:
+                spool.write(json.dumps(item, default=_encode_datetime) + '\n')
+        os.replace(tmp_path, path)
+
+def _encode_datetime(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': value.isoformat()}
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+def _decode_datetime(obj):
+    if '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    return obj
@@ -2,147 +2,116 @@ from datetime import datetime
 import logging
 from typing import Dict
 from app.utils.firebase_client import FirebaseClient
-from flask_socketio import emit
+from app.models.metrics import MetricsRecord
+from app.config import Config
+from app.services.alert_writer import AlertWriter
+from app.services.alert_state import AlertStateMachine, NORMAL, WARNING, DANGER
+from app.services.telemetry import telemetry
 
 logger = logging.getLogger(__name__)
 
 class AlertLevel:
-    NORMAL = "normal"
-    WARNING = "warning"
-    DANGER = "danger"
+    NORMAL = NORMAL
+    WARNING = WARNING
+    DANGER = DANGER
 
 class AlertService:
-    def __init__(self):
+    def __init__(self, socket_service=None):
         self.db = FirebaseClient().get_db()
-        self.thresholds = {
-            'blink_rate': {'min': 10, 'max': 30},
-            'eye_closure': {'max': 0.3},
-            'alertness': {'min': 60},
-            'heart_rate': {'min': 50, 'max': 120}
-        }
-        self.pending_alerts = []
-        self.active_alerts = set()
-
-    def check_metrics(self, metrics: Dict, user_email: str):
-        """Check metrics against thresholds and emit alerts if needed"""
+        # Alerts are raised from the frame loop, outside any socket event context,
+        # so delivery goes through the SocketService queue to the user's room
+        self.socket_service = socket_service
+        # Alert state per (user, camera stream): one user's cameras never arm or
+        # clear each other's alerts. Only level transitions are persisted and emitted
+        self.state_machine = AlertStateMachine(
+            escalate_dwell=Config.ALERT_ESCALATE_DWELL,
+            clear_dwell=Config.ALERT_CLEAR_DWELL,
+            cooldown=Config.ALERT_COOLDOWN
+        )
+        self.active_alerts = {}  # (user_email, stream_id) -> alert_id of the current non-normal state
+        # Firestore writes happen on a background worker so metrics never wait on storage
+        self.writer = AlertWriter(self.db)
+        self.writer.start()
+
+    def check_metrics(self, metrics: MetricsRecord, user_email: str, stream_id: str = None):
+        """Check metrics against thresholds and emit alerts on state transitions"""
         try:
-            alert_level = self._determine_alert_level(metrics)
-            alert_message = self._generate_alert_message(metrics, alert_level)
+            decision = self.state_machine.update((user_email, stream_id), metrics)
 
-            if alert_level != AlertLevel.NORMAL:
-                self._save_alert(user_email, alert_level, alert_message, metrics)
-                self._emit_alert(alert_level, alert_message)
+            if decision.changed:
+                telemetry.inc('alert_transitions_total', {'from': decision.previous, 'to': decision.level})
+                if decision.level == AlertLevel.NORMAL:
+                    self._clear_user_alert(user_email, stream_id)
+                elif decision.notify:
+                    self._save_alert(user_email, decision.level, decision.message, metrics, stream_id)
+                    self._emit_alert(user_email, decision.level, decision.message, stream_id)
 
-            return alert_level, alert_message
+            return decision.level, decision.message
 
         except Exception as e:
             logger.error(f"Error checking metrics: {str(e)}")
             return AlertLevel.NORMAL, "Error checking metrics"
 
-    def _determine_alert_level(self, metrics: Dict) -> str:
-        """Determine alert level based on metrics"""
+    def _save_alert(self, user_email: str, level: str, message: str, metrics: MetricsRecord, stream_id: str = None):
+        """Queue alert for background persistence (batched, retried, spilled to disk on failure)"""
         try:
-            # Check alertness
-            alertness = float(metrics.get('alertness', 100))
-            if alertness < self.thresholds['alertness']['min']:
-                return AlertLevel.DANGER
-
-            # Check blink rate
-            blink_rate = float(metrics.get('blinkRate', '15').split('/')[0])
-            if (blink_rate < self.thresholds['blink_rate']['min'] or 
-                blink_rate > self.thresholds['blink_rate']['max']):
-                return AlertLevel.WARNING
-
-            # Check eye closure
-            eye_closure = float(metrics.get('eyeClosure', '0.2').replace('s', ''))
-            if eye_closure > self.thresholds['eye_closure']['max']:
-                return AlertLevel.DANGER
-
-            # Check heart rate
-            heart_rate = int(metrics.get('heartRate', 70))
-            if (heart_rate < self.thresholds['heart_rate']['min'] or 
-                heart_rate > self.thresholds['heart_rate']['max']):
-                return AlertLevel.WARNING
-
-            return AlertLevel.NORMAL
-
-        except Exception as e:
-            logger.error(f"Error determining alert level: {str(e)}")
-            return AlertLevel.NORMAL
-
-    def _generate_alert_message(self, metrics: Dict, alert_level: str) -> str:
-        """Generate alert message based on metrics and alert level"""
-        if alert_level == AlertLevel.NORMAL:
-            return "All metrics normal"
-
-        messages = []
-        try:
-            # Check alertness
-            alertness = float(metrics.get('alertness', 100))
-            if alertness < self.thresholds['alertness']['min']:
-                messages.append(f"Low alertness level: {alertness}%")
-
-            # Check blink rate
-            blink_rate = float(metrics.get('blinkRate', '15').split('/')[0])
-            if blink_rate < self.thresholds['blink_rate']['min']:
-                messages.append("Blink rate too low")
-            elif blink_rate > self.thresholds['blink_rate']['max']:
-                messages.append("Blink rate too high")
-
-            # Check eye closure
-            eye_closure = float(metrics.get('eyeClosure', '0.2').replace('s', ''))
-            if eye_closure > self.thresholds['eye_closure']['max']:
-                messages.append("Eyes closed too long")
-
-            # Check heart rate
-            heart_rate = int(metrics.get('heartRate', 70))
-            if heart_rate < self.thresholds['heart_rate']['min']:
-                messages.append("Heart rate too low")
-            elif heart_rate > self.thresholds['heart_rate']['max']:
-                messages.append("Heart rate too high")
-
-            return " | ".join(messages)
-
-        except Exception as e:
-            logger.error(f"Error generating alert message: {str(e)}")
-            return "Alert condition detected"
-
-    def _save_alert(self, user_email: str, level: str, message: str, metrics: Dict):
-        """Save alert to Firebase with retry mechanism"""
-        try:
-            alert_ref = self.db.collection('alerts').document(user_email)
+            timestamp = datetime.utcnow()
             alert_data = {
                 'level': level,
                 'message': message,
-                'metrics': metrics,
-                'timestamp': datetime.utcnow()
+                'metrics': metrics.to_dict(),
+                'timestamp': timestamp
             }
+            if stream_id:
+                alert_data['stream_id'] = stream_id
             
-            # Try to save alert
-            alert_ref.collection('history').add(alert_data)
-            
-            # Add to active alerts if high priority
+            # Track the user's current alert so it can be cleared on recovery. The
+            # document is complete before it is handed over: the writer thread may
+            # serialize it at once
             if level in ['warning', 'danger']:
-                alert_id = f"{user_email}_{datetime.utcnow().timestamp()}"
-                self.active_alerts.add(alert_id)
+                alert_id = f"{user_email}_{stream_id + '_' if stream_id else ''}{timestamp.timestamp()}"
+                self.active_alerts[(user_email, stream_id)] = alert_id
                 alert_data['alert_id'] = alert_id
-                
-            return True
+            
+            # Hand off to the writer; this never blocks on Firestore
+            return self.writer.submit(user_email, alert_data)
         except Exception as e:
-            logger.error(f"Error saving alert, adding to pending: {str(e)}")
-            self.add_pending_alert(user_email, level, message, metrics)
+            logger.error(f"Error queueing alert: {str(e)}")
             return False
 
-    def _emit_alert(self, level: str, message: str):
-        """Emit alert through Socket.IO"""
+    def _emit_alert(self, user_email: str, level: str, message: str, stream_id: str = None):
+        """Send alert to the user's clients through the SocketService priority queue"""
         try:
-            emit('alert', {
+            if not self.socket_service:
+                logger.warning("No socket service attached, alert not delivered")
+                return
+            if not user_email:
+                return  # Never broadcast an alert that belongs to no user
+            self.socket_service.publish_alert('alert', {
                 'level': level,
                 'message': message,
+                'streamId': stream_id,
                 'timestamp': datetime.utcnow().isoformat()
-            })
+            }, user_email=user_email)
         except Exception as e:
-            logger.error(f"Error emitting alert: {str(e)}") 
+            logger.error(f"Error emitting alert: {str(e)}")
+
+    def _emit_alert_cleared(self, user_email: str, alert_id: str):
+        """Tell the user's clients an alert is no longer active"""
+        try:
+            if self.socket_service:
+                self.socket_service.publish_alert('alert_cleared', {
+                    'alert_id': alert_id,
+                    'timestamp': datetime.utcnow().isoformat()
+                }, user_email=user_email)
+        except Exception as e:
+            logger.error(f"Error clearing alert {alert_id}: {str(e)}")
+
+    def _clear_user_alert(self, user_email: str, stream_id: str = None):
+        """Emit alert_cleared when a user's stream returns to normal"""
+        alert_id = self.active_alerts.pop((user_email, stream_id), None)
+        if alert_id is not None:
+            self._emit_alert_cleared(user_email, alert_id)
 
     def cleanup(self):
         """Clean up alert service resources"""
@@ -159,18 +128,13 @@ class AlertService:
             logger.error(f"Error during alert service cleanup: {str(e)}")
 
     def _save_pending_alerts(self):
-        """Save any pending alerts before cleanup"""
+        """Flush queued alerts before cleanup (anything Firestore rejects is spilled to disk)"""
         try:
-            if self.pending_alerts:
-                logger.info(f"Saving {len(self.pending_alerts)} pending alerts")
-                for alert in self.pending_alerts:
-                    self._save_alert(
-                        alert['user_email'],
-                        alert['level'],
-                        alert['message'],
-                        alert['metrics']
-                    )
-                self.pending_alerts.clear()
+            if self.writer:
+                pending = self.writer.pending_count()
+                if pending:
+                    logger.info(f"Saving {pending} pending alerts")
+                self.writer.stop()
         except Exception as e:
             logger.error(f"Error saving pending alerts: {str(e)}")
 
@@ -179,15 +143,8 @@ class AlertService:
         try:
             if self.active_alerts:
                 logger.info(f"Clearing {len(self.active_alerts)} active alerts")
-                for alert_id in self.active_alerts:
-                    try:
-                        # Emit alert cleared event if needed
-                        emit('alert_cleared', {
-                            'alert_id': alert_id,
-                            'timestamp': datetime.utcnow().isoformat()
-                        })
-                    except Exception as e:
-                        logger.error(f"Error clearing alert {alert_id}: {str(e)}")
+                for (user_email, _), alert_id in self.active_alerts.items():
+                    self._emit_alert_cleared(user_email, alert_id)
                 self.active_alerts.clear()
         except Exception as e:
             logger.error(f"Error clearing active alerts: {str(e)}")
@@ -196,18 +153,13 @@ class AlertService:
         """Reset service state"""
         try:
             self.db = None
-            self.pending_alerts = []
-            self.active_alerts = set()
+            self.writer = None
+            self.socket_service = None
+            self.active_alerts = {}
+            self.state_machine.reset()
         except Exception as e:
             logger.error(f"Error resetting alert service state: {str(e)}")
 
-    def add_pending_alert(self, user_email: str, level: str, message: str, metrics: Dict):
-        """Add alert to pending queue if immediate save fails"""
-        self.pending_alerts.append({
-            'user_email': user_email,
-            'level': level,
-            'message': message,
-            'metrics': metrics,
-            'timestamp': datetime.utcnow()
-        })
-  
\ No newline at end of file
+    def add_pending_alert(self, user_email: str, level: str, message: str, metrics: MetricsRecord):
+        """Queue an alert for persistence (kept for callers of the old pending list)"""
+        return self._save_alert(user_email, level, message, metrics)
@@ -3,6 +3,9 @@ from datetime import datetime, timedelta
 import logging
 from typing import Dict, Optional
 from app.utils.auth_decorators import check_fitbit_token
+from app.core.async_runtime import run_blocking
+from app.models.metrics import MetricsRecord
+from app.services.telemetry import telemetry
 
 logger = logging.getLogger(__name__)
 
@@ -24,8 +27,9 @@ class FitbitClient:
                 date = datetime.now().strftime('%Y-%m-%d')
             
             url = f"{self.BASE_URL}/activities/heart/date/{date}/1d/1sec.json"
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
+            with telemetry.wearable('heart_rate'):
+                response = run_blocking(requests.get, url, headers=self.headers)
+                response.raise_for_status()
             return response.json()
         except Exception as e:
             logger.error(f"Error getting heart rate data: {str(e)}")
@@ -39,8 +43,9 @@ class FitbitClient:
                 date = datetime.now().strftime('%Y-%m-%d')
             
             url = f"{self.BASE_URL}/sleep/date/{date}.json"
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
+            with telemetry.wearable('sleep'):
+                response = run_blocking(requests.get, url, headers=self.headers)
+                response.raise_for_status()
             return response.json()
         except Exception as e:
             logger.error(f"Error getting sleep data: {str(e)}")
@@ -54,15 +59,16 @@ class FitbitClient:
                 date = datetime.now().strftime('%Y-%m-%d')
             
             url = f"{self.BASE_URL}/activities/date/{date}.json"
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
+            with telemetry.wearable('activity'):
+                response = run_blocking(requests.get, url, headers=self.headers)
+                response.raise_for_status()
             return response.json()
         except Exception as e:
             logger.error(f"Error getting activity data: {str(e)}")
             return {}
 
     @check_fitbit_token
-    def get_all_metrics(self) -> Dict:
+    def get_all_metrics(self) -> MetricsRecord:
         """Get all relevant metrics for fatigue monitoring"""
         try:
             date = datetime.now().strftime('%Y-%m-%d')
@@ -72,11 +78,11 @@ class FitbitClient:
             activity_data = self.get_activity_data(date)
 
             # Extract current heart rate
-            current_heart_rate = '0'
+            current_heart_rate = None
             if heart_data and 'activities-heart-intraday' in heart_data:
                 dataset = heart_data['activities-heart-intraday'].get('dataset', [])
                 if dataset:
-                    current_heart_rate = str(dataset[-1].get('value', 0))
+                    current_heart_rate = dataset[-1].get('value', 0)
 
             # Calculate alertness based on sleep efficiency and activity
             alertness = 100
@@ -90,20 +96,14 @@ class FitbitClient:
                 if sedentary_minutes > 120:  # If sedentary for more than 2 hours
                     alertness = max(0, alertness - 10)
 
-            return {
-                'heartRate': current_heart_rate,
-                'alertness': str(alertness),
-                'blinkRate': '15/min',  # This should come from video processing
-                'eyeClosure': '0.2s',    # This should come from video processing
-                'headPosition': 'Centered', # This should come from video processing
-                'alertStatus': 'Normal' if alertness > 70 else 'Warning',
-                'timestamp': datetime.utcnow().isoformat(),
-                'raw_data': {
-                    'heart_rate': heart_data,
-                    'sleep': sleep_data,
-                    'activity': activity_data
-                }
-            }
+            return MetricsRecord(
+                heart_rate=current_heart_rate,
+                alertness=alertness,
+                blink_rate=15,             # This should come from video processing
+                eye_closure=0.2,           # This should come from video processing
+                head_position='Centered',  # This should come from video processing
+                timestamp=datetime.utcnow()
+            )
         except Exception as e:
             logger.error(f"Error getting all metrics: {str(e)}")
             return {
@@ -1,26 +1,175 @@
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import List, Dict, Optional
 import json
+import math
+import time
 import logging
+import threading
+from app.config import Config
 from app.utils.firebase_client import FirebaseClient
+from app.models.metrics import MetricsRecord
+from app.services.validation import MetricsValidator
+from app.core.async_runtime import run_blocking
+from app.services.telemetry import telemetry
 
 logger = logging.getLogger(__name__)
 
+AGGREGATE_WINDOW = timedelta(hours=1)  # Window kept as running aggregates (default averaging span)
+AGGREGATE_BUCKET_SECONDS = 60          # Expiry granularity of the running window
+FALLBACK_CACHE_TTL = 30                # Seconds a Firestore-computed average is reused
+FALLBACK_CACHE_SIZE = 1024             # (user, span) entries kept; least recently used go first
+
+# Fields aggregated per snapshot; missing values (no wearable) are not counted
+AGGREGATE_FIELDS = ('heart_rate', 'alertness', 'blink_rate', 'eye_closure', 'perclos', 'yawn_count')
+
+class RunningAggregate:
+    """Count, sum and sum of squares per field over a sliding time window.
+
+    Snapshots are added to fixed-size time buckets; window totals are updated
+    on add and when whole buckets expire, so reads are O(1).
+    """
+
+    def __init__(self, window: timedelta = AGGREGATE_WINDOW, bucket_seconds: int = AGGREGATE_BUCKET_SECONDS):
+        self.window_seconds = window.total_seconds()
+        self.bucket_seconds = bucket_seconds
+        self.buckets = deque()  # (bucket_start, [[count, sum, sum_sq] per field])
+        self.totals = [[0, 0.0, 0.0] for _ in AGGREGATE_FIELDS]
+        self.started_at = None  # First snapshot seen by this process
+
+    def idle(self, now: float) -> bool:
+        """True when no snapshot of the current window is left"""
+        self._expire(now)
+        return not self.buckets
+
+    def add(self, metrics: MetricsRecord, at: float):
+        if self.started_at is None:
+            self.started_at = at
+        bucket_start = at - at % self.bucket_seconds
+        if not self.buckets or self.buckets[-1][0] != bucket_start:
+            self.buckets.append((bucket_start, [[0, 0.0, 0.0] for _ in AGGREGATE_FIELDS]))
+        bucket = self.buckets[-1][1]
+
+        for stats, totals, field in zip(bucket, self.totals, AGGREGATE_FIELDS):
+            value = getattr(metrics, field)
+            if value is None:
+                continue
+            for target in (stats, totals):
+                target[0] += 1
+                target[1] += value
+                target[2] += value * value
+        self._expire(at)
+
+    def covers(self, now: float) -> bool:
+        """True once this process has seen every snapshot of the current window"""
+        return self.started_at is not None and self.started_at <= now - self.window_seconds
+
+    def stats(self, now: float) -> Dict[str, Dict]:
+        """Count, mean and standard deviation per field for the window ending now"""
+        self._expire(now)
+        result = {}
+        for field, (count, total, total_sq) in zip(AGGREGATE_FIELDS, self.totals):
+            if count == 0:
+                continue
+            mean = total / count
+            variance = max(total_sq / count - mean * mean, 0.0)  # Clamp rounding error
+            result[field] = {'count': count, 'mean': mean, 'std': math.sqrt(variance)}
+        return result
+
+    def _expire(self, now: float):
+        cutoff = now - self.window_seconds
+        while self.buckets and self.buckets[0][0] + self.bucket_seconds <= cutoff:
+            _, expired = self.buckets.popleft()
+            for stats, totals in zip(expired, self.totals):
+                totals[0] -= stats[0]
+                totals[1] -= stats[1]
+                totals[2] -= stats[2]
+        if not self.buckets:
+            # Reset instead of carrying subtraction drift into the next window
+            self.totals = [[0, 0.0, 0.0] for _ in AGGREGATE_FIELDS]
+
+# Shared by every MetricsHistory instance (callers create one per request). Both are
+# per process: with Config.HISTORY_AGGREGATES off, every worker asks Firestore instead
+_aggregates: Dict[str, RunningAggregate] = {}
+_fallback_cache: 'OrderedDict[tuple, tuple]' = OrderedDict()  # (user_email, hours) -> (expires_at, averages)
+_aggregates_lock = threading.Lock()
+_last_sweep = 0.0
+
+def _evict_idle_aggregates(now: float):
+    """Drop the aggregates of users with no snapshot in the window (lock held), once per bucket"""
+    global _last_sweep
+    if now - _last_sweep < AGGREGATE_BUCKET_SECONDS:
+        return
+    _last_sweep = now
+    for user_email, aggregate in list(_aggregates.items()):
+        if aggregate.idle(now):
+            del _aggregates[user_email]
+
+def _cache_fallback(key: tuple, averages: Dict, now: float):
+    """Store a Firestore-computed average, dropping expired and least recently used entries (lock held)"""
+    _fallback_cache[key] = (now + FALLBACK_CACHE_TTL, averages)
+    _fallback_cache.move_to_end(key)
+    if len(_fallback_cache) > FALLBACK_CACHE_SIZE:
+        for expired in [k for k, (expires_at, _) in _fallback_cache.items() if expires_at <= now]:
+            del _fallback_cache[expired]
+    while len(_fallback_cache) > FALLBACK_CACHE_SIZE:
+        _fallback_cache.popitem(last=False)
+
+def _format_averages(heart_rate: Optional[float], alertness: Optional[float]) -> Dict:
+    if alertness is None:
+        return {}
+    return {
+        'avg_heart_rate': heart_rate,
+        'avg_alertness': round(alertness, 2)
+    }
+
 class MetricsHistory:
     def __init__(self):
         self.db = FirebaseClient().get_db()
 
-    def save_metrics(self, user_email: str, metrics: Dict):
-        """Save metrics to Firebase"""
+    def save_metrics(self, user_email: str, metrics: MetricsRecord):
+        """Save metrics to Firebase and fold them into the running aggregates"""
         try:
+            timestamp = datetime.utcnow()
             metrics_ref = self.db.collection('metrics').document(user_email)
-            metrics_ref.collection('history').add({
-                **metrics,
-                'timestamp': datetime.utcnow()
-            })
+            with telemetry.firestore('metrics', 'add'):
+                run_blocking(metrics_ref.collection('history').add, {
+                    **metrics.to_dict(),
+                    'timestamp': timestamp
+                })
+
+            if Config.HISTORY_AGGREGATES:
+                now = time.time()
+                with _aggregates_lock:
+                    aggregate = _aggregates.setdefault(user_email, RunningAggregate())
+                    aggregate.add(metrics, now)
+                    _evict_idle_aggregates(now)
         except Exception as e:
             logger.error(f"Error saving metrics: {str(e)}")
 
+    def import_metrics(self, user_email: str, documents: List[Dict], batch_size: int = 500) -> int:
+        """Bulk import history documents, validated in one vectorized pass"""
+        try:
+            records = MetricsValidator.sanitize_batch(
+                [MetricsValidator.parse_document(document) for document in documents]
+            )
+            history_ref = self.db.collection('metrics').document(user_email).collection('history')
+
+            # Firestore batches hold at most 500 writes
+            for start in range(0, len(records), batch_size):
+                batch = self.db.batch()
+                for record in records[start:start + batch_size]:
+                    batch.set(history_ref.document(), {
+                        **record.to_dict(),
+                        'timestamp': record.timestamp or datetime.utcnow()
+                    })
+                with telemetry.firestore('metrics', 'commit'):
+                    run_blocking(batch.commit)
+            return len(records)
+        except Exception as e:
+            logger.error(f"Error importing metrics: {str(e)}")
+            return 0
+
     def get_metrics_history(self, user_email: str, hours: int = 24) -> List[Dict]:
         """Get metrics history for the specified duration"""
         try:
@@ -28,38 +177,78 @@ class MetricsHistory:
             metrics_ref = self.db.collection('metrics').document(user_email)
             
             # Query metrics after start_time
-            docs = metrics_ref.collection('history')\
+            query = metrics_ref.collection('history')\
                 .where('timestamp', '>=', start_time)\
-                .order_by('timestamp', direction='desc')\
-                .stream()
+                .order_by('timestamp', direction='desc')
 
-            return [doc.to_dict() for doc in docs]
+            with telemetry.firestore('metrics', 'query'):
+                return run_blocking(lambda: [doc.to_dict() for doc in query.stream()])
         except Exception as e:
             logger.error(f"Error getting metrics history: {str(e)}")
             return []
 
+    def get_metric_stats(self, user_email: str) -> Dict[str, Dict]:
+        """Count, mean and std per field over AGGREGATE_WINDOW from the running aggregates"""
+        with _aggregates_lock:
+            aggregate = _aggregates.get(user_email)
+            return aggregate.stats(time.time()) if aggregate else {}
+
     def get_average_metrics(self, user_email: str, hours: int = 1) -> Dict:
         """Calculate average metrics for the specified duration"""
-        metrics = self.get_metrics_history(user_email, hours)
-        if not metrics:
-            return {}
+        now = time.time()
+        if Config.HISTORY_AGGREGATES and timedelta(hours=hours) == AGGREGATE_WINDOW:
+            with _aggregates_lock:
+                aggregate = _aggregates.get(user_email)
+                if aggregate and aggregate.covers(now):
+                    telemetry.cache('history_averages', True)
+                    stats = aggregate.stats(now)
+                    return _format_averages(
+                        stats.get('heart_rate', {}).get('mean'),
+                        stats.get('alertness', {}).get('mean')
+                    )
 
-        total_hr = 0
-        total_alertness = 0
-        count = 0
+        # Cold or disabled aggregates (e.g. after a restart) or a custom span: ask
+        # Firestore, reusing the answer for a short time
+        key = (user_email, hours)
+        with _aggregates_lock:
+            cached = _fallback_cache.get(key)
+            if cached and cached[0] > now:
+                _fallback_cache.move_to_end(key)
+                telemetry.cache('history_averages', True)
+                return cached[1]
 
-        for metric in metrics:
-            try:
-                total_hr += int(metric.get('heartRate', 0))
-                total_alertness += float(metric.get('alertness', 0))
-                count += 1
-            except (ValueError, TypeError):
-                continue
+        telemetry.cache('history_averages', False)
+        averages = self._query_average_metrics(user_email, hours)
+        with _aggregates_lock:
+            _cache_fallback(key, averages, now)
+        return averages
 
-        if count == 0:
-            return {}
+    def _query_average_metrics(self, user_email: str, hours: int) -> Dict:
+        """Averages computed by Firestore, without streaming the window when possible"""
+        try:
+            start_time = datetime.utcnow() - timedelta(hours=hours)
+            query = self.db.collection('metrics').document(user_email).collection('history')\
+                .where('timestamp', '>=', start_time)
 
-        return {
-            'avg_heart_rate': str(total_hr // count),
-            'avg_alertness': str(round(total_alertness / count, 2))
-        } 
\ No newline at end of file
+            if hasattr(query, 'avg'):
+                # Server-side aggregation query (google-cloud-firestore >= 2.14)
+                aggregation = query.avg('heartRate', alias='heart_rate').avg('alertness', alias='alertness')
+                with telemetry.firestore('metrics', 'aggregate'):
+                    results = run_blocking(aggregation.get)
+                values = {result.alias: result.value for result in results[0]} if results else {}
+                return _format_averages(values.get('heart_rate'), values.get('alertness'))
+
+            # Older clients: stream only the averaged fields
+            with telemetry.firestore('metrics', 'query'):
+                docs = run_blocking(lambda: [doc.to_dict() for doc in query.select(['heartRate', 'alertness']).stream()])
+            if not docs:
+                return {}
+            records = [MetricsRecord.from_dict(doc) for doc in docs]
+            heart_rates = [record.heart_rate for record in records if record.heart_rate is not None]
+            return _format_averages(
+                sum(heart_rates) / len(heart_rates) if heart_rates else None,
+                sum(record.alertness for record in records) / len(records)
+            )
+        except Exception as e:
+            logger.error(f"Error getting average metrics: {str(e)}")
+            return {}
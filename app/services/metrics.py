@@ -10,20 +10,20 @@ from app.services.alerts import AlertService
 from typing import Dict
 from app.services.mock_data import get_mock_metrics as get_fitbit_mock_metrics
 from app.services.fitbit_client import FitbitClient
+from app.models.metrics import MetricsRecord
 
 logger = logging.getLogger(__name__)
 
 def get_mock_metrics():
-    return {
-        'heartRate': '72',
-        'alertness': '95',
-        'blinkRate': 'Normal (12/min)',
-        'eyeClosure': '0.2s',
-        'headPosition': 'Centered',
-        'yawnCount': '0/min',
-        'alertStatus': 'Normal',
-        'timestamp': datetime.utcnow().isoformat()
-    }
+    return MetricsRecord(
+        heart_rate=72,
+        alertness=95,
+        blink_rate=12,
+        eye_closure=0.2,
+        head_position='Centered',
+        yawn_count=0,
+        timestamp=datetime.utcnow()
+    )
 
 def get_real_metrics():
     """Get real metrics from Fitbit API"""
@@ -38,6 +38,10 @@ def get_real_metrics():
         # Get Fitbit data
         client = FitbitClient(session['fitbit_token'])
         metrics = client.get_all_metrics()
+        if isinstance(metrics, dict):
+            return metrics  # Error reported by the Fitbit client
+        if not isinstance(metrics, MetricsRecord):
+            return {'error': 'Fitbit authentication required'}  # Token check redirected
         
         # Validate and sanitize metrics
         metrics = MetricsValidator.sanitize_metrics(metrics)
@@ -48,9 +52,8 @@ def get_real_metrics():
         
         # Add historical averages
         averages = history.get_average_metrics(user_email)
-        metrics.update({
-            'historical_averages': averages
-        })
+        metrics.avg_heart_rate = averages.get('avg_heart_rate')
+        metrics.avg_alertness = averages.get('avg_alertness')
         
         return metrics
     except Exception as e:
@@ -71,20 +74,20 @@ def process_heart_rate(heart_rate_data):
                             if points:
                                 latest_point = points[-1]  # Get most recent
                                 if 'value' in latest_point:
-                                    return str(int(latest_point['value'][0]['fpVal']))
-        return '0'  # Return 0 if no valid heart rate found
+                                    return int(latest_point['value'][0]['fpVal'])
+        return 0  # Return 0 if no valid heart rate found
     except Exception as e:
         logger.error(f"Error processing heart rate: {str(e)}")
-        return '0'
+        return 0
 
 def calculate_alertness():
     """Calculate alertness based on multiple factors"""
     try:
         # Get the required metrics
-        blink_rate = float(get_blink_rate().split()[0])
-        eye_closure = float(get_eye_closure().replace('s', ''))
+        blink_rate = get_blink_rate()
+        eye_closure = get_eye_closure()
         head_pos = get_head_position()
-        yawn_count = float(get_yawn_count().split()[0])
+        yawn_count = get_yawn_count()
 
         # Calculate alertness score (0-100)
         score = 100
@@ -110,12 +113,11 @@ def calculate_alertness():
             score -= 15
 
         # Ensure score stays within 0-100
-        score = max(0, min(100, score))
-        return str(score)
+        return max(0, min(100, score))
 
     except Exception as e:
         logger.error(f"Error calculating alertness: {str(e)}")
-        return '0'
+        return 0
 
 def get_blink_rate():
     """Get blink rate from eye detection"""
@@ -123,11 +125,10 @@ def get_blink_rate():
         # Get blink rate from the last few seconds of detection
         from app.modules.fatigue_detector import FatigueDetector
         detector = FatigueDetector()
-        blink_count = detector.get_blink_count()  # Get blinks in last 60 seconds
-        return f"{blink_count}/min"
+        return detector.get_blink_count()  # Blinks in last 60 seconds
     except Exception as e:
         logger.error(f"Error getting blink rate: {str(e)}")
-        return "0/min"
+        return 0
 
 def get_eye_closure():
     """Get eye closure duration"""
@@ -135,11 +136,10 @@ def get_eye_closure():
         # Get actual eye closure from video processing
         from app.modules.fatigue_detector import FatigueDetector
         detector = FatigueDetector()
-        closure_duration = detector.get_eye_closure_duration()
-        return f"{closure_duration:.1f}s"
+        return detector.get_eye_closure_duration()
     except Exception as e:
         logger.error(f"Error getting eye closure: {str(e)}")
-        return "0.0s"
+        return 0.0
 
 def get_head_position():
     """Get head position from video processing"""
@@ -157,16 +157,15 @@ def get_yawn_count():
     try:
         from app.modules.fatigue_detector import FatigueDetector
         detector = FatigueDetector()
-        yawn_count = detector.get_yawn_count()
-        return f"{yawn_count}/min"
+        return detector.get_yawn_count()
     except Exception as e:
         logger.error(f"Error getting yawn count: {str(e)}")
-        return "0/min"
+        return 0
 
 def determine_alert_status():
     """Determine alert status based on metrics"""
     try:
-        alertness = float(calculate_alertness())
+        alertness = calculate_alertness()
         
         if alertness >= 80:
             return 'Normal'
@@ -179,8 +178,9 @@ def determine_alert_status():
         return 'Error'
 
 class MetricsService:
-    def __init__(self):
-        self.alert_service = AlertService()
+    def __init__(self, alert_service=None):
+        # Share the manager's AlertService so alert state and the writer exist once
+        self.alert_service = alert_service or AlertService()
         self.monitoring_active = False
         self.background_tasks = []
 
@@ -210,22 +210,15 @@ class MetricsService:
             return get_mock_metrics()  # Original simple mock data
         return get_real_metrics() 
 
-    def process_metrics(self, raw_metrics: Dict, user_email: str) -> Dict:
-        """Process and validate metrics, generate alerts if needed"""
+    def process_metrics(self, raw_metrics: MetricsRecord, user_email: str, stream_id: str = None):
+        """Check alerts on the raw detector record; return it sanitized for display and storage"""
         try:
-            # Validate metrics
-            metrics = MetricsValidator.sanitize_metrics(raw_metrics)
-            
-            # Check for alerts
-            alert_level, alert_message = self.alert_service.check_metrics(metrics, user_email)
+            # Alerts see the detector's values as measured (a 3 s microsleep stays 3 s)
+            alert_level, alert_message = self.alert_service.check_metrics(raw_metrics, user_email, stream_id)
             
-            # Add alert info to metrics
-            metrics.update({
-                'alertLevel': alert_level,
-                'alertMessage': alert_message
-            })
+            metrics = MetricsValidator.sanitize_metrics(raw_metrics)
             
-            return metrics
+            return metrics, alert_level, alert_message
         except Exception as e:
             logger.error(f"Error processing metrics: {str(e)}")
-            return raw_metrics 
\ No newline at end of file
+            return raw_metrics, None, None 
\ No newline at end of file
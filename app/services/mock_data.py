@@ -1,6 +1,7 @@
 import random
 from datetime import datetime, timedelta
 import json
+from app.models.metrics import MetricsRecord
 
 class MockFitbitData:
     def __init__(self):
@@ -169,18 +170,12 @@ def get_mock_metrics():
     # Calculate alertness based on sleep and activity
     alertness = min(100, sleep_efficiency + random.randint(-10, 10))
 
-    return {
-        'heartRate': str(current_heart_rate),
-        'alertness': str(alertness),
-        'blinkRate': f"{random.randint(10, 20)}/min",
-        'yawnCount': f"{random.randint(0, 7)}/min",
-        'eyeClosure': f"{random.uniform(0.1, 0.4):.1f}s",
-        'headPosition': random.choice(['Centered', 'Left', 'Right', 'Up', 'Down']),
-        'alertStatus': 'Normal' if alertness > 70 else 'Warning',
-        'timestamp': datetime.utcnow().isoformat(),
-        'raw_data': {
-            'heart_rate': heart_data,
-            'sleep': sleep_data,
-            'activity': activity_data
-        }
-    } 
\ No newline at end of file
+    return MetricsRecord(
+        heart_rate=current_heart_rate,
+        alertness=alertness,
+        blink_rate=random.randint(10, 20),
+        yawn_count=random.randint(0, 7),
+        eye_closure=round(random.uniform(0.1, 0.4), 1),
+        head_position=random.choice(['Centered', 'Left', 'Right', 'Up', 'Down']),
+        timestamp=datetime.utcnow()
+    ) 
\ No newline at end of file
@@ -0,0 +1,57 @@
+import logging
+from typing import Dict
+import numpy as np
+from app.models.metrics import MetricsRecord
+
+try:
+    import msgpack
+except ImportError:  # Binary payloads are opt-in; JSON keeps working without msgpack
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+
+def supported_encodings():
+    """Encodings this server can produce"""
+    return (JSON, MSGPACK) if msgpack is not None else (JSON,)
+
+def negotiate(requested: str) -> str:
+    """Pick the encoding for a client, falling back to JSON"""
+    return requested if requested in supported_encodings() else JSON
+
+def encode_metrics(metrics: MetricsRecord, encoding: str, stream_id: str = None):
+    """Encode a metrics_update payload: display strings for JSON, numbers for binary.
+
+    Camera metrics carry the stream they came from, so a user's cameras stay apart.
+    """
+    data = metrics.to_display() if encoding != MSGPACK else metrics.to_dict()
+    if stream_id:
+        data['streamId'] = stream_id
+    if encoding != MSGPACK:
+        return data
+    return msgpack.packb(data, use_bin_type=True)
+
+def encode_trends(trend_data: Dict, encoding: str):
+    """Encode a trends_update payload; binary series are packed little-endian float32"""
+    if encoding != MSGPACK:
+        return trend_data
+
+    datasets = {
+        name: np.asarray(values, dtype='<f4').tobytes()
+        for name, values in trend_data.get('datasets', {}).items()
+    }
+    return msgpack.packb({'labels': trend_data.get('labels', []), 'datasets': datasets}, use_bin_type=True)
+
+def encode_trend_point(point: Dict, encoding: str):
+    """Encode a single trends_append point"""
+    if encoding != MSGPACK:
+        return point
+    return msgpack.packb(point, use_bin_type=True)
+
+def decode(payload):
+    """Decode a binary payload (used by benchmarks and tooling)"""
+    if isinstance(payload, (bytes, bytearray)):
+        return msgpack.unpackb(payload, raw=False)
+    return payload
@@ -1,61 +1,303 @@
+import os
 import time
-from collections import deque
-from statistics import mean
+import threading
 import logging
+from typing import Dict, List, Optional
+from app.config import Config
 
 logger = logging.getLogger(__name__)
 
+# Pipeline stages timed per stream (see PerformanceMetrics.clock / record)
+CAPTURE = 'capture'
+COLOR_CONVERT = 'color_convert'
+INFERENCE = 'inference'
+FEATURES = 'features'
+DRAW = 'draw'
+ENCODE = 'encode'
+EMIT = 'emit'
+PERSIST = 'persist'
+STAGES = (CAPTURE, COLOR_CONVERT, INFERENCE, FEATURES, DRAW, ENCODE, EMIT, PERSIST)
+
+EMA_ALPHA = 2 / (30 + 1)  # Smoothing of the headline averages, comparable to a 30-sample mean
+
+class LogHistogram:
+    """HDR-style histogram of integer microseconds with log-linear buckets.
+
+    Each power of two is split into SUB_BUCKETS linear buckets, so any
+    recorded value is reported within 1/SUB_BUCKETS (about 6%) of its true
+    value, over a range from 1 us to MAX_VALUE. Recording is a couple of
+    integer operations and a list increment; percentiles walk the buckets
+    at read time only.
+    """
+
+    SUB_BITS = 4
+    SUB_BUCKETS = 1 << SUB_BITS
+    MAX_VALUE = (1 << 36) - 1  # About 19 hours
+
+    def __init__(self):
+        self.counts = [0] * self._index(self.MAX_VALUE) + [0]
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    @classmethod
+    def _index(cls, value: int) -> int:
+        exponent = value.bit_length() - 1
+        if exponent < cls.SUB_BITS:
+            return value
+        shift = exponent - cls.SUB_BITS
+        # Bucket group per exponent, linear position within it from the next SUB_BITS bits
+        return (shift + 1) * cls.SUB_BUCKETS + (value >> shift) - cls.SUB_BUCKETS
+
+    @classmethod
+    def _upper_bound(cls, index: int) -> int:
+        """Largest value falling in a bucket"""
+        if index < cls.SUB_BUCKETS * 2:
+            return index
+        shift = index // cls.SUB_BUCKETS - 1
+        return ((index % cls.SUB_BUCKETS + cls.SUB_BUCKETS) << shift) + (1 << shift) - 1
+
+    def record(self, value: int):
+        value = min(max(int(value), 0), self.MAX_VALUE)
+        self.counts[self._index(value)] += 1
+        self.total += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'LogHistogram'):
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentiles(self, quantiles: List[float]) -> List[int]:
+        """Upper bucket bound of each quantile (0-1), in one pass over the buckets"""
+        if not self.total:
+            return [0] * len(quantiles)
+        targets = sorted((max(1, int(q * self.total + 0.5)), i) for i, q in enumerate(quantiles))
+        results = [0] * len(quantiles)
+        seen = 0
+        position = 0
+        for index, count in enumerate(self.counts):
+            if not count:
+                continue
+            seen += count
+            while position < len(targets) and seen >= targets[position][0]:
+                results[targets[position][1]] = min(self._upper_bound(index), self.max)
+                position += 1
+            if position == len(targets):
+                break
+        return results
+
+    def cumulative_counts(self, bounds: List[int]) -> List[int]:
+        """Number of values at or below each ascending bound, counted by bucket upper bound"""
+        results = []
+        seen = 0
+        index = 0
+        for bound in bounds:
+            while index < len(self.counts) and self._upper_bound(index) <= bound:
+                seen += self.counts[index]
+                index += 1
+            results.append(seen)
+        return results
+
+class WindowedHistogram:
+    """Two LogHistograms rotated every `window` seconds; reads cover the last one to two windows.
+
+    Rotated-out counts are folded into `retired`, so cumulative() still
+    covers everything recorded (for monotonic exports such as /metrics).
+    """
+
+    def __init__(self, window: float):
+        self.window = window
+        self.current = LogHistogram()
+        self.previous = LogHistogram()
+        self.retired = LogHistogram()
+        self.rotated_at = time.monotonic()
+
+    def record(self, value: int):
+        now = time.monotonic()
+        if now - self.rotated_at >= self.window:
+            self.retired.merge(self.previous)
+            if now - self.rotated_at < 2 * self.window:
+                self.previous = self.current
+            else:
+                # After an idle gap longer than two windows, nothing old is kept
+                self.retired.merge(self.current)
+                self.previous = LogHistogram()
+            self.current = LogHistogram()
+            self.rotated_at = now
+        self.current.record(value)
+
+    def cumulative(self) -> LogHistogram:
+        """Everything recorded since creation"""
+        merged = LogHistogram()
+        for histogram in (self.retired, self.previous, self.current):
+            merged.merge(histogram)
+        return merged
+
+    def summary(self) -> Dict:
+        """Count, mean, p50/p95/p99 and max in milliseconds"""
+        merged = LogHistogram()
+        merged.merge(self.previous)
+        merged.merge(self.current)
+        p50, p95, p99 = merged.percentiles([0.5, 0.95, 0.99])
+        return {
+            'count': merged.total,
+            'mean': round(merged.sum / merged.total / 1000, 3) if merged.total else 0,
+            'p50': p50 / 1000,
+            'p95': p95 / 1000,
+            'p99': p99 / 1000,
+            'max': merged.max / 1000
+        }
+
 class PerformanceMetrics:
-    def __init__(self, max_samples=30):
-        self.frame_times = deque(maxlen=max_samples)
-        self.processing_times = deque(maxlen=max_samples)
-        self.last_frame_time = None
-        self.processing_start_time = None
+    """Per-stream frame rate, latency and per-stage timing.
+
+    Headline numbers (FPS, processing time, latency, encode time and size)
+    are exponential moving averages updated in O(1). With profiling enabled
+    (Config.PROFILE_STAGES) every named stage, plus processing and latency,
+    also records into a windowed log histogram for percentiles; disabled,
+    clock() returns 0 and record() returns immediately.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, window: Optional[float] = None):
+        self.enabled = Config.PROFILE_STAGES if enabled is None else enabled
+        self.window = window or Config.PROFILE_WINDOW
+        self.histograms: Dict[str, WindowedHistogram] = {}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def clock(self) -> int:
+        """Stage start time for record(); 0 when profiling is disabled"""
+        return time.perf_counter_ns() if self.enabled else 0
+
+    def record(self, stage: str, start_ns: int):
+        """Record a stage that started at clock()"""
+        if self.enabled and start_ns:
+            self.record_duration(stage, time.perf_counter_ns() - start_ns)
+
+    def record_duration(self, stage: str, duration_ns: int):
+        if not self.enabled:
+            return
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(stage, WindowedHistogram(self.window))
+        histogram.record(duration_ns // 1000)
 
     def start_processing(self):
         """Mark the start of frame processing"""
-        self.processing_start_time = time.time()
+        self.processing_start_time = time.perf_counter()
         if self.last_frame_time:
-            frame_interval = self.processing_start_time - self.last_frame_time
-            self.frame_times.append(frame_interval)
+            self.avg_frame_interval = self._ema(self.avg_frame_interval,
+                                                self.processing_start_time - self.last_frame_time)
         self.last_frame_time = self.processing_start_time
+        self.frame_count += 1
 
     def end_processing(self):
         """Mark the end of frame processing"""
         if self.processing_start_time:
-            processing_time = (time.time() - self.processing_start_time) * 1000  # Convert to ms
-            self.processing_times.append(processing_time)
+            elapsed = time.perf_counter() - self.processing_start_time
+            self.avg_processing_time = self._ema(self.avg_processing_time, elapsed * 1000)
+            self.record_duration('process', int(elapsed * 1e9))
             self.processing_start_time = None
 
+    def add_latency(self, latency_ms):
+        """Record the capture-to-result latency of a frame"""
+        self.avg_latency = self._ema(self.avg_latency, latency_ms)
+        self.record_duration('latency', int(latency_ms * 1e6))
+
+    def add_encode(self, size_bytes, encode_ms):
+        """Record the size and time of an encoded video frame"""
+        self.avg_frame_bytes = self._ema(self.avg_frame_bytes, size_bytes)
+        self.avg_encode_time = self._ema(self.avg_encode_time, encode_ms)
+        self.record_duration(ENCODE, int(encode_ms * 1e6))
+
+    @property
+    def fps(self) -> float:
+        return 1 / self.avg_frame_interval if self.avg_frame_interval else 0.0
+
+    def get_stage_metrics(self) -> Dict[str, Dict]:
+        """Percentile summary (ms) of every recorded stage"""
+        return {stage: histogram.summary() for stage, histogram in list(self.histograms.items())}
+
     def get_prf_metrics(self):
         """Get current performance metrics"""
         try:
-            if self.frame_times:
-                avg_frame_interval = mean(self.frame_times)
-                current_fps = 1 / avg_frame_interval if avg_frame_interval > 0 else 0
-            else:
-                current_fps = 0
-
-            avg_processing_time = mean(self.processing_times) if self.processing_times else 0
-
-            return {
-                'fps': round(current_fps, 1),
-                'processingTime': round(avg_processing_time, 1),
-                'frameCount': len(self.frame_times),
-                'avgFrameInterval': round(mean(self.frame_times) * 1000, 1) if self.frame_times else 0
+            metrics = {
+                'fps': round(self.fps, 1),
+                'processingTime': round(self.avg_processing_time or 0, 1),
+                'frameCount': self.frame_count,
+                'avgFrameInterval': round((self.avg_frame_interval or 0) * 1000, 1),
+                'latency': round(self.avg_latency or 0, 1),
+                'encodeTime': round(self.avg_encode_time or 0, 2),
+                'frameBytes': round(self.avg_frame_bytes or 0)
             }
+            if self.enabled:
+                metrics['stages'] = self.get_stage_metrics()
+            return metrics
         except Exception as e:
             logger.error(f"Error calculating performance metrics: {str(e)}")
             return {
                 'fps': 0,
                 'processingTime': 0,
                 'frameCount': 0,
-                'avgFrameInterval': 0
+                'avgFrameInterval': 0,
+                'latency': 0,
+                'encodeTime': 0,
+                'frameBytes': 0
             }
 
     def reset(self):
         """Reset all metrics"""
-        self.frame_times.clear()
-        self.processing_times.clear()
+        self.avg_frame_interval = None
+        self.avg_processing_time = None
+        self.avg_latency = None
+        self.avg_encode_time = None
+        self.avg_frame_bytes = None
+        self.frame_count = 0
         self.last_frame_time = None
-        self.processing_start_time = None 
\ No newline at end of file
+        self.processing_start_time = None
+        with self._lock:
+            self.histograms = {}
+
+    @staticmethod
+    def _ema(average, value):
+        return value if average is None else average + EMA_ALPHA * (value - average)
+
+def rss_bytes() -> Optional[int]:
+    """Current resident set size from /proc (None where unavailable)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def memory_usage() -> Dict[str, int]:
+    """Resident, proportional and private memory of this process in bytes (Linux).
+
+    RSS counts pages shared with a pre-fork master or sibling workers in
+    full; PSS splits them between the processes sharing them, and private
+    memory is what the process alone holds.
+    """
+    usage = {}
+    try:
+        with open('/proc/self/smaps_rollup') as smaps:
+            fields = dict(line.split(':', 1) for line in smaps if ':' in line and not line.startswith(' '))
+        kilobytes = {name: int(fields[name].split()[0]) for name in
+                     ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty') if name in fields}
+        usage = {
+            'rss': kilobytes['Rss'] * 1024,
+            'pss': kilobytes['Pss'] * 1024,
+            'private': (kilobytes['Private_Clean'] + kilobytes['Private_Dirty']) * 1024
+        }
+    except (OSError, ValueError, KeyError):
+        rss = rss_bytes()
+        if rss is not None:
+            usage['rss'] = rss
+    return usage
+
+# Work shared by all streams (alert and trend persistence)
+service_performance = PerformanceMetrics()
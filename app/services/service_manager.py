@@ -40,10 +40,10 @@ class ServiceManager:
             logger.info("Initializing services...")
             
             # Initialize services in order of dependency
-            self.alert_service = AlertService()
-            self.metric_service = MetricsService()
-            self.trend_service = TrendService()
             self.socket_service = SocketService()
+            self.alert_service = AlertService(self.socket_service)
+            self.metric_service = MetricsService(self.alert_service)
+            self.trend_service = TrendService()
             
             # Initialize socket service with app
             self.socket_service.init_app(app)
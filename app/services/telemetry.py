@@ -0,0 +1,182 @@
+# app/services/telemetry.py
+"""
+Process-wide telemetry, exported in the Prometheus text format by /metrics.
+
+Services count and time their own work here (Firestore and wearable API
+calls, socket emits, cache lookups, alert transitions). State that already
+lives elsewhere (stream stats, queue depths, per-stage histograms) is read
+at scrape time by collectors, so the hot paths pay nothing extra for it.
+Histograms are LogHistograms (see performance.py) exported with the fixed
+BUCKETS below; counts and sums are cumulative since process start.
+"""
+
+import os
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Optional, Tuple
+from app.services.performance import LogHistogram, PerformanceMetrics, service_performance, memory_usage
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'fatigue_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+COUNTER = 'counter'
+GAUGE = 'gauge'
+HISTOGRAM = 'histogram'
+
+# Histogram bucket bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Every exported metric: type and help text, in exposition order
+METRICS = {
+    'pipeline_stage_seconds': (HISTOGRAM, "Frame pipeline stage duration (needs PROFILE_STAGES)"),
+    'stream_frames_total': (COUNTER, "Frames processed per camera stream"),
+    'stream_dropped_frames_total': (COUNTER, "Frames dropped because the stream's worker was busy"),
+    'stream_pending_frames': (GAUGE, "Frames waiting for the stream's worker"),
+    'stream_fps': (GAUGE, "Processed frames per second"),
+    'stream_viewers': (GAUGE, "MJPEG viewers attached to the stream"),
+    'stream_first_frame_seconds': (GAUGE, "Capture-to-result latency of the stream's first frame"),
+    'queue_depth': (GAUGE, "Items waiting in an internal queue"),
+    'socket_connections': (GAUGE, "Connected Socket.IO clients"),
+    'socket_emits_total': (COUNTER, "Socket.IO emits per event (one per room and encoding)"),
+    'socket_dropped_messages_total': (COUNTER, "Outbound socket messages dropped on a full queue"),
+    'firestore_request_seconds': (HISTOGRAM, "Firestore request duration"),
+    'firestore_errors_total': (COUNTER, "Failed Firestore requests"),
+    'wearable_request_seconds': (HISTOGRAM, "Wearable API request duration"),
+    'wearable_errors_total': (COUNTER, "Failed wearable API requests"),
+    'cache_requests_total': (COUNTER, "Cache lookups by result (hit or miss)"),
+    'alert_transitions_total': (COUNTER, "Alert level transitions"),
+    'process_memory_bytes': (GAUGE, "Memory of this worker process (rss, pss, private)"),
+    'warmup_seconds': (GAUGE, "Duration of each warm-up step of this worker"),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _key(labels: Optional[Dict]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in (labels or {}).items()))
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = labels + ((extra,) if extra else ())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def stage_samples(stream_id: str, performance: PerformanceMetrics):
+    """Cumulative stage histograms of one PerformanceMetrics, as collector samples"""
+    for stage, histogram in list(performance.histograms.items()):
+        yield 'pipeline_stage_seconds', {'stream': stream_id, 'stage': stage}, histogram.cumulative()
+
+class Telemetry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.histograms: Dict[Tuple[str, Labels], LogHistogram] = {}
+        # name -> callable yielding (metric, labels, value or LogHistogram) at scrape time
+        self.collectors: Dict[str, Callable[[], Iterable]] = {}
+
+    def inc(self, name: str, labels: Optional[Dict] = None, amount: float = 1):
+        key = (name, _key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, seconds: float, labels: Optional[Dict] = None):
+        key = (name, _key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LogHistogram()
+            histogram.record(seconds * 1e6)
+
+    @contextmanager
+    def timed(self, name: str, labels: Optional[Dict] = None, errors: Optional[str] = None):
+        """Observe the duration of the block; count it under `errors` if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            if errors:
+                self.inc(errors, labels)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def firestore(self, collection: str, operation: str):
+        """Time a Firestore request (add, commit, query or aggregate)"""
+        return self.timed('firestore_request_seconds', {'collection': collection, 'operation': operation},
+                          errors='firestore_errors_total')
+
+    def wearable(self, endpoint: str):
+        """Time a wearable API request"""
+        return self.timed('wearable_request_seconds', {'endpoint': endpoint}, errors='wearable_errors_total')
+
+    def cache(self, cache: str, hit: bool):
+        self.inc('cache_requests_total', {'cache': cache, 'result': 'hit' if hit else 'miss'})
+
+    def register(self, name: str, collector: Callable[[], Iterable]):
+        """Add (or replace) a scrape-time collector"""
+        self.collectors[name] = collector
+
+    def unregister(self, name: str):
+        self.collectors.pop(name, None)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        samples: Dict[str, list] = {name: [] for name in METRICS}
+        with self._lock:
+            for (name, labels), value in self.counters.items():
+                samples[name].append((labels, value))
+            for (name, labels), histogram in self.histograms.items():
+                merged = LogHistogram()
+                merged.merge(histogram)
+                samples[name].append((labels, merged))
+
+        for collector_name, collector in list(self.collectors.items()):
+            try:
+                for name, labels, value in collector():
+                    samples[name].append((_key(labels), value))
+            except Exception as e:
+                logger.error(f"Error collecting {collector_name} telemetry: {str(e)}")
+
+        lines = []
+        for name, (metric_type, help_text) in METRICS.items():
+            if not samples[name]:
+                continue
+            full_name = PREFIX + name
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            for labels, value in samples[name]:
+                if metric_type == HISTOGRAM:
+                    lines.extend(self._histogram_lines(full_name, labels, value))
+                else:
+                    lines.append(f"{full_name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _histogram_lines(name: str, labels: Labels, histogram: LogHistogram):
+        counts = histogram.cumulative_counts([int(bound * 1e6) for bound in BUCKETS])
+        for bound, count in zip(BUCKETS, counts):
+            yield f"{name}_bucket{_format_labels(labels, ('le', f'{bound:g}'))} {count}"
+        yield f"{name}_bucket{_format_labels(labels, ('le', '+Inf'))} {histogram.total}"
+        yield f"{name}_sum{_format_labels(labels)} {_format_value(histogram.sum / 1e6)}"
+        yield f"{name}_count{_format_labels(labels)} {histogram.total}"
+
+telemetry = Telemetry()
+
+def _process_samples():
+    pid = os.getpid()  # Each worker serves its own /metrics
+    for kind, value in memory_usage().items():
+        yield 'process_memory_bytes', {'pid': pid, 'kind': kind}, value
+
+# Persistence stages shared by all streams (alert and trend writes)
+telemetry.register('services', lambda: stage_samples('services', service_performance))
+telemetry.register('process', _process_samples)
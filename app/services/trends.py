@@ -1,15 +1,35 @@
+import threading
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from app.utils.firebase_client import FirebaseClient
+from app.models.metrics import MetricsRecord
+from app.core.async_runtime import run_blocking
+from app.services.performance import service_performance, PERSIST
+from app.services.telemetry import telemetry
 import logging
 
 logger = logging.getLogger(__name__)
 
+TREND_WINDOW = timedelta(hours=1)  # Span of the live trend charts
+FIRESTORE_BATCH_LIMIT = 500  # Writes per Firestore batch commit
+EVICT_INTERVAL = timedelta(minutes=1)  # Between sweeps dropping the windows of idle users
+WINDOW_TTL = timedelta(minutes=1)  # Age at which a cached window is reloaded, to pick up other workers' writes
+
+def _trim(window: deque, now: datetime):
+    """Drop points older than the trend window"""
+    cutoff = now - TREND_WINDOW
+    while window and window[0][0] < cutoff:
+        window.popleft()
+
 class TrendService:
     def __init__(self):
         self.db = None  # Initialize later when Firebase is ready
         self.pending_data = []
-        self.cache = {}
+        self.cache = {}  # user_email -> deque of (timestamp, chart point) within TREND_WINDOW
+        self._loaded_at = {}  # user_email -> when the window was last loaded from Firestore
+        self._cache_lock = threading.Lock()
+        self._last_sweep = datetime.utcnow()
     
     @property
     def _db(self):
@@ -17,16 +37,44 @@ class TrendService:
             self.db = FirebaseClient().get_db()
         return self.db
 
-    def save_metrics_snapshot(self, user_email: str, metrics: Dict):
-        """Save current metrics to Firebase"""
+    def save_metrics_snapshot(self, user_email: str, metrics: MetricsRecord) -> Optional[Dict]:
+        """Save current metrics to Firebase and return the new chart point"""
+        points = self.save_metrics_snapshots([(user_email, metrics, None)])
+        return points[0][1] if points else None
+
+    def save_metrics_snapshots(self, snapshots: List[Tuple[str, MetricsRecord, Optional[datetime]]]) -> List[Tuple[str, Dict]]:
+        """Save (user, metrics, time taken) snapshots in batched commits; returns (user, chart point) per snapshot"""
         try:
-            trends_ref = self._db.collection('trends').document(user_email)
-            trends_ref.collection('metrics').add({
-                **metrics,
-                'timestamp': datetime.utcnow()
-            })
+            documents = [
+                (user_email, {**metrics.to_dict(), 'timestamp': timestamp or datetime.utcnow()})
+                for user_email, metrics, timestamp in snapshots
+            ]
+            for start in range(0, len(documents), FIRESTORE_BATCH_LIMIT):
+                batch = self._db.batch()
+                for user_email, snapshot in documents[start:start + FIRESTORE_BATCH_LIMIT]:
+                    metrics_ref = self._db.collection('trends').document(user_email).collection('metrics')
+                    batch.set(metrics_ref.document(), snapshot)
+                started = service_performance.clock()
+                with telemetry.firestore('trends', 'commit'):
+                    run_blocking(batch.commit)
+                service_performance.record(PERSIST, started)
+
+            points = []
+            with self._cache_lock:
+                for user_email, snapshot in documents:
+                    point = self._format_metric(snapshot)
+                    # Only extend cached windows (warm or loading); a cold window is
+                    # loaded in full from Firestore on the next get_trend_data
+                    window = self.cache.get(user_email)
+                    if window is not None:
+                        window.append((snapshot['timestamp'], point))
+                        _trim(window, snapshot['timestamp'])
+                    points.append((user_email, point))
+                self._evict_idle(datetime.utcnow())
+            return points
         except Exception as e:
-            logger.error(f"Error saving metrics snapshot: {str(e)}")
+            logger.error(f"Error saving {len(snapshots)} metrics snapshots: {str(e)}")
+            return []
 
     def get_metrics_history(self, user_email: str, hours: int = 24) -> List[Dict]:
         """Get historical metrics for specified duration"""
@@ -35,30 +83,84 @@ class TrendService:
             trends_ref = self._db.collection('trends').document(user_email)
             
             # Query metrics after start_time
-            docs = trends_ref.collection('metrics')\
+            query = trends_ref.collection('metrics')\
                 .where('timestamp', '>=', start_time)\
-                .order_by('timestamp')\
-                .stream()
+                .order_by('timestamp')
 
-            return [self._format_metric(doc.to_dict()) for doc in docs]
+            with telemetry.firestore('trends', 'query'):
+                docs = run_blocking(lambda: [doc.to_dict() for doc in query.stream()])
+            return [self._format_metric(doc) for doc in docs]
         except Exception as e:
             logger.error(f"Error getting metrics history: {str(e)}")
             return []
 
+    def _get_window_points(self, user_email: str) -> List[Dict]:
+        """Get chart points for the trend window, querying Firestore only on a cold or expired cache"""
+        with self._cache_lock:
+            window = self.cache.get(user_email)
+            loaded_at = self._loaded_at.get(user_email)
+            fresh = loaded_at is not None and datetime.utcnow() - loaded_at < WINDOW_TTL
+            telemetry.cache('trend_window', fresh)
+            if fresh:
+                _trim(window, datetime.utcnow())
+                return [point for _, point in window]
+            if window is None:
+                # Placeholder so snapshots saved while the query runs are kept
+                self.cache[user_email] = deque()
+
+        loaded_at = datetime.utcnow()
+        start_time = loaded_at - TREND_WINDOW
+        trends_ref = self._db.collection('trends').document(user_email)
+        query = trends_ref.collection('metrics')\
+            .where('timestamp', '>=', start_time)\
+            .order_by('timestamp')
+        with telemetry.firestore('trends', 'query'):
+            docs = run_blocking(lambda: [doc.to_dict() for doc in query.stream()])
+
+        points = {}
+        for doc in docs:
+            # Firestore returns aware UTC datetimes; the window compares naive UTC
+            timestamp = doc['timestamp'].replace(tzinfo=None)
+            points[timestamp] = self._format_metric(doc)
+
+        with self._cache_lock:
+            # Keep points appended to the window while the query ran; a
+            # snapshot both committed and appended has the same timestamp
+            for timestamp, point in self.cache.get(user_email, ()):
+                points.setdefault(timestamp, point)
+            window = deque(sorted(points.items(), key=lambda item: item[0]))
+            _trim(window, datetime.utcnow())
+            self.cache[user_email] = window
+            self._loaded_at[user_email] = loaded_at
+            return [point for _, point in window]
+
+    def _evict_idle(self, now: datetime):
+        """Drop the windows of users with no point inside the trend window (cache lock held)"""
+        if now - self._last_sweep < EVICT_INTERVAL:
+            return
+        self._last_sweep = now
+        for user_email, window in list(self.cache.items()):
+            _trim(window, now)
+            if not window:
+                del self.cache[user_email]
+                self._loaded_at.pop(user_email, None)
+
     def _format_metric(self, metric: Dict) -> Dict:
         """Format metric for chart display"""
+        record = MetricsRecord.from_dict(metric)
         return {
             'timestamp': metric['timestamp'].strftime('%H:%M:%S'),
-            'alertness': float(metric.get('alertness', 0)),
-            'heartRate': int(metric.get('heartRate', 0)),
-            'blinkRate': float(metric.get('blinkRate', '0').split('/')[0]),
-            'eyeClosure': float(metric.get('eyeClosure', '0').replace('s', '')),
+            'alertness': record.alertness,
+            'heartRate': record.heart_rate or 0,
+            'blinkRate': record.blink_rate,
+            'eyeClosure': record.eye_closure,
+            'perclos': record.perclos,
         }
 
     def get_trend_data(self, user_email: str) -> Dict:
         """Get formatted trend data for charts"""
         try:
-            metrics = self.get_metrics_history(user_email, hours=1)  # Last hour
+            metrics = self._get_window_points(user_email)  # Last hour
             
             return {
                 'labels': [m['timestamp'] for m in metrics],
@@ -66,7 +168,8 @@ class TrendService:
                     'alertness': [m['alertness'] for m in metrics],
                     'heartRate': [m['heartRate'] for m in metrics],
                     'blinkRate': [m['blinkRate'] for m in metrics],
-                    'eyeClosure': [m['eyeClosure'] for m in metrics]
+                    'eyeClosure': [m['eyeClosure'] for m in metrics],
+                    'perclos': [m['perclos'] for m in metrics]
                 }
             }
         except Exception as e:
@@ -249,4 +352,6 @@ class TrendService:
 
     def clear_cache(self):
         """Clear cached trend data"""
-        self.cache.clear()
\ No newline at end of file
+        with self._cache_lock:
+            self.cache.clear()
+            self._loaded_at.clear()
\ No newline at end of file
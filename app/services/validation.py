@@ -1,63 +1,156 @@
-from typing import Dict, Union, Optional
 import re
+from dataclasses import dataclass, replace
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app.models.metrics import MetricsRecord
+
+@dataclass(frozen=True)
+class NumericRule:
+    """Range rule for a numeric metric; out-of-range values become the fallback"""
+    key: str                         # Stored / display key
+    minimum: float
+    maximum: float
+    fallback: Optional[float]        # None means "missing"
+    pattern: re.Pattern              # Accepted display format for string input
+
+    def check(self, value) -> bool:
+        return value is not None and self.minimum <= value <= self.maximum
+
+@dataclass(frozen=True)
+class ChoiceRule:
+    """Allowed values for a categorical metric"""
+    key: str
+    choices: Tuple
+    fallback: object
+
+    def check(self, value) -> bool:
+        return value in self.choices
+
+# Schema covering every MetricsRecord field, with patterns compiled once at import.
+# Bounds are plausibility limits (sensor or parsing errors), not normal ranges:
+# abnormal but real readings must survive so alerts and history can see them.
+NUMERIC_RULES = {
+    'heart_rate': NumericRule('heartRate', 30, 200, None, re.compile(r'^(\d+(?:\.\d+)?)$')),  # bpm
+    'alertness': NumericRule('alertness', 0, 100, 100.0, re.compile(r'^(\d+(?:\.\d+)?)%?$')),
+    'blink_rate': NumericRule('blinkRate', 0, 120, 0.0, re.compile(r'^(\d+(?:\.\d+)?)/min$')),
+    'eye_closure': NumericRule('eyeClosure', 0, 60.0, 0.0, re.compile(r'^(\d+(?:\.\d+)?)s$')),  # Seconds
+    'perclos': NumericRule('perclos', 0, 1.0, 0.0, re.compile(r'^(\d+(?:\.\d+)?)$')),
+    'fatigue_score': NumericRule('fatigueScore', 0, 1.0, None, re.compile(r'^(\d+(?:\.\d+)?)$')),
+    'yawn_count': NumericRule('yawnCount', 0, 60, 0.0, re.compile(r'^(\d+(?:\.\d+)?)/min$')),
+    'yawn_duration': NumericRule('yawnDuration', 0, 30, 0.0, re.compile(r'^(\d+(?:\.\d+)?)s?$')),
+    'avg_heart_rate': NumericRule('avgHeartRate', 30, 200, None, re.compile(r'^(\d+(?:\.\d+)?)$')),
+    'avg_alertness': NumericRule('avgAlertness', 0, 100, None, re.compile(r'^(\d+(?:\.\d+)?)%?$')),
+}
+
+CHOICE_RULES = {
+    'head_position': ChoiceRule('headPosition', ('Centered', 'Left', 'Right', 'Down', 'Up', 'Far Left', 'Far Right'), 'Centered'),
+    'eye_state': ChoiceRule('eyeState', ('open', 'closed'), 'open'),
+    'is_detecting': ChoiceRule('isDetecting', (True, False), True),
+}
 
 class MetricsValidator:
     @staticmethod
-    def validate_heart_rate(value: str) -> bool:
-        try:
-            hr = int(value)
-            return 30 <= hr <= 200  # Normal human heart rate range
-        except ValueError:
-            return False
+    def validate_heart_rate(value: Optional[float]) -> bool:
+        return NUMERIC_RULES['heart_rate'].check(value)
 
     @staticmethod
-    def validate_blink_rate(value: str) -> bool:
-        pattern = r'^\d+/min$'
-        if not re.match(pattern, value):
-            return False
-        rate = int(value.split('/')[0])
-        return 5 <= rate <= 30  # Normal blink rate range
+    def validate_blink_rate(value: float) -> bool:
+        return NUMERIC_RULES['blink_rate'].check(value)
 
     @staticmethod
-    def validate_eye_closure(value: str) -> bool:
-        pattern = r'^\d+\.\d+s$'
-        if not re.match(pattern, value):
-            return False
-        duration = float(value.replace('s', ''))
-        return 0 <= duration <= 1.0  # Normal eye closure range
+    def validate_eye_closure(value: float) -> bool:
+        return NUMERIC_RULES['eye_closure'].check(value)
 
     @staticmethod
     def validate_head_position(value: str) -> bool:
-        valid_positions = ['Centered', 'Left', 'Right', 'Down', 'Up']
-        return value in valid_positions
+        return CHOICE_RULES['head_position'].check(value)
 
     @staticmethod
-    def sanitize_metrics(metrics: Dict) -> Dict:
+    def sanitize_metrics(metrics: MetricsRecord) -> MetricsRecord:
         """Sanitize and validate all metrics"""
-        sanitized = {}
-        
-        # Heart Rate
-        if 'heartRate' in metrics and MetricsValidator.validate_heart_rate(metrics['heartRate']):
-            sanitized['heartRate'] = metrics['heartRate']
-        else:
-            sanitized['heartRate'] = '0'
-
-        # Blink Rate
-        if 'blinkRate' in metrics and MetricsValidator.validate_blink_rate(metrics['blinkRate']):
-            sanitized['blinkRate'] = metrics['blinkRate']
-        else:
-            sanitized['blinkRate'] = '0/min'
-
-        # Eye Closure
-        if 'eyeClosure' in metrics and MetricsValidator.validate_eye_closure(metrics['eyeClosure']):
-            sanitized['eyeClosure'] = metrics['eyeClosure']
-        else:
-            sanitized['eyeClosure'] = '0.0s'
-
-        # Head Position
-        if 'headPosition' in metrics and MetricsValidator.validate_head_position(metrics['headPosition']):
-            sanitized['headPosition'] = metrics['headPosition']
-        else:
-            sanitized['headPosition'] = 'Centered'
-
-        return sanitized 
\ No newline at end of file
+        sanitized = replace(metrics)
+        for field, rule in NUMERIC_RULES.items():
+            if not rule.check(getattr(metrics, field)):
+                setattr(sanitized, field, rule.fallback)
+        for field, rule in CHOICE_RULES.items():
+            if not rule.check(getattr(metrics, field)):
+                setattr(sanitized, field, rule.fallback)
+        return sanitized
+
+    @staticmethod
+    def parse_document(document: Dict) -> MetricsRecord:
+        """Strictly parse an imported document (numbers or display strings) in one pass"""
+        record = MetricsRecord(heart_rate=None)
+        for field, rule in NUMERIC_RULES.items():
+            value = document.get(rule.key)
+            if isinstance(value, str):
+                match = rule.pattern.match(value.strip())
+                value = float(match.group(1)) if match else None
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                value = None
+            setattr(record, field, value if rule.check(value) else rule.fallback)
+        for field, rule in CHOICE_RULES.items():
+            value = document.get(rule.key, rule.fallback)
+            setattr(record, field, value if rule.check(value) else rule.fallback)
+        if 'timestamp' in document:
+            record.timestamp = document['timestamp']
+        return record
+
+    @staticmethod
+    def sanitize_columns(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """Validate a columnar block (field name -> array) in one vectorized pass.
+
+        Numeric columns are float arrays with NaN for missing values; invalid
+        entries are replaced by the field's fallback (NaN when it is None).
+        Columns without a rule are passed through unchanged.
+        """
+        sanitized = dict(columns)
+        for field, rule in NUMERIC_RULES.items():
+            if field not in columns:
+                continue
+            values = np.asarray(columns[field], dtype=np.float64)
+            # NaN fails both comparisons, so missing values take the fallback too
+            valid = (values >= rule.minimum) & (values <= rule.maximum)
+            fallback = np.nan if rule.fallback is None else rule.fallback
+            sanitized[field] = np.where(valid, values, fallback)
+        for field, rule in CHOICE_RULES.items():
+            if field not in columns:
+                continue
+            values = np.asarray(columns[field], dtype=object)
+            valid = np.isin(values, np.array(rule.choices, dtype=object))
+            sanitized[field] = np.where(valid, values, rule.fallback)
+        return sanitized
+
+    @staticmethod
+    def to_columns(records: Iterable[MetricsRecord]) -> Dict[str, np.ndarray]:
+        """Convert records to the columnar block used by sanitize_columns"""
+        records = list(records)
+        columns = {}
+        for field in NUMERIC_RULES:
+            columns[field] = np.fromiter(
+                (np.nan if (value := getattr(record, field)) is None else value for record in records),
+                dtype=np.float64, count=len(records)
+            )
+        for field in CHOICE_RULES:
+            columns[field] = np.array([getattr(record, field) for record in records], dtype=object)
+        return columns
+
+    @staticmethod
+    def sanitize_batch(records: List[MetricsRecord]) -> List[MetricsRecord]:
+        """Validate many snapshots at once (bulk history imports and replays)"""
+        if not records:
+            return []
+        columns = MetricsValidator.sanitize_columns(MetricsValidator.to_columns(records))
+
+        # Rebuild records row-wise from the sanitized columns (NaN -> missing)
+        numeric_fields = list(NUMERIC_RULES)
+        choice_fields = list(CHOICE_RULES)
+        numeric_rows = zip(*(columns[field].tolist() for field in numeric_fields))
+        choice_rows = zip(*(columns[field].tolist() for field in choice_fields))
+
+        sanitized = []
+        for record, numeric, choice in zip(records, numeric_rows, choice_rows):
+            values = {field: (None if value != value else value) for field, value in zip(numeric_fields, numeric)}
+            values.update(zip(choice_fields, choice))
+            sanitized.append(MetricsRecord(**values, timestamp=record.timestamp))
+        return sanitized
@@ -1,24 +1,55 @@
 import json
-from flask import request, session, current_app
-from flask.ctx import RequestContext
-from flask_socketio import SocketIO, emit
+import queue
+import itertools
+import threading
+from flask import request, session
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from datetime import datetime
 import logging
 
 from app.config import Config
+from app.services import payloads
+from app.services.telemetry import telemetry
+from app.models.metrics import MetricsRecord
 from app.services.metrics import get_real_metrics
 from app.services.mock_data import get_mock_metrics
-from app.modules.data_collection import get_current_performance
 
 logger = logging.getLogger(__name__)
 
+# Alert delivery order (lower first); alerts are never coalesced or dropped
+ALERT_PRIORITIES = {
+    'danger': 0,
+    'warning': 1,
+    'alert_cleared': 2
+}
+
+# Per-event encoders for clients that negotiated a binary encoding
+PAYLOAD_ENCODERS = {
+    'metrics_update': payloads.encode_metrics,
+    'trends_update': payloads.encode_trends,
+    'trends_append': payloads.encode_trend_point
+}
+
 class SocketService:
     def __init__(self):
-        self.socketio = SocketIO()
+        self.socketio = SocketIO(async_mode=Config.ASYNC_MODE, transports=Config.SOCKETIO_TRANSPORTS,
+                                 message_queue=Config.SOCKETIO_MESSAGE_QUEUE)
         self.initialized = False
         self.active_connections = set()
+        self.client_encodings = {}  # sid -> negotiated payload encoding
         self.trend_service = None
         self.app = None
+        # Thread-safe outbound queue drained by a Socket.IO background task,
+        # so producers (e.g. the frame loop) never need a Flask context
+        self.outbound = queue.Queue(maxsize=Config.SOCKET_OUTBOUND_QUEUE_SIZE)
+        self.dropped_messages = 0
+        self.dropped_lock = threading.Lock()  # Producers on several threads count drops
+        self.dispatcher = None
+        # Alerts get their own queue and dispatcher so they never wait behind
+        # metrics encoding or trend persistence
+        self.alert_outbound = queue.PriorityQueue()
+        self.alert_sequence = itertools.count()  # FIFO within a priority
+        self.alert_dispatcher = None
 
     def init_app(self, app):
         if self.initialized:
@@ -31,22 +62,46 @@ class SocketService:
         self.socketio.init_app(app, cors_allowed_origins="*")
         self.setup_handlers()
         self.initialized = True
+        self.dispatcher = self.socketio.start_background_task(self._drain_outbound)
+        self.alert_dispatcher = self.socketio.start_background_task(self._drain_alerts)
+        telemetry.register('sockets', self.collect)
 
     def setup_handlers(self):
         @self.socketio.on('connect')
         def handle_connect():
             logger.info('Client connected')
             self.active_connections.add(request.sid)
+            self.client_encodings[request.sid] = payloads.JSON
+            # Rooms are per encoding so each payload is encoded once per room
+            join_room(self._room(None, payloads.JSON))
+            user_email = session.get('user_info', {}).get('email')
+            if user_email:
+                join_room(self._room(user_email, payloads.JSON))
             
         @self.socketio.on('disconnect')
         def handle_disconnect():
             logger.info('Client disconnected')
             self.active_connections.discard(request.sid)
+            self.client_encodings.pop(request.sid, None)
+
+        @self.socketio.on('set_encoding')
+        def handle_set_encoding(data):
+            """Negotiate the payload encoding (json or msgpack) for this client"""
+            requested = (data or {}).get('encoding', payloads.JSON)
+            encoding = payloads.negotiate(requested)
+            current = self.client_encodings.get(request.sid, payloads.JSON)
+            if encoding != current:
+                user_email = session.get('user_info', {}).get('email')
+                for user in [None, user_email] if user_email else [None]:
+                    leave_room(self._room(user, current))
+                    join_room(self._room(user, encoding))
+                self.client_encodings[request.sid] = encoding
+            emit('encoding_ack', {'encoding': encoding})
             
         @self.socketio.on('ping')
         def handle_ping():
             """Handle heartbeat ping from client"""
-            self.socketio.emit('pong')
+            emit('pong')
             
         @self.socketio.on('request_metrics')
         def handle_metrics_request():
@@ -58,14 +113,30 @@ class SocketService:
                     return
                 
                 metrics = ServiceManager.get_instance().metrics.get_metrics()
-                if 'error' in metrics:
+                if isinstance(metrics, dict):
                     logger.error(f"Error getting metrics: {metrics['error']}")
-                    self.socketio.emit('metrics_error', {'message': metrics['error']})
+                    emit('metrics_error', {'message': metrics['error']})
                 else:
-                    self.socketio.emit('metrics_update', metrics)
+                    emit('metrics_update', self._encode_for_client('metrics_update', metrics))
             except Exception as e:
                 logger.error(f"Error in metrics request: {str(e)}")
-                self.socketio.emit('metrics_error', {'message': 'Internal server error'})
+                emit('metrics_error', {'message': 'Internal server error'})
+
+        @self.socketio.on('subscribe_trends')
+        def handle_trends_subscribe():
+            """Send one full trend snapshot; new points follow as trends_append"""
+            try:
+                user_email = session.get('user_info', {}).get('email')
+                if not user_email:
+                    emit('trends_error', {'message': 'User not authenticated'})
+                    return
+
+                join_room(self._room(user_email, self.client_encodings.get(request.sid, payloads.JSON)))
+                trend_data = self.trend_service.get_trend_data(user_email)
+                emit('trends_update', self._encode_for_client('trends_update', trend_data))
+            except Exception as e:
+                logger.error(f"Error in trends subscription: {str(e)}")
+                emit('trends_error', {'message': 'Error fetching trends'})
 
         @self.socketio.on('request_trends')
         def handle_trends_request():
@@ -76,14 +147,54 @@ class SocketService:
                     return
 
                 trend_data = self.trend_service.get_trend_data(user_email)
-                emit('trends_update', trend_data)
+                emit('trends_update', self._encode_for_client('trends_update', trend_data))
             except Exception as e:
                 logger.error(f"Error in trends request: {str(e)}")
                 emit('trends_error', {'message': 'Error fetching trends'})
 
+    @staticmethod
+    def _room(user_email, encoding):
+        """Room name for a user's clients (or all clients) using an encoding"""
+        return f"{user_email or 'all'}:{encoding}"
+
+    def _encode_for_client(self, event, payload):
+        """Encode a payload for the client of the current socket event"""
+        encoding = self.client_encodings.get(request.sid, payloads.JSON)
+        encoder = PAYLOAD_ENCODERS.get(event)
+        return encoder(payload, encoding) if encoder else payload
+
+    def _emit_encoded(self, event, payload, user_email=None, stream_id=None):
+        """Emit to a user's rooms (or everyone), encoding once per negotiated encoding"""
+        encoder = PAYLOAD_ENCODERS.get(event)
+        # Events without an encoder still go to every encoding's room, unchanged
+        for encoding in self._room_encodings():
+            if not encoder:
+                data = payload
+            elif stream_id:
+                data = encoder(payload, encoding, stream_id=stream_id)
+            else:
+                data = encoder(payload, encoding)
+            self.socketio.emit(event, data, to=self._room(user_email, encoding))
+            telemetry.inc('socket_emits_total', {'event': event})
+
+    def _room_encodings(self):
+        """Encodings to emit in: every supported one when clients may sit on other workers"""
+        if Config.SOCKETIO_MESSAGE_QUEUE:
+            return payloads.supported_encodings()
+        # Snapshot: connect, set_encoding and disconnect change the dict on other greenlets
+        return set(list(self.client_encodings.values())) or {payloads.JSON}
+
+    def collect(self):
+        """Connection and queue telemetry samples, read at scrape time"""
+        yield 'socket_connections', None, len(self.active_connections)
+        yield 'socket_dropped_messages_total', None, self.dropped_messages
+        yield 'queue_depth', {'queue': 'socket_outbound'}, self.outbound.qsize()
+        yield 'queue_depth', {'queue': 'socket_alerts'}, self.alert_outbound.qsize()
+
     def cleanup(self):
         """Clean up socket connections and resources"""
         try:
+            telemetry.unregister('sockets')
             self.disconnect_all_clients()
             self.socketio = None
             self.initialized = False
@@ -112,25 +223,29 @@ class SocketService:
         """Get metrics and save for trends"""
         try:
             metrics = get_mock_metrics() if Config.USE_MOCK_DATA else get_real_metrics()
+            if isinstance(metrics, dict):
+                return metrics  # Error from the wearable path
             
             # Save metrics for trends
             if user_email:
                 self.trend_service.save_metrics_snapshot(user_email, metrics)
             
-            # Get real performance metrics from data collection
+            # Get real performance metrics from data collection (camera pipeline loads on first use)
+            from app.modules.data_collection import get_current_performance
             performance_metrics = get_current_performance()
             
-            # Add eye state, detection status, and real performance metrics
-            metrics.update({
-                'isDetecting': True,  # This should come from your face detection
-                'eyeState': 'open',   # This should come from your eye detection
+            # Format for display and add real performance metrics
+            payload = metrics.to_display()
+            payload.update({
                 'fps': performance_metrics['fps'],
                 'processingTime': performance_metrics['processingTime'],
                 'frameCount': performance_metrics['frameCount'],
-                'avgFrameInterval': performance_metrics['avgFrameInterval']
+                'avgFrameInterval': performance_metrics['avgFrameInterval'],
+                'encodeTime': performance_metrics['encodeTime'],
+                'frameBytes': performance_metrics['frameBytes']
             })
             
-            return metrics
+            return payload
         except Exception as e:
             logger.error(f"Error getting metrics: {str(e)}")
             return {
@@ -141,80 +256,98 @@ class SocketService:
                 'processingTime': 0
             } 
         
-    def update_metrics(self,new_metrics):
+    def update_metrics(self, metrics: MetricsRecord):
         """Update the latest metrics and emit to all clients"""
-        global latest_metrics
-        
-        # Convert metrics to frontend format
-        latest_metrics = {
-            "heartRate": "75",  # This could be from a different sensor
-            "alertness": f"{new_metrics['alertness']}",
-            "blinkRate": f"{new_metrics['blink_rate']}/min",
-            "eyeClosure": f"{new_metrics['eye_closure_duration']:.1f}s",
-            "headPosition": new_metrics['head_position'],
-            "alertStatus": "Warning" if new_metrics['alertness'] < 70 else "Normal"
-        }
-        
-        # Emit to all connected clients
-        self.socketio.emit('metrics_update', latest_metrics) 
+        self.publish('metrics_update', metrics)
 
-    def emit_metrics(self, metrics, user_info):
-        """Emit metrics to all connected clients"""
+    def emit_metrics(self, metrics: MetricsRecord, user_info, stream_id=None):
+        """Queue a camera stream's metrics for emission to the streaming user's clients"""
         try:
-            # Convert metrics to frontend format
-            formatted_metrics = {
-                "heartRate": "75",  # This could be from a different sensor
-                "alertness": f"{metrics.get('alertness', 0)}",
-                "blinkRate": f"{metrics.get('blink_rate', 0)}/min",
-                "yawnCount": f"{metrics.get('yawn_count', 0)}/min",
-                "eyeClosure": f"{metrics.get('eye_closure_duration', 0):.1f}s",
-                "headPosition": metrics.get('head_position', 'Unknown'),
-                "alertStatus": "Warning" if metrics.get('alertness', 100) < 70 else "Normal",
-                "isDetecting": metrics.get('isDetecting', True),  # Add detection status
-                "eyeState": metrics.get('eyeState', 'open')  # Add eye state
-            }
-
-            # Create minimal request environment if needed
-            if not current_app:
-                environ = {
-                    'wsgi.version': (1, 0),
-                    'wsgi.url_scheme': 'http',
-                    'REQUEST_METHOD': 'GET',
-                    'PATH_INFO': '/',
-                    'SERVER_NAME': 'localhost',
-                    'SERVER_PORT': '5000',
-                    'wsgi.input': None,
-                    'wsgi.errors': None,
-                    'wsgi.multithread': False,
-                    'wsgi.multiprocess': False,
-                    'wsgi.run_once': False
-                }
-
-                ctx = self.app.request_context(environ)
-                ctx.push()
-                try:
-                    # # Save metrics for trends if user is logged in
-                    # if hasattr(session, 'get'):
-                    #     user_email = session.get('user_info', {}).get('email')
-                    #     if user_email and self.trend_service:
-                    #         self.trend_service.save_metrics_snapshot(user_email, formatted_metrics)
-                    user_email = user_info.get('email')
-                    if user_email and self.trend_service:
-                        self.trend_service.save_metrics_snapshot(user_email, formatted_metrics)
-                    
-                    # Emit to all connected clients
-                    self.socketio.emit('metrics_update', formatted_metrics)
-                finally:
-                    ctx.pop()
-            else:
-                # We're already in a request context
-                if hasattr(session, 'get'):
-                    user_email = session.get('user_info', {}).get('email')
-                    if user_email and self.trend_service:
-                        self.trend_service.save_metrics_snapshot(user_email, formatted_metrics)
-                
-                # Emit to all connected clients
-                self.socketio.emit('metrics_update', formatted_metrics)
+            # Trend snapshots are keyed by the streaming user, not the session;
+            # display formatting happens per encoding in the dispatcher
+            user_email = (user_info or {}).get('email')
+            if not user_email:
+                return  # A stream without an owner is never broadcast to every client
+            self.publish('metrics_update', metrics, user_email=user_email, persist=True, stream_id=stream_id)
 
         except Exception as e:
-            logger.error(f"Error emitting metrics: {str(e)}")
\ No newline at end of file
+            logger.error(f"Error emitting metrics: {str(e)}")
+
+    def publish(self, event, payload, user_email=None, persist=False, stream_id=None):
+        """Queue an event for the background dispatcher; safe from any thread"""
+        # Persisted snapshots keep the time they were produced, not the time they are written
+        message = (event, payload, user_email, datetime.utcnow() if persist else None, stream_id)
+        try:
+            self.outbound.put_nowait(message)
+        except queue.Full:
+            # Drop the oldest message so the newest state always gets through
+            try:
+                self.outbound.get_nowait()
+                self._count_drop()
+            except queue.Empty:
+                pass
+            try:
+                self.outbound.put_nowait(message)
+            except queue.Full:
+                self._count_drop()
+
+    def _count_drop(self):
+        with self.dropped_lock:
+            self.dropped_messages += 1
+
+    def publish_alert(self, event, payload, user_email=None, priority=None):
+        """Queue an alert event for immediate delivery; safe from any thread"""
+        if priority is None:
+            priority = ALERT_PRIORITIES.get(payload.get('level', event), len(ALERT_PRIORITIES))
+        self.alert_outbound.put((priority, next(self.alert_sequence), event, payload, user_email))
+
+    def _drain_alerts(self):
+        """Background task that delivers alerts in priority order"""
+        while self.initialized:
+            try:
+                _, _, event, payload, user_email = self.alert_outbound.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            try:
+                if not self.socketio:
+                    break
+                self._emit_encoded(event, payload, user_email)
+            except Exception as e:
+                logger.error(f"Error dispatching {event}: {str(e)}")
+
+    def _drain_outbound(self):
+        """Background task that emits queued events and persists trend snapshots"""
+        while self.initialized:
+            try:
+                message = self.outbound.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            # Take whatever piled up while we were busy. Every trend snapshot is
+            # persisted (in one batch), but only the latest payload per
+            # (event, user, stream) is worth emitting
+            messages = [message]
+            while True:
+                try:
+                    messages.append(self.outbound.get_nowait())
+                except queue.Empty:
+                    break
+            if not self.socketio:
+                break
+
+            snapshots = [(user_email, payload, taken_at) for _, payload, user_email, taken_at, _ in messages
+                         if taken_at and user_email]
+            if snapshots and self.trend_service:
+                try:
+                    for user_email, point in self.trend_service.save_metrics_snapshots(snapshots):
+                        self._emit_encoded('trends_append', point, user_email)
+                except Exception as e:
+                    logger.error(f"Error persisting {len(snapshots)} trend snapshots: {str(e)}")
+
+            latest = {(event, user_email, stream_id): payload for event, payload, user_email, _, stream_id in messages}
+            for (event, user_email, stream_id), payload in latest.items():
+                try:
+                    # Without a user the event goes to every client
+                    self._emit_encoded(event, payload, user_email, stream_id)
+                except Exception as e:
+                    logger.error(f"Error dispatching {event}: {str(e)}")
@@ -404,32 +404,65 @@ function initializeCharts() {
 function updateCharts(trendData) {
     const { labels, datasets } = trendData;
     
-    // Update existing charts
-    chartConfigs.alertness.chart.data.labels = labels;
-    chartConfigs.alertness.chart.data.datasets[0].data = datasets.alertness;
-    chartConfigs.alertness.chart.update();
-    
-    chartConfigs.heartRate.chart.data.labels = labels;
-    chartConfigs.heartRate.chart.data.datasets[0].data = datasets.heartRate;
-    chartConfigs.heartRate.chart.update();
-
-    // Update blink rate bar chart
-    chartConfigs.blinkRate.chart.data.labels = labels;
-    chartConfigs.blinkRate.chart.data.datasets[0].data = datasets.blinkRate;
-    chartConfigs.blinkRate.chart.update();
+    // Update line and bar charts (skip any not rendered on this page)
+    ['alertness', 'heartRate', 'blinkRate'].forEach((name) => {
+        const chart = chartConfigs[name].chart;
+        if (!chart) {
+            return;
+        }
+        chart.data.labels = [...labels];
+        chart.data.datasets[0].data = [...(datasets[name] || [])];
+        chart.update();
+    });
 
     // Update eye closure scatter plot
-    chartConfigs.eyeClosure.chart.data.datasets[0].data = labels.map((label, i) => ({
-        x: label,
-        y: datasets.eyeClosure[i]
-    }));
-    chartConfigs.eyeClosure.chart.update();
+    if (chartConfigs.eyeClosure.chart) {
+        chartConfigs.eyeClosure.chart.data.datasets[0].data = labels.map((label, i) => ({
+            x: label,
+            y: datasets.eyeClosure[i]
+        }));
+        chartConfigs.eyeClosure.chart.update();
+    }
+}
+
+// Append a single pushed trend point, keeping at most an hour of points
+const MAX_TREND_POINTS = 3600;
+
+function appendTrendPoint(point) {
+    const series = {
+        alertness: point.alertness,
+        heartRate: point.heartRate,
+        blinkRate: point.blinkRate
+    };
+
+    Object.entries(series).forEach(([name, value]) => {
+        const chart = chartConfigs[name].chart;
+        if (!chart) {
+            return;
+        }
+        chart.data.labels.push(point.timestamp);
+        chart.data.datasets[0].data.push(value);
+        if (chart.data.labels.length > MAX_TREND_POINTS) {
+            chart.data.labels.shift();
+            chart.data.datasets[0].data.shift();
+        }
+        chart.update('none');
+    });
+
+    const eyeClosureChart = chartConfigs.eyeClosure.chart;
+    if (eyeClosureChart) {
+        const data = eyeClosureChart.data.datasets[0].data;
+        data.push({ x: point.timestamp, y: point.eyeClosure });
+        if (data.length > MAX_TREND_POINTS) {
+            data.shift();
+        }
+        eyeClosureChart.update('none');
+    }
 }
 
-// Initialize charts when document is ready
+// Initialize charts when document is ready; trends arrive via subscribe_trends on connect
 document.addEventListener('DOMContentLoaded', () => {
     initializeCharts();
-    socket.emit('request_trends');
 });
 
 // Add trend analysis display
@@ -463,10 +496,6 @@ function updateConnectionStatus(isConnected) {
         statusDot.className = 'h-3 w-3 bg-green-500 rounded-full';
         monitorStatus.textContent = 'Connected';
         monitorStatus.className = 'text-green-600';
-        
-        // Request initial metrics
-        socket.emit('request_metrics');
-        socket.emit('request_trends');
     } else {
         statusDot.className = 'h-3 w-3 bg-red-500 rounded-full';
         monitorStatus.textContent = 'Disconnected';
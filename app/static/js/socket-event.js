@@ -1,6 +1,7 @@
 // Initialize Socket.IO with reconnection options
 const socket = io({
     path: '/socket.io',
+    transports: window.SOCKET_TRANSPORTS,  // Set by base.html from SOCKETIO_TRANSPORTS
     reconnection: true,           // Enable reconnection
     reconnectionAttempts: 10,     // Maximum number of reconnection attempts
     reconnectionDelay: 1000,      // How long to wait before attempting a new reconnection (1 second)
@@ -13,6 +14,41 @@ const socket = io({
 let isConnected = false;
 let reconnectAttempts = 0;
 
+// Opt-in binary payloads (?encoding=msgpack); requires the MessagePack library
+const requestedEncoding = new URLSearchParams(window.location.search).get('encoding');
+const payloadEncoding = (requestedEncoding === 'msgpack' && typeof MessagePack !== 'undefined') ? 'msgpack' : 'json';
+
+// Decode a payload that may arrive as MessagePack binary
+function decodePayload(data) {
+    if (data instanceof ArrayBuffer || ArrayBuffer.isView(data)) {
+        return MessagePack.decode(data instanceof ArrayBuffer ? new Uint8Array(data) : data);
+    }
+    return data;
+}
+
+// Unpack little-endian float32 series (copy first: the view may be unaligned)
+function unpackSeries(values) {
+    if (values instanceof Uint8Array) {
+        return Array.from(new Float32Array(values.slice().buffer));
+    }
+    return values;
+}
+
+// Binary metrics carry numbers; restore the display strings the UI expects
+function formatMetrics(data) {
+    if (typeof data.blinkRate !== 'number') {
+        return data;
+    }
+    return {
+        ...data,
+        heartRate: data.heartRate === undefined ? undefined : `${data.heartRate}`,
+        alertness: `${data.alertness}`,
+        blinkRate: `${data.blinkRate}/min`,
+        yawnCount: `${data.yawnCount}/min`,
+        eyeClosure: `${data.eyeClosure.toFixed(1)}s`
+    };
+}
+
 
 // Connection event handlers
 socket.on('connect', () => {
@@ -79,9 +115,13 @@ socket.on('reconnect_failed', () => {
 
 // Helper functions
 function requestInitialData() {
-    // Request all necessary data after connection/reconnection
+    // Request all necessary data after connection/reconnection.
+    // Trends arrive as one full snapshot here, then as pushed trends_append points.
+    if (payloadEncoding !== 'json') {
+        socket.emit('set_encoding', { encoding: payloadEncoding });
+    }
     socket.emit('request_metrics');
-    socket.emit('request_trends');
+    socket.emit('subscribe_trends');
 }
 
 
@@ -92,6 +132,15 @@ function manualReconnect() {
     }
 }
 
+// Wearable (or mock) metrics are read with this session's tokens, so they are
+// requested on a timer; camera metrics and trend points are pushed by the server
+const WEARABLE_REFRESH_MS = 3000;
+setInterval(() => {
+    if (isConnected) {
+        socket.emit('request_metrics');
+    }
+}, WEARABLE_REFRESH_MS);
+
 // Add a heartbeat to check connection
 setInterval(() => {
     if (isConnected) {
@@ -104,33 +153,48 @@ socket.on('pong', () => {
     console.log('Heartbeat received');
 });
 
+// Camera stream shown on this page (?stream=<id>); metrics and alerts of the user's other cameras are ignored
+const monitoredStream = new URLSearchParams(window.location.search).get('stream') || 'local';
+
 // Socket event handlers
-socket.on('metrics_update', (data) => {
+socket.on('metrics_update', (payload) => {
+    const decoded = decodePayload(payload);
+    if (decoded.streamId && decoded.streamId !== monitoredStream) {
+        return;
+    }
+    const data = formatMetrics(decoded);
     updateMetricsDisplay(data);
     updatePerformanceMetrics(data);
 });
 
 socket.on('alert', (data) => {
+    if (data.streamId && data.streamId !== monitoredStream) {
+        return;
+    }
     handleAlert(data);
     // addAlertToHistory(data);
 });
 
 
-// Request metrics update every 5 seconds
-setInterval(() => {
-    socket.emit('request_metrics');
-}, 3000);
 
+// Socket event for trends (full snapshot on subscribe)
+socket.on('trends_update', (payload) => {
+    const data = decodePayload(payload);
+    const datasets = {};
+    Object.entries(data.datasets || {}).forEach(([name, values]) => {
+        datasets[name] = unpackSeries(values);
+    });
+    updateCharts({ labels: data.labels || [], datasets });
+});
 
-// Socket event for trends
-socket.on('trends_update', (data) => {
-    updateCharts(data);
+// Incremental trend point pushed by the server as snapshots are saved
+socket.on('trends_append', (payload) => {
+    appendTrendPoint(decodePayload(payload));
 });
 
-// Request trends update every 4 seconds
-setInterval(() => {
-    socket.emit('request_trends');
-}, 4000);
+socket.on('encoding_ack', (data) => {
+    console.log('Payload encoding:', data.encoding);
+});
 
 // Add socket event for trend analysis
 socket.on('trend_analysis', (data) => {
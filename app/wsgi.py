@@ -0,0 +1,18 @@
+# app/wsgi.py
+"""
+Production entry point for a cooperative server, e.g.
+
+    ASYNC_MODE=eventlet gunicorn -k eventlet -w 1 app.wsgi:app
+
+Socket.IO long-polling needs every request of a client on one worker, so
+use -w 1 unless clients are limited to websocket (SOCKETIO_TRANSPORTS) and
+workers share a message queue (SOCKETIO_MESSAGE_QUEUE); see the README.
+With several workers, PREFORK=true loads shared read-only assets once in
+the master (see gunicorn.conf.py).
+"""
+
+import patch_first  # noqa: F401  Patched already by app/__init__; kept first so the order is explicit
+
+from app import create_app
+
+app = create_app()
@@ -0,0 +1,98 @@
+# benchmarks/forest_scoring.py
+"""
+Latency and agreement of the compiled NumPy forest scorer against sklearn's
+RandomForestClassifier.predict_proba, for batch sizes from 1 to 10k rows.
+
+A FatigueDetectionModel is trained on synthetic data shaped like the API
+features (blink rate, head tilt, heart rate). Each batch size is scored
+--repeat times by both paths and the median wall time is reported, together
+with the maximum absolute probability difference (must stay below --atol).
+The "model ms" column is FatigueDetectionModel.predict_proba after compile(),
+which uses the compiled scorer up to --max-batch rows and sklearn above.
+
+Usage:
+
+    python benchmarks/forest_scoring.py --trees 100 --repeat 20
+
+Requires numpy and scikit-learn. Run from the repository root.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.modules.ai_ml.fatigue_model import FatigueDetectionModel  # noqa: E402
+from app.modules.ai_ml.compiled_forest import compile_forest  # noqa: E402
+
+
+def synthetic_features(rng, n):
+    blink_rate = rng.normal(15, 6, n)
+    head_tilt = rng.normal(0, 12, n)
+    heart_rate = rng.normal(72, 12, n)
+    return np.column_stack([blink_rate, head_tilt, heart_rate])
+
+
+def train(trees, rows, seed):
+    rng = np.random.default_rng(seed)
+    X = synthetic_features(rng, rows)
+    risk = 0.08 * (10 - X[:, 0]) + 0.05 * np.abs(X[:, 1]) - 0.03 * (X[:, 2] - 72)
+    y = (risk + rng.normal(0, 0.5, rows) > 0.5).astype(int)
+    model = FatigueDetectionModel()
+    model.model.set_params(n_estimators=trees, random_state=seed)
+    model.train(X, y)
+    return model
+
+
+def median_ms(fn, X, repeat):
+    fn(X)  # Warm up
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def run(args):
+    model = train(args.trees, args.train_rows, args.seed)
+    compiled = compile_forest(model)
+    model.compiled = compiled
+    model.compiled_max_batch = args.max_batch
+    rng = np.random.default_rng(args.seed + 1)
+
+    def sklearn_scores(X):
+        return model.predict_proba(X, use_compiled=False)
+
+    print(f"{args.trees} trees, max depth {compiled.max_depth}, {len(compiled.feature)} nodes")
+    print(f"{'batch':>7} {'sklearn ms':>11} {'numpy ms':>9} {'speedup':>8} {'model ms':>9} {'max |diff|':>11}")
+    worst = 0.0
+    for batch in args.batches:
+        X = synthetic_features(rng, batch)
+        difference = float(np.max(np.abs(compiled.predict_proba(X) - sklearn_scores(X))))
+        worst = max(worst, difference)
+        sklearn_ms = median_ms(sklearn_scores, X, args.repeat)
+        numpy_ms = median_ms(compiled.predict_proba, X, args.repeat)
+        model_ms = median_ms(model.predict_proba, X, args.repeat)
+        print(f"{batch:>7} {sklearn_ms:>11.3f} {numpy_ms:>9.3f} {sklearn_ms / numpy_ms:>7.1f}x "
+              f"{model_ms:>9.3f} {difference:>11.2e}")
+
+    if worst > args.atol:
+        sys.exit(f"Compiled scorer differs from sklearn by {worst:.3g} (tolerance {args.atol:g})")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trees', type=int, default=100, help='forest size (the model default is 100)')
+    parser.add_argument('--train-rows', type=int, default=20000)
+    parser.add_argument('--batches', type=int, nargs='+', default=[1, 10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20, help='timed runs per batch size')
+    parser.add_argument('--max-batch', type=int, default=128, help='compiled scorer cutoff (COMPILED_FOREST_MAX_BATCH)')
+    parser.add_argument('--atol', type=float, default=1e-9, help='maximum allowed probability difference')
+    parser.add_argument('--seed', type=int, default=0)
+    run(parser.parse_args())
@@ -0,0 +1,74 @@
+# benchmarks/payload_encoding.py
+"""
+Compare JSON and MessagePack payloads for metrics_update and trends_update:
+encoded size, encode time and decode time.
+
+JSON is measured the way Socket.IO sends it (json.dumps of the display payload);
+MessagePack payloads are the binary attachments produced by
+app.services.payloads.
+
+Usage:
+    python benchmarks/payload_encoding.py [--points 3600] [--repeat 200]
+
+Requires msgpack. Run from the repository root.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.metrics import MetricsRecord  # noqa: E402
+from app.services import payloads  # noqa: E402
+
+
+def sample_metrics():
+    return MetricsRecord(heart_rate=75, alertness=85, blink_rate=12, yawn_count=1, eye_closure=0.2)
+
+
+def sample_trends(points):
+    start = datetime.utcnow() - timedelta(seconds=points)
+    return {
+        'labels': [(start + timedelta(seconds=i)).strftime('%H:%M:%S') for i in range(points)],
+        'datasets': {
+            'alertness': [float(random.randint(60, 100)) for _ in range(points)],
+            'heartRate': [random.randint(60, 100) for _ in range(points)],
+            'blinkRate': [float(random.randint(8, 25)) for _ in range(points)],
+            'eyeClosure': [round(random.uniform(0.1, 0.4), 1) for _ in range(points)]
+        }
+    }
+
+
+def measure(name, payload, encoder, repeat):
+    json_bytes = json.dumps(encoder(payload, payloads.JSON)).encode()
+    binary = encoder(payload, payloads.MSGPACK)
+
+    json_encode = min(timeit.repeat(lambda: json.dumps(encoder(payload, payloads.JSON)).encode(), number=repeat, repeat=5)) / repeat
+    json_decode = min(timeit.repeat(lambda: json.loads(json_bytes), number=repeat, repeat=5)) / repeat
+    bin_encode = min(timeit.repeat(lambda: encoder(payload, payloads.MSGPACK), number=repeat, repeat=5)) / repeat
+    bin_decode = min(timeit.repeat(lambda: payloads.decode(binary), number=repeat, repeat=5)) / repeat
+
+    print(f"{name}")
+    print(f"  {'':10} {'bytes':>10} {'encode us':>10} {'decode us':>10}")
+    print(f"  {'json':10} {len(json_bytes):>10} {json_encode * 1e6:>10.1f} {json_decode * 1e6:>10.1f}")
+    print(f"  {'msgpack':10} {len(binary):>10} {bin_encode * 1e6:>10.1f} {bin_decode * 1e6:>10.1f}")
+    print(f"  size ratio: {len(binary) / len(json_bytes):.2f}\n")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--points', type=int, default=3600, help='trend points (one hour at 1 Hz)')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    if payloads.MSGPACK not in payloads.supported_encodings():
+        raise SystemExit("msgpack is not installed")
+
+    random.seed(0)
+    measure('metrics_update', sample_metrics(), payloads.encode_metrics, args.repeat * 10)
+    measure(f'trends_update ({args.points} points)', sample_trends(args.points), payloads.encode_trends, args.repeat)
@@ -0,0 +1,158 @@
+# benchmarks/socket_concurrency.py
+"""
+Concurrency ceiling benchmark: how many Socket.IO clients and MJPEG streams
+a single server worker sustains before heartbeat latency degrades.
+
+Clients are added in steps. Each client sends a `ping` every --interval
+seconds and measures the `pong` round trip. A step passes while p95 RTT
+stays under --budget-ms and fewer than 1% of connections fail; the last
+passing step is reported as the per-worker ceiling.
+
+Usage (server started with `ASYNC_MODE=eventlet python -m app.main` or
+`gunicorn -k eventlet -w 1 app.wsgi:app`):
+
+    python benchmarks/socket_concurrency.py --url https://localhost:5000 \
+        --step 100 --max 3000 --streams 4 --cookie "session=<value>"
+
+Requires `python-socketio[client]` and `requests` on the load generator.
+Run the generator on a different machine than the server so it does not
+compete for CPU. With --record, the steps and ceiling are appended as one
+JSON line to the given file, labelled with --label (server CPU, ASYNC_MODE,
+BLOCKING_POOL_SIZE) so runs on different setups can be compared.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import threading
+import time
+from datetime import datetime
+
+import requests
+import socketio
+
+
+class PingClient:
+    def __init__(self, url, cookie, interval):
+        self.url = url
+        self.cookie = cookie
+        self.interval = interval
+        self.rtts = []
+        self.sent_at = None
+        self.failed = False
+        self.sio = socketio.Client(reconnection=False, ssl_verify=False)
+        self.sio.on('pong', self._on_pong)
+
+    def _on_pong(self, *args):
+        if self.sent_at is not None:
+            self.rtts.append((time.perf_counter() - self.sent_at) * 1000)
+            self.sent_at = None
+
+    def connect(self):
+        try:
+            headers = {'Cookie': self.cookie} if self.cookie else {}
+            self.sio.connect(self.url, headers=headers, transports=['websocket'], wait_timeout=10)
+        except Exception:
+            self.failed = True
+
+    def ping(self):
+        if self.failed or not self.sio.connected:
+            return
+        self.sent_at = time.perf_counter()
+        self.sio.emit('ping')
+
+    def close(self):
+        if self.sio.connected:
+            self.sio.disconnect()
+
+
+def read_stream(url, cookie, stop, counters):
+    """Hold an MJPEG stream open and count received bytes"""
+    headers = {'Cookie': cookie} if cookie else {}
+    try:
+        with requests.get(f"{url}/ui/video_feed", headers=headers, stream=True, verify=False, timeout=10) as response:
+            for chunk in response.iter_content(chunk_size=65536):
+                counters['bytes'] += len(chunk)
+                if stop.is_set():
+                    break
+    except Exception:
+        counters['errors'] += 1
+
+
+def run(args):
+    stop = threading.Event()
+    stream_counters = {'bytes': 0, 'errors': 0}
+    for _ in range(args.streams):
+        threading.Thread(target=read_stream, args=(args.url, args.cookie, stop, stream_counters), daemon=True).start()
+
+    clients = []
+    steps = []
+    ceiling = 0
+    print(f"{'clients':>8} {'failed':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'stream MB/s':>12}")
+    try:
+        while len(clients) < args.max:
+            batch = [PingClient(args.url, args.cookie, args.interval) for _ in range(args.step)]
+            for client in batch:
+                client.connect()
+            clients.extend(batch)
+
+            for client in clients:
+                client.rtts.clear()
+            stream_start = stream_counters['bytes']
+            step_start = time.perf_counter()
+            while time.perf_counter() - step_start < args.duration:
+                for client in clients:
+                    client.ping()
+                time.sleep(args.interval)
+            elapsed = time.perf_counter() - step_start
+
+            rtts = sorted(rtt for client in clients for rtt in client.rtts)
+            failed = sum(1 for client in clients if client.failed)
+            if not rtts:
+                print(f"{len(clients):>8} {failed:>7} no pongs received")
+                break
+
+            def pct(p):
+                return rtts[min(len(rtts) - 1, int(len(rtts) * p))]
+
+            stream_rate = (stream_counters['bytes'] - stream_start) / elapsed / 1e6
+            print(f"{len(clients):>8} {failed:>7} {statistics.median(rtts):>8.1f} "
+                  f"{pct(0.95):>8.1f} {pct(0.99):>8.1f} {stream_rate:>12.2f}")
+            steps.append({'clients': len(clients), 'failed': failed, 'p50_ms': statistics.median(rtts),
+                          'p95_ms': pct(0.95), 'p99_ms': pct(0.99), 'stream_mb_s': stream_rate})
+
+            if pct(0.95) > args.budget_ms or failed > len(clients) * 0.01:
+                break
+            ceiling = len(clients)
+    finally:
+        stop.set()
+        for client in clients:
+            client.close()
+
+    print(f"\nSustained {ceiling} socket clients with {args.streams} MJPEG streams "
+          f"(p95 heartbeat < {args.budget_ms} ms, stream errors: {stream_counters['errors']})")
+
+    if args.record:
+        result = {'date': datetime.utcnow().isoformat(), 'label': args.label, 'url': args.url,
+                  'streams': args.streams, 'budget_ms': args.budget_ms, 'ceiling': ceiling,
+                  'stream_errors': stream_counters['errors'], 'steps': steps}
+        os.makedirs(os.path.dirname(os.path.abspath(args.record)), exist_ok=True)
+        with open(args.record, 'a') as f:
+            f.write(json.dumps(result) + '\n')
+        print(f"Recorded in {args.record}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='https://localhost:5000')
+    parser.add_argument('--cookie', default='', help='Flask session cookie of a logged-in user (needed for streams)')
+    parser.add_argument('--step', type=int, default=100, help='clients added per step')
+    parser.add_argument('--max', type=int, default=3000, help='stop after this many clients')
+    parser.add_argument('--streams', type=int, default=0, help='concurrent MJPEG streams held open')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between pings')
+    parser.add_argument('--duration', type=float, default=15.0, help='seconds measured per step')
+    parser.add_argument('--budget-ms', type=float, default=250.0, help='p95 heartbeat latency budget')
+    parser.add_argument('--record', default='', help='append the result as a JSON line to this file')
+    parser.add_argument('--label', default='', help='server setup, e.g. "8 vCPU, eventlet, BLOCKING_POOL_SIZE=16"')
+    run(parser.parse_args())
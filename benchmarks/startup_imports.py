@@ -0,0 +1,103 @@
+# benchmarks/startup_imports.py
+"""
+Startup import benchmark: wall time and per-module import time of a fresh
+interpreter loading the app, via `python -X importtime`.
+
+Each run starts a new interpreter (no warm module cache) and executes the
+target:
+
+    import      the modules create_app() imports (blueprints, services,
+                Firebase client), without running it
+    create-app  create_app() itself (needs Firebase credentials and the
+                OAuth client secret in config/); WARMUP is set to --warmup
+
+The median wall time over --repeat runs is reported, then the slowest
+modules by cumulative import time, the import time per top-level package
+(self time summed, so dependencies are charged to themselves), and which of
+the heavy dependencies were imported at all.
+
+Usage:
+
+    python benchmarks/startup_imports.py --target import --repeat 5 --top 25
+
+Run from the repository root with the app's requirements installed.
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TARGETS = {
+    'import': (
+        "import app.routes.google_auth, app.routes.fatigue, app.routes.ui.screen, "
+        "app.routes.fitbit_auth, app.routes.metrics, app.modules.ai_ml.fatigue_detection, "
+        "app.utils.firebase_client, app.services.service_manager, app.core.warmup"
+    ),
+    'create-app': "from app import create_app; create_app()",
+}
+
+HEAVY_PACKAGES = ['cv2', 'mediapipe', 'dlib', 'scipy', 'sklearn', 'googleapiclient',
+                  'google_auth_oauthlib', 'firebase_admin', 'numpy']
+
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def run_once(statement, warmup):
+    """(wall seconds, [(module, self us, cumulative us, depth)]) of one fresh interpreter"""
+    env = dict(os.environ, WARMUP=warmup)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=ROOT, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.exit(f"Target failed:\n{result.stderr[-2000:]}")
+    modules = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return wall, modules
+
+
+def run(args):
+    statement = TARGETS[args.target]
+    walls, modules = [], []
+    for _ in range(args.repeat):
+        wall, modules = run_once(statement, args.warmup)
+        walls.append(wall)
+
+    print(f"target: {args.target}   median wall {statistics.median(walls) * 1000:.0f} ms "
+          f"over {args.repeat} runs (interpreter start included)")
+
+    print(f"\nslowest {args.top} modules by cumulative import time (last run):")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for name, self_us, cumulative_us, _ in sorted(modules, key=lambda m: -m[2])[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {name}")
+
+    packages = defaultdict(int)
+    for name, self_us, _, _ in modules:
+        packages[name.split('.')[0]] += self_us
+    print(f"\nimport time per top-level package (self time, top {args.top}):")
+    for package, self_us in sorted(packages.items(), key=lambda p: -p[1])[:args.top]:
+        print(f"{self_us / 1000:>10.1f} ms  {package}")
+
+    imported = {name.split('.')[0] for name, _, _, _ in modules}
+    print("\nheavy dependencies imported: " +
+          (', '.join(p for p in HEAVY_PACKAGES if p in imported) or 'none'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--target', choices=sorted(TARGETS), default='import')
+    parser.add_argument('--warmup', default='off', help='WARMUP mode for create-app (eager, background, off)')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters to time')
+    parser.add_argument('--top', type=int, default=20, help='rows in each table')
+    run(parser.parse_args())
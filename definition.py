@@ -7,6 +7,7 @@ APP_DIR = os.path.join(PROJECT_DIR, 'app')
 DATASET_MODEL_DIR = os.path.join(PROJECT_DIR, 'dataset-model')
 CONFIG_DIR = os.path.join(PROJECT_DIR, 'config')
 LOGS_DIR = os.path.join(PROJECT_DIR, 'logs')
+SPOOL_DIR = os.path.join(PROJECT_DIR, 'spool')  # Writes deferred while Firestore is unreachable
 
 # Define the path to the SSL files
 SSL_CERT_PATH = os.path.join(PROJECT_DIR, 'ssl', 'certificate.pem')
@@ -0,0 +1,27 @@
+# gunicorn.conf.py
+"""
+Gunicorn hooks, read from the working directory, e.g.
+
+    ASYNC_MODE=eventlet SOCKETIO_TRANSPORTS=websocket SOCKETIO_MESSAGE_QUEUE=redis://localhost:6379/0 \
+        PREFORK=true gunicorn -k eventlet -w 4 app.wsgi:app
+
+With PREFORK=true the master imports OpenCV and scikit-learn and unpickles
+the active fatigue model before forking, so workers share those pages
+copy-on-write instead of each loading a copy (see prefork.py). Nothing from
+the `app` package is imported here: the app is created in every worker,
+after the worker has monkey patched, since its service threads, locks,
+Socket.IO dispatchers and camera streams would not survive the fork. Each
+worker then warms up its own face mesh detectors and logs its memory;
+/metrics reports it per worker.
+"""
+
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def on_starting(server):
+    if os.getenv("PREFORK", "false").lower() == "true":
+        import prefork
+        prefork.preload()
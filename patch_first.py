@@ -0,0 +1,40 @@
+# patch_first.py
+"""
+Monkey patching for the cooperative server modes, before anything else loads.
+
+Under eventlet or gevent (ASYNC_MODE) socket, ssl, threading and time must
+be patched before any module binds the originals. This module lives outside
+the `app` package because importing anything under app/ first runs
+app/__init__, which imports Flask, python-dotenv and logging. app/__init__
+imports it as its very first statement, so every entry point (app.main,
+app.wsgi, `flask run`) is covered. ASYNC_MODE and BLOCKING_POOL_SIZE are
+read from the environment or the project's .env without importing dotenv.
+"""
+
+import os
+from definition import PROJECT_DIR
+
+def _setting(name, default):
+    """Environment value, else the .env value, else the default (same precedence as load_dotenv)"""
+    if name in os.environ:
+        return os.environ[name]
+    try:
+        with open(os.path.join(PROJECT_DIR, '.env')) as env:
+            for line in env:
+                key, sep, value = line.strip().partition('=')
+                if sep and key.strip().removeprefix('export ').strip() == name:
+                    return value.split(' #')[0].strip().strip('\'"')
+    except OSError:
+        pass
+    return default
+
+ASYNC_MODE = _setting('ASYNC_MODE', 'threading')
+
+if ASYNC_MODE == 'eventlet':
+    # Size of eventlet's OS thread pool used by run_blocking
+    os.environ.setdefault('EVENTLET_THREADPOOL_SIZE', _setting('BLOCKING_POOL_SIZE', '16'))
+    import eventlet
+    eventlet.monkey_patch()
+elif ASYNC_MODE == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
@@ -0,0 +1,71 @@
+# prefork.py
+"""
+Read-only assets loaded in the gunicorn master before it forks workers (see
+gunicorn.conf.py), so workers share their pages copy-on-write instead of
+each loading a copy.
+
+This module lives outside the `app` package on purpose: importing anything
+under app/ runs app/__init__ and creates service singletons and
+threading locks before the worker's eventlet/gevent monkey patching, and
+those would stay unpatched in every worker. Only libraries that hold no
+sockets or long-lived locks are imported here (MediaPipe, whose graphs run
+their own threads, and the Google API client, which must see the patched
+socket module, load in each worker), plus the unpickled artifacts of the
+active fatigue model. ModelRegistry picks those up through load_artifact().
+"""
+
+import gc
+import os
+import json
+import time
+import logging
+import importlib
+from definition import DATASET_MODEL_DIR
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_MODULES = ['numpy', 'cv2', 'joblib', 'sklearn.ensemble', 'sklearn.preprocessing']
+MANIFEST_PATH = os.path.join(DATASET_MODEL_DIR, 'fatigue', 'manifest.json')
+
+# Absolute artifact path -> (file mtime, object unpickled in the master)
+artifacts = {}
+
+def load_artifact(path, mmap_mode=None):
+    """The object preloaded for `path` if the file is unchanged, else a fresh joblib load"""
+    import joblib
+    path = os.path.abspath(path)
+    preloaded = artifacts.get(path)
+    if preloaded is not None and preloaded[0] == os.path.getmtime(path):
+        return preloaded[1]
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+def _active_model_paths():
+    """Model and scaler files of the manifest's active version (the registry validates them later)"""
+    with open(MANIFEST_PATH) as f:
+        manifest = json.load(f)
+    entry = manifest['versions'][manifest['active']]
+    path = os.path.join(os.path.dirname(MANIFEST_PATH), entry['path'])
+    return [path, path + '_scaler']
+
+def preload():
+    """Import the shared libraries and unpickle the active model, then freeze the heap.
+
+    gc.freeze() moves everything loaded so far out of the collector's reach,
+    so worker collections do not write to (and so copy) the shared pages.
+    """
+    start = time.perf_counter()
+    for module in PRELOAD_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            logger.warning(f"Pre-fork: {module} not preloaded: {str(e)}")
+    try:
+        import joblib
+        for path in _active_model_paths():
+            artifacts[os.path.abspath(path)] = (os.path.getmtime(path), joblib.load(path, mmap_mode='r'))
+    except Exception as e:
+        logger.error(f"Pre-fork: error loading the fatigue model: {str(e)}")
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Pre-fork: {len(artifacts)} model artifacts and libraries loaded in "
+                f"{(time.perf_counter() - start) * 1000:.0f} ms")